@@ -0,0 +1,116 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+# use_replica() ichida o'qishlar replikaga ketadi, boshqa joyda hammasi default (primary)
+_replica_reads = ContextVar("replica_reads", default=False)
+# track_writes() ichida primary'ga yozuv bo'ldimi ({"wrote": bool})
+_writes = ContextVar("db_writes", default=None)
+
+
+def _sticky_key(user_id):
+    return f"db_sticky:{user_id}"
+
+
+def mark_write(user_id):
+    """
+    User hozirgina yozdi: DATABASE_REPLICA_STICKY_SECONDS davomida uning o'qishlari primary'da
+    (replika orqada qolgan bo'lsa ham o'z xabarini/chatini ko'radi).
+    """
+    if not settings.DATABASE_REPLICAS or user_id is None:
+        return
+    try:
+        caches[settings.DATABASE_REPLICA_CACHE_ALIAS].set(
+            _sticky_key(user_id), 1, settings.DATABASE_REPLICA_STICKY_SECONDS
+        )
+    except Exception:
+        pass
+
+
+def is_sticky(user_id):
+    try:
+        return bool(caches[settings.DATABASE_REPLICA_CACHE_ALIAS].get(_sticky_key(user_id)))
+    except Exception:
+        return True  # kesh ishlamasa xavfsiz tomonga - primary
+
+
+@contextmanager
+def use_replica(user_id=None):
+    """
+    Faqat o'qiydigan yo'llar uchun (chat ro'yxati, tarix, qidiruv, kontaktlar).
+    Replika sozlanmagan yoki user yaqinda yozgan bo'lsa - primary.
+    """
+    if not settings.DATABASE_REPLICAS or (user_id is not None and is_sticky(user_id)):
+        yield
+        return
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_read(method):
+    """
+    View method'i uchun: butun handler (serializer.data ham) use_replica() ichida.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        with use_replica(request.user.id):
+            return method(self, request, *args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def track_writes():
+    state = {"wrote": False}
+    token = _writes.set(state)
+    try:
+        yield state
+    finally:
+        _writes.reset(token)
+
+
+class ReplicaRouter:
+    """
+    O'qish - use_replica() ichida tasodifiy replika, yozish va migratsiya - faqat default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _writes.get()
+        if state is not None:
+            state["wrote"] = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replikalar primary'ning nusxasi
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class ReplicaStickyMiddleware:
+    """
+    Request ichida primary'ga yozuv bo'lgan bo'lsa userni qisqa muddat primary'ga bog'lash.
+    DRF autentifikatsiyasi view ichida bo'lgani uchun user javobdan keyin olinadi.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with track_writes() as state:
+            response = self.get_response(request)
+        user = getattr(request, "user", None)
+        if state["wrote"] and user is not None and user.is_authenticated:
+            mark_write(user.id)
+        return response
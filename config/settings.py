@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'channels',
     'rest_framework',
     'rest_framework_simplejwt',
@@ -53,7 +54,7 @@ AUTH_USER_MODEL = 'users.AbstractUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
 }
 
@@ -75,6 +76,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.routers.ReplicaStickyMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -113,11 +115,31 @@ DATABASES = {
         'NAME': 'chat',  # PostgreSQL bazasi nomi
         'USER': 'user_chat',  # PostgreSQL foydalanuvchi nomi
         'PASSWORD': 'password_chat',  # PostgreSQL paroli
-        'HOST': 'chat_db',  # Docker Compose'dagi konteyner nomi
-        'PORT': '5432',  # PostgreSQL uchun standart port
+        'HOST': os.environ.get('DATABASE_HOST', 'chat_db'),  # Docker Compose'dagi konteyner nomi (CI'da localhost)
+        'PORT': os.environ.get('DATABASE_PORT', '5432'),  # PostgreSQL uchun standart port
+        # Ulanishlar qayta ishlatiladi: har bir worker thread'i (CONSUMER_DB_THREADS) bittadan saqlaydi
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# O'qish replikalari: DATABASE_REPLICA_HOSTS="replica1:5432,replica2:5432".
+# Bo'sh bo'lsa hamma so'rov default'da. Testlarda replika default'ning oynasi (MIRROR).
+DATABASE_REPLICAS = []
+for _i, _address in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(','))):
+    _host, _, _port = _address.strip().partition(':')
+    DATABASES[f'replica{_i + 1}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{_i + 1}')
+
+DATABASE_ROUTERS = ['config.routers.ReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = 5  # yozgandan keyin userning o'qishlari shuncha vaqt primary'da
+DATABASE_REPLICA_CACHE_ALIAS = 'shared'  # barcha workerlar uchun umumiy (Redis) kesh
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators.
@@ -167,12 +189,172 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 ASGI_APPLICATION = 'config.asgi.application'
 
-# Redis backend
-CHANNEL_LAYERS = {
+# Cache: default - worker ichida, shared - barcha workerlar uchun umumiy (Redis)
+# Redis serveri: Docker Compose'da "redis" konteyneri, CI'da localhost
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+
+CACHES = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            "hosts": [("redis", 6379)],
-        },
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
     },
-}
\ No newline at end of file
+}
+
+# Autentifikatsiya qilingan userlar keshi (JWTAuthMiddleware va REST JWT)
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 30  # worker ichidagi kesh, sekund
+USER_CACHE_SHARED_TTL = 300  # Redis kesh, sekund
+USER_CACHE_ALIAS = 'shared'  # None - Redis tier o'chirilgan
+
+# Presence, inbox va boshqa realtime ma'lumotlar uchun Redis
+REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/0'
+
+# Redis backend (CHANNEL_LAYER env):
+#   "core"   - RedisChannelLayer: har bir kanal Redis list'i, capacity/expiry bilan
+#   "pubsub" - RedisPubSubChannelLayer: PUB/SUB, kamroq round-trip, lekin kanal buferi yo'q -
+#              uzilgan ulanishga ketgan event yo'qoladi (inbox sync qoplaydi), capacity/expiry ishlatilmaydi
+CHANNEL_LAYER = os.environ.get('CHANNEL_LAYER', 'core')
+CHANNEL_LAYER_HOSTS = [(REDIS_HOST, REDIS_PORT)]
+CHANNEL_LAYER_CAPACITY = int(os.environ.get('CHANNEL_LAYER_CAPACITY', 1000))  # kanal navbati (channels default'i 100)
+CHANNEL_LAYER_EXPIRY = int(os.environ.get('CHANNEL_LAYER_EXPIRY', 60))  # o'qilmagan event shuncha sekunddan keyin tashlanadi
+# Group a'zoligi muddati - eng uzun ulanishdan uzun bo'lishi kerak (default'i 1 kun)
+CHANNEL_LAYER_GROUP_EXPIRY = int(os.environ.get('CHANNEL_LAYER_GROUP_EXPIRY', 7 * 24 * 3600))
+
+if CHANNEL_LAYER == 'pubsub':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {
+                "hosts": CHANNEL_LAYER_HOSTS,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                "hosts": CHANNEL_LAYER_HOSTS,
+                "capacity": CHANNEL_LAYER_CAPACITY,
+                "expiry": CHANNEL_LAYER_EXPIRY,
+                "group_expiry": CHANNEL_LAYER_GROUP_EXPIRY,
+            },
+        },
+    }
+
+# Production ASGI (manage.py serve): bitta socket'ni tinglaydigan daphne process'lari
+ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', 0))  # 0 - CPU yadrolari soni
+ASGI_DRAIN_TIMEOUT = 30  # sekund, SIGTERM'dan keyin ulanishlar yopilishini kutish
+
+# Xabarlar tarixi sahifalash (cursor pagination)
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_PAGE_MAX_SIZE = 200
+
+# Bo'laklab (chunked) media yuklash
+CHUNKED_UPLOAD_DIR = os.path.join(MEDIA_ROOT, 'uploads_partial')
+CHUNKED_UPLOAD_CHUNK_SIZE = 1024 * 1024  # tavsiya etilgan chunk hajmi (1MB)
+CHUNKED_UPLOAD_MAX_SIZE = 200 * 1024 * 1024  # 200MB
+CHUNKED_UPLOAD_MAX_PENDING = 10  # userning bir vaqtdagi yakunlanmagan upload'lari
+# Shuncha sekund chunk kelmagan pending upload o'chiriladi (manage.py cleanup_uploads, cron'da)
+CHUNKED_UPLOAD_EXPIRY = 24 * 3600
+CHUNKED_UPLOAD_CONTENT_TYPES = [
+    'image/jpeg', 'image/png', 'image/webp', 'image/gif',
+    'video/mp4', 'video/quicktime', 'video/webm',
+    'audio/mpeg', 'audio/ogg', 'audio/webm', 'audio/mp4', 'audio/wav',
+    'application/pdf',
+]
+
+# Online/last seen (presence)
+PRESENCE_TTL = 75  # heartbeat kelmasa ulanish shuncha sekunddan so'ng offline
+PRESENCE_HEARTBEAT_INTERVAL = 30  # client heartbeat yuborish oralig'i, sekund
+PRESENCE_BATCH_WINDOW = 1.0  # o'zgarishlar shu oraliqda yig'ilib bitta event bo'lib ketadi
+PRESENCE_SWEEP_INTERVAL = 15  # sekund, disconnect'siz o'lgan ulanishlar shu oraliqda offline qilinadi
+
+# Offline inbox (Redis stream) va reconnectda delta sync
+INBOX_MAX_LEN = 1000  # har bir user uchun saqlanadigan eventlar soni
+INBOX_MAX_AGE = 7 * 24 * 3600  # sekund
+INBOX_SYNC_LIMIT = 500  # bitta sync javobidagi maksimal eventlar
+
+# Message jadvalini partitionlash (manage.py partition_messages)
+MESSAGE_PARTITION_MONTHS_AHEAD = 3  # ensure shuncha oy oldinga partition yaratadi
+MESSAGE_ARCHIVE_SCHEMA = "messenger_archive"  # archive ajratilgan partitionlarni shu schema'ga ko'chiradi
+
+# Xabarlarni yozish (messenger.writebehind):
+#   "strict"  - har bir xabar o'z INSERT/commit'i bilan, ack'dan oldin bazada
+#   "batched" - id band qilinadi, xabar Redis journal'ga (stream) yoziladi va darhol ack,
+#               INSERT'lar bulk_create bilan (faqat PostgreSQL va matnli xabarlar).
+# Batched'da yo'qotmaslik Redis persistence'iga bog'liq (appendonly yes). manage.py serve to'xtashda
+# buferni yozadi; worker yiqilsa qolganini serve master'i replay_message_journal bilan yozadi
+# (boshqa launcher bilan - cron'da manage.py replay_message_journal).
+# Id'lar o'sib boradi, lekin turli workerlar flush'i ularni id tartibida commit qilmaydi.
+MESSAGE_DURABILITY = "strict"
+MESSAGE_BATCH_SIZE = 200  # bufer shuncha bo'lganda darhol yoziladi
+MESSAGE_BATCH_INTERVAL = 0.05  # sekund, bufer ko'pi bilan shuncha kutadi
+MESSAGE_JOURNAL_KEY = "message_journal"
+MESSAGE_REPLAY_INTERVAL = 300  # sekund, serve master'i journal'ni shu oraliqda tekshiradi
+
+# Rasm derivativlari (thumbnail/preview/placeholder) - messenger.derivatives
+IMAGE_WORKERS = 2  # Pillow process'lari soni
+IMAGE_FORMAT = "WEBP"  # yoki "JPEG"
+IMAGE_QUALITY = 80
+IMAGE_MESSAGE_SIZES = {"thumbnail": 320, "preview": 1280}  # eng katta tomon, px
+IMAGE_AVATAR_SIZE = 160
+IMAGE_PLACEHOLDER_SIZE = 16
+
+# Audio waveform (messenger.waveforms)
+WAVEFORM_SAMPLES = 64  # har bir xabar uchun 64 bayt
+FFMPEG_BINARY = "ffmpeg"  # topilmasa faqat WAV fayllar hisoblanadi
+
+# WebSocket consumer DB ishlari uchun thread pool (messenger.db).
+# Har bir thread bitta doimiy ulanish: workerlar soni * CONSUMER_DB_THREADS <= PostgreSQL max_connections
+CONSUMER_DB_THREADS = 8
+
+# Typing/recording indikatorlari (chat action)
+CHAT_ACTION_THROTTLE = 3  # bir xil holat har chat uchun shuncha sekundda ko'pi bilan bir marta
+CHAT_ACTION_TTL = 6  # client yangilamasa holat shuncha sekunddan so'ng o'chadi
+
+# Guruh chatlar
+GROUP_MAX_MEMBERS = 1000
+
+# Xabarlar bo'yicha qidiruv (PostgreSQL full-text)
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_OFFSET = 1000
+
+# Metrikalar (messenger.metrics), Prometheus: GET /metrics/
+METRICS_SAMPLE_RATE = 0.1  # histogramlarga yoziladigan hodisalar ulushi (0 - o'lchanmaydi, counterlar baribir)
+METRICS_PUBLISH_INTERVAL = 15  # sekund, har bir worker snapshotini Redis'ga yozadi
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # berilsa scrape uchun Authorization: Bearer <token>
+
+# WebSocket himoyasi (messenger.ratelimit, manage.py serve)
+WS_MAX_FRAME_SIZE = 1024 * 1024  # bayt; kattaroq frame decode qilinmaydi
+# action: (sekundiga token, burst). "*" - har bir frame, decode'dan oldin.
+# typing/recording/cancel - "chat_action", noma'lum action - "send"
+WS_RATE_LIMITS = {
+    "*": (30, 60),
+    "send": (10, 20),
+    "fetch_messages": (5, 10),
+    "fetch_chats": (1, 5),
+    "fetch_presence": (2, 5),
+    "sync": (2, 5),
+    "search": (1, 3),
+    "mark_read": (10, 20),
+    "heartbeat": (1, 3),
+    "chat_action": (5, 10),
+}
+if os.environ.get('WS_RATE_LIMITS') == 'off':  # loadtest_ws --url o'lchovi uchun serverda
+    WS_RATE_LIMITS = {}
+WS_USER_RATE_MULTIPLIER = 3  # userning barcha ulanishlari (shu workerda) uchun umumiy limit
+WS_RATE_LIMIT_CLOSE_AFTER = 50  # ketma-ket shuncha rad etilgan frame'dan keyin ulanish yopiladi
+# Clientga yozilmagan ma'lumot (socket buferi) shundan oshsa - WS_SLOW_CONSUMER_POLICY:
+#   "close" - ulanish 4008 bilan yopiladi, client ?cursor= bilan qayta ulanib sync oladi
+#   "drop"  - yangi frame'lar bufer bo'shaguncha tashlanadi
+WS_OUTBOUND_BUFFER = 4 * 1024 * 1024
+WS_SLOW_CONSUMER_POLICY = "close"
+
+# REST shartli GET (messenger.conditional): chat ro'yxati va xabarlar tarixi ETag bilan, o'zgarmagan bo'lsa 304
+CONDITIONAL_GET_REVALIDATE = 300  # sekund; ETag'ga kirmaydigan o'zgarishlar (sherik profili, thumbnail) kechikishi
+MESSAGE_HISTORY_MAX_AGE = 60  # sekund, ?before= sahifalari client keshida qayta so'ralmaydi
@@ -1,23 +1,30 @@
 from django.contrib import admin
 
 from messenger.models import Chat, Message
+from messenger.search import build_query
 
 
 @admin.register(Chat)
 class ChatAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user1', 'user2', 'created_at')
-    list_filter = ('created_at',)
-    search_fields = ('user1__username', 'user2__username')
+    list_display = ('id', 'is_group', 'title', 'user1', 'user2', 'created_at')
+    list_filter = ('is_group', 'created_at')
+    search_fields = ('title', 'user1__phone', 'user1__full_name', 'user2__phone', 'user2__full_name')
     ordering = ('-created_at',)
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ('id', 'chat', 'sender', 'short_text', 'timestamp', 'is_read')
     list_filter = ('is_read', 'timestamp')
-    search_fields = ('sender__username', 'chat__user1__username', 'chat__user2__username', 'text')
+    search_fields = ('text',)
     ordering = ('-timestamp',)
     readonly_fields = ('timestamp',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # ILIKE '%...%' o'rniga search_vector (GIN indeks) bo'yicha qidiruv
+        if not search_term:
+            return queryset, False
+        return queryset.filter(search_vector=build_query(search_term)), False
+
     def short_text(self, obj):
         return obj.text[:30] + ("..." if len(obj.text) > 30 else "")
     short_text.short_description = 'Text'
@@ -0,0 +1,77 @@
+# REST uchun shartli GET: ETag chat faolligi versiyalaridan olinadi (Message qatorlari va
+# serializerga tegmasdan), If-None-Match mos kelsa 304.
+import hashlib
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Least
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .models import ChatMember
+from .pagination import decode_cursor
+
+
+def make_etag(*parts):
+    """
+    Strong ETag. CONDITIONAL_GET_REVALIDATE davri ham qo'shiladi: versiyaga kirmaydigan o'zgarishlar
+    (sherik profili, keyinroq tayyor bo'ladigan thumbnail/waveform) shuncha vaqt ichida ko'rinadi.
+    """
+    period = int(time.time() // settings.CONDITIONAL_GET_REVALIDATE)
+    digest = hashlib.blake2b(repr((period, *parts)).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def chat_list_etag(user):
+    """
+    Userning chat ro'yxati versiyasi, bitta aggregate bilan: a'zolik, chatlarning oxirgi xabari,
+    userning o'qilmaganlari va sheriklarning o'qish belgilari (last_message.is_read shularga bog'liq).
+    """
+    state = ChatMember.objects.filter(chat__members__user=user).aggregate(
+        rows=Count("id"),
+        last_messages=Sum("chat__last_message_id"),
+        activity=Max("chat__last_activity_at"),
+        read=Sum("last_read_id"),
+        unread=Sum("unread_count", filter=Q(user=user)),
+    )
+    return make_etag("chats", user.id, *state.values())
+
+
+def message_page_etag(chat, request):
+    """
+    Xabarlar sahifasi versiyasi: chatning oxirgi xabari va a'zolarning o'qish belgilari (is_read).
+    ?before= sahifasiga yangi xabarlar ta'sir qilmaydi, o'qish belgilari esa cursorgacha hisoblanadi -
+    hamma cursordan o'tib o'qigach sahifa versiyasi o'zgarmaydi. Cursor noto'g'ri bo'lsa InvalidCursor.
+    """
+    members = ChatMember.objects.filter(chat=chat)
+    before = request.query_params.get("before")
+    if before and not request.query_params.get("after"):
+        _, message_id = decode_cursor(before)
+        version = members.aggregate(read=Sum(Least(Coalesce("last_read_id", 0), Value(message_id))))
+    else:
+        version = {"last_message": chat.last_message_id, **members.aggregate(read=Sum("last_read_id"))}
+    return make_etag("messages", chat.id, request.get_full_path(), *version.values())
+
+
+def with_cache_headers(response, etag, max_age=None):
+    """
+    ETag va Cache-Control: javob userga xos (private). max_age bo'lmasa client har safar
+    If-None-Match bilan tekshiradi (no-cache).
+    """
+    response["ETag"] = etag
+    if max_age:
+        patch_cache_control(response, private=True, max_age=max_age)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Authorization"])
+    return response
+
+
+def not_modified(request, etag, max_age=None):
+    """
+    If-None-Match mos kelsa 304 javob, aks holda None.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        return None
+    return with_cache_headers(response, etag, max_age)
@@ -1,11 +1,32 @@
-import json
+import asyncio
 import base64
+import binascii
+import logging
+import time
+from urllib.parse import parse_qs
+
+from channels.exceptions import ChannelFull
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from django.db.models import Q
+from django.conf import settings
 from django.utils.timezone import now
 from django.core.files.base import ContentFile
-from .models import Chat, Message
+from redis.exceptions import RedisError
+
+from config.routers import use_replica
+
+from . import inbox, metrics, presence, writebehind
+from .db import database_task
+from .encoders import MESSAGE_FIELDS, encode_message_rows
+from .indicators import CANCEL, CHAT_ACTIONS, ChatActionThrottle
+from .models import Chat, ChatMember, Message
+from .pagination import InvalidCursor, paginate_messages
+from .protocol import decode_frame, negotiate
+from .ratelimit import ALL_FRAMES, POLICY_CLOSE_CODE, RateLimiter, rate_key
+from .search import search_messages
+from .services import SendMessageError, mark_read, send_message
+from .uploads import media_extension
+
+logger = logging.getLogger(__name__)
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -17,56 +38,186 @@ class ChatConsumer(AsyncWebsocketConsumer):
         2) Anon user bo'lsa - ulanishni yopish
         3) Userga xos group yaratish (user_12)
         4) Ulanishni qabul qilish
-        5) Ulangan paytda userning chatlar ro'yxatini qaytarish
+        5) Presence: user online deb belgilanadi (sheriklarga batch bilan boradi)
+        6) Ulangan paytda userning chatlar ro'yxatini qaytarish.
+           Client ?cursor=... bilan qayta ulansa - faqat o'tkazib yuborilgan eventlar (sync)
         """
         self.user = self.scope['user']
         if not self.user or self.user.is_anonymous:
             await self.close()
             return
 
+        self.chat_actions = ChatActionThrottle(self.user.id, self.publish_chat_action)
+        self.rate_limiter = RateLimiter(self.user.id)
+        self.rejected = 0  # ketma-ket rad etilgan frame'lar
         # Har bir user uchun alohida kanal group (xabar yuborish shuning orqali)
         self.room_group_name = f"user_{self.user.id}"
+        metrics.connections.inc()
+        metrics.start_publisher()
+        presence.start_sweeper()
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        # Guruh chatlar: har bir chatga bitta group, xabar bitta group_send bilan tarqaladi.
+        # Shaxsiy chatlar: chat_id -> sherik id (typing kabi eventlar bazaga tushmasdan yo'naltiriladi)
+        group_chat_ids, self.chat_peers = await self.get_chat_routes()
+        self.group_chat_ids = set(group_chat_ids)
+        await asyncio.gather(*(
+            self.channel_layer.group_add(f"chat_{chat_id}", self.channel_name)
+            for chat_id in self.group_chat_ids
+        ))
+        # Client `doppigram.msgpack` subprotocol'ini so'rasa binary frame'lar ishlatiladi
+        self.codec = negotiate(self.scope)
+        await self.accept(subprotocol=self.codec.subprotocol)
 
-        # Ulanuvchi userga chatlar ro'yxatini qaytarish
+        await presence.user_connected(self.user.id, self.channel_name)
+
+        # Reconnect: oxirgi cursordan keyingi eventlar, ish hajmi o'zgarishlarga proporsional.
+        # ?cursor=<user cursor>&chat_cursors=<chat_id>:<cursor>,... (guruh chatlar stream'lari)
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        cursor = query.get("cursor", [None])[0]
+        if cursor:
+            chat_cursors = dict(
+                item.split(":", 1) for item in query.get("chat_cursors", [""])[0].split(",") if ":" in item
+            )
+            synced = await self.sync_inbox(cursor, chat_cursors=chat_cursors)
+            if synced and not synced["reset"]:
+                await self.send_payload({"type": "sync", **synced})
+                return
+
+        # Ulanuvchi userga chatlar ro'yxatini qaytarish (cursor'lar ro'yxatdan oldin olinadi)
+        try:
+            cursor = await inbox.latest_cursor(self.user.id)
+            chat_cursors = await inbox.latest_chat_cursors(self.group_chat_ids)
+        except RedisError:
+            cursor, chat_cursors = None, {}
         chats = await self.get_user_chats()
-        await self.send(text_data=json.dumps({
+        await self.send_payload({
             "type": "chat_list",
-            "chats": chats
-        }))
+            "chats": chats,
+            "cursor": cursor,
+            "chat_cursors": chat_cursors,
+        })
 
     async def disconnect(self, close_code):
         """
         WebSocket uzilganda user kanal gruppasidan chiqariladi.
+        Boshqa ulanishi qolmagan bo'lsa user offline bo'ladi.
         """
+        if not hasattr(self, "room_group_name"):
+            return
+        metrics.connections.dec()
+        await self.chat_actions.close()
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(f"chat_{chat_id}", self.channel_name)
+            for chat_id in self.group_chat_ids
+        ))
+        await presence.user_disconnected(self.user.id, self.channel_name)
+
+    async def send_payload(self, payload):
+        """
+        Payload'ni kelishilgan protokol (JSON yoki msgpack) bo'yicha yuborish.
+        """
+        frame = self.codec.encode(payload)
+        if metrics.sampled():
+            metrics.payload_bytes.observe(len(frame.get("text_data") or frame.get("bytes_data")), "out")
+        await self.send(**frame)
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """
         Frontenddan kelgan xabarlarni qabul qilish.
         Action'ga qarab turli vazifalar bajariladi:
         - fetch_messages: chatning barcha message'larini olish
         - fetch_chats: foydalanuvchiga tegishli chatlarni olish
+        - heartbeat: ulanish tirikligini bildirish (presence)
+        - fetch_presence: userlarning online/last seen holati
+        - sync: cursordan keyingi o'tkazib yuborilgan eventlar (offline inbox)
+        - search: userning chatlaridagi xabarlar bo'yicha qidiruv
+        - mark_read: chatdagi xabarlarni message_id gacha o'qilgan deb belgilash
+        - typing / recording_audio / recording_round_video / cancel: chat action (bazasiz)
         - Yangi xabar yuborish
         """
-        data = json.loads(text_data)
+        start = time.perf_counter() if metrics.sampled() else None
+        size = len(text_data or bytes_data or "")
+        if size > settings.WS_MAX_FRAME_SIZE:
+            await self.send_payload({"error": "Frame juda katta", "max_size": settings.WS_MAX_FRAME_SIZE})
+            return
+        if not await self.allow(ALL_FRAMES, None):
+            return
+        try:
+            data = decode_frame(text_data, bytes_data)
+        except ValueError as exc:
+            await self.send_payload({"error": str(exc)})
+            return
         action = data.get("action")
+        label = action or "send"
+        if label not in metrics.WS_ACTIONS:
+            label = "other"
+        if not await self.allow(rate_key(action), action):
+            metrics.rate_limited.inc(label)
+            return
+        metrics.ws_actions.inc(label)
+        try:
+            await self.handle_action(action, data)
+        finally:
+            if start is not None:
+                metrics.payload_bytes.observe(len(text_data or bytes_data or ""), "in")
+                metrics.ws_action_seconds.observe(time.perf_counter() - start, label)
 
+    async def allow(self, key, action):
+        """
+        WS_RATE_LIMITS bo'yicha tekshiruv. Rad etilsa client retry_after bilan xato oladi,
+        WS_RATE_LIMIT_CLOSE_AFTER ta ketma-ket rad etilgandan keyin ulanish yopiladi.
+        """
+        retry_after = self.rate_limiter.check(key)
+        if not retry_after:
+            if key != ALL_FRAMES:
+                self.rejected = 0
+            return True
+        if key == ALL_FRAMES:
+            metrics.rate_limited.inc(ALL_FRAMES)
+        self.rejected += 1
+        if self.rejected >= settings.WS_RATE_LIMIT_CLOSE_AFTER:
+            await self.close(code=POLICY_CLOSE_CODE)
+        else:
+            await self.send_payload({
+                "error": "Juda ko'p so'rov",
+                "action": action,
+                "retry_after": round(retry_after, 3),
+            })
+        return False
+
+    async def handle_action(self, action, data):
+        """
+        receive'dan: decode qilingan frame action bo'yicha bajariladi.
+        """
         if action == "fetch_messages":
             """
-            Frontdan chat_id kelsa, shu chatning barcha xabarlarini backenddan olib yuboramiz.
+            Frontdan chat_id kelsa, shu chatning xabarlarini sahifalab yuboramiz.
+            before/after - cursor, limit - sahifa hajmi.
+            Cursor bo'lmasa eng yangi sahifa qaytadi.
             """
             chat_id = data.get("chat_id")
-            if chat_id:
-                messages = await self.get_chat_messages(chat_id)
-                await self.send(text_data=json.dumps({
+            if isinstance(chat_id, int):
+                try:
+                    page = await self.get_chat_messages(
+                        chat_id,
+                        before=data.get("before"),
+                        after=data.get("after"),
+                        limit=data.get("limit"),
+                    )
+                except InvalidCursor:
+                    await self.send_payload({"error": "cursor noto'g'ri"})
+                    return
+                if page is None:
+                    await self.send_payload({"error": "Chat topilmadi"})
+                    return
+                await self.send_payload({
                     "type": "messages_list",
                     "chat_id": chat_id,
-                    "messages": messages
-                }))
+                    **page
+                })
             else:
-                await self.send(text_data=json.dumps({"error": "chat_id kerak"}))
+                await self.send_payload({"error": "chat_id kerak"})
             return
 
         elif action == "fetch_chats":
@@ -74,72 +225,226 @@ class ChatConsumer(AsyncWebsocketConsumer):
             Foydalanuvchiga tegishli chatlar ro'yxatini qaytarish.
             """
             chats = await self.get_user_chats()
-            await self.send(text_data=json.dumps({
+            await self.send_payload({
                 "type": "chat_list",
                 "chats": chats
-            }))
+            })
+            return
+
+        elif action == "heartbeat":
+            await presence.heartbeat(self.user.id, self.channel_name)
+            return
+
+        elif action == "fetch_presence":
+            """
+            user_ids ro'yxatidagi userlarning online/last seen holati.
+            """
+            user_ids = data.get("user_ids")
+            if not isinstance(user_ids, list) or not all(isinstance(i, int) for i in user_ids):
+                await self.send_payload({"error": "user_ids kerak"})
+                return
+            try:
+                users = await presence.get_presence(user_ids[:200])
+            except RedisError:
+                await self.send_payload({"error": "Presence vaqtincha ishlamayapti"})
+                return
+            await self.send_payload({
+                "type": "presence",
+                "users": users
+            })
+            return
+
+        elif action == "sync":
+            """
+            Client oxirgi ko'rgan cursorini (va guruhlar uchun chat_cursors: {chat_id: cursor}) yuboradi,
+            faqat ulardan keyingi eventlar qaytadi.
+            reset=true bo'lsa cursor juda eski - chat ro'yxatini qayta olish kerak.
+            """
+            chat_cursors = data.get("chat_cursors")
+            synced = await self.sync_inbox(
+                data.get("cursor") or inbox.EMPTY_CURSOR,
+                data.get("limit"),
+                chat_cursors=chat_cursors if isinstance(chat_cursors, dict) else None,
+            )
+            if synced is None:
+                await self.send_payload({"error": "Sync vaqtincha ishlamayapti"})
+                return
+            await self.send_payload({"type": "sync", **synced})
+            return
+
+        elif action == "search":
+            """
+            q - qidiruv matni, chat_id (ixtiyoriy) - faqat bitta chat ichida.
+            """
+            query = data.get("q")
+            chat_id = data.get("chat_id")
+            if not isinstance(query, str) or not query.strip() or (chat_id is not None and not isinstance(chat_id, int)):
+                await self.send_payload({"error": "q kerak"})
+                return
+            result = await self.search_messages(query, chat_id, data.get("limit"), data.get("offset"))
+            await self.send_payload({
+                "type": "search_results",
+                "q": query,
+                "chat_id": chat_id,
+                **result
+            })
+            return
+
+        elif action in CHAT_ACTIONS or action == CANCEL:
+            """
+            "Yozmoqda..." kabi holatlar. Client har tugma bosilganda yuborishi mumkin -
+            server throttle qiladi, takrorlarni tashlaydi va muddati o'tganda o'zi cancel yuboradi.
+            """
+            chat_id = data.get("chat_id")
+            if chat_id not in self.group_chat_ids and chat_id not in self.chat_peers:
+                await self.send_payload({"error": "Chat topilmadi"})
+                return
+            await self.chat_actions.update(chat_id, action)
+            return
+
+        elif action == "mark_read":
+            """
+            message_id - client ko'rgan eng oxirgi xabar (high-water mark).
+            Har bir yuboruvchiga bitta receipt, userning boshqa qurilmalariga - yangi unread_count.
+            """
+            chat_id = data.get("chat_id")
+            message_id = data.get("message_id")
+            if not isinstance(chat_id, int) or not isinstance(message_id, int):
+                await self.send_payload({"error": "chat_id va message_id kerak"})
+                return
+            receipt = await self.mark_read(chat_id, message_id)
+            if receipt is None:
+                await self.send_payload({"error": "Chat topilmadi"})
+                return
+            event = {
+                "type": "messages_read",
+                "chat_id": receipt.chat_id,
+                "reader_id": self.user.id,
+                "message_id": receipt.message_id,
+            }
+            if not receipt.sender_ids:
+                # Yangi o'qilgan xabar yo'q - faqat shu ulanishga javob
+                await self.send_payload({**event, "unread_count": receipt.unread_count})
+                return
+
+            own_event = {**event, "unread_count": receipt.unread_count}
+            cursors = await self.append_inbox(receipt.sender_ids, event)
+            own_cursor = (await self.append_inbox([self.user.id], own_event)).get(self.user.id)
+            for sender_id in receipt.sender_ids:
+                await self.group_send(
+                    f"user_{sender_id}",
+                    {**event, "cursor": cursors.get(sender_id)}
+                )
+            await self.group_send(
+                self.room_group_name,
+                {**own_event, "cursor": own_cursor}
+            )
             return
 
         # Xabar yuborish uchun umumiy qism
+        # recipient_id - shaxsiy chat, chat_id - guruh (yoki mavjud) chat
         recipient_id = data.get("recipient_id")
+        chat_id = data.get("chat_id")
         message_type = data.get("type", "text")  # text/photo/audio/video
         text = data.get("text")
-        media_data = data.get("media")  # base64 encoded file
+        media_data = data.get("media")  # base64 data URL yoki (msgpack'da) xom bayt
+        media_ext = data.get("ext")  # xom bayt bilan kelganda fayl kengaytmasi
+        upload_id = data.get("upload_id")  # messages/upload/ orqali bo'laklab yuklangan fayl
         duration = data.get("duration")  # audio length
-        waveform = data.get("waveform")  # audio visualization
+        waveform = data.get("waveform")  # audio visualization (ixtiyoriy, server fayldan qayta hisoblaydi)
 
         # Xabarni tekshirish: matn yoki media bo'lishi shart
-        if not recipient_id or (not text and not media_data):
-            await self.send(text_data=json.dumps({"error": "Xabar yoki media bo'lishi kerak"}))
+        if not (recipient_id or chat_id) or (not text and not media_data and not upload_id):
+            await self.send_payload({"error": "Xabar yoki media bo'lishi kerak"})
+            return
+        try:
+            recipient_id = int(recipient_id) if recipient_id else None
+            chat_id = int(chat_id) if chat_id and not recipient_id else None
+        except (TypeError, ValueError):
+            await self.send_payload({"error": "recipient_id yoki chat_id noto'g'ri"})
             return
-
-        sender = self.user
-        recipient = await self.get_user_by_id(recipient_id)
-
-        # Chat yaratish yoki mavjudini olish
-        chat = await self.get_or_create_chat(sender.id, recipient_id)
 
         """
-        media_data: 'data:image/png;base64,....'
-        Uni base64 dan faylga o'giramiz va Message modelga saqlaymiz.
+        media_data: 'data:image/png;base64,....' (JSON)
+        yoki msgpack frame'dagi xom bayt + ext ('png').
+        Uni faylga o'giramiz va Message modelga saqlaymiz.
         """
         media_file = None
-        if media_data:
-            header, b64 = media_data.split(";base64,")
-            ext = header.split("/")[-1]
-            media_file = ContentFile(base64.b64decode(b64), name=f"{now().timestamp()}.{ext}")
-
-        msg = await self.create_message(
-            chat=chat,
-            sender=sender,
-            message_type=message_type,
-            text=text or "",
-            file=media_file,
-            duration=duration,
-            waveform=waveform
-        )
+        if isinstance(media_data, bytes) and not upload_id:
+            ext = media_extension(media_ext)
+            if ext is None:
+                await self.send_payload({"error": "Fayl turi qo'llab-quvvatlanmaydi"})
+                return
+            media_file = ContentFile(media_data, name=f"{now().timestamp()}.{ext}")
+        elif media_data and not upload_id:
+            try:
+                header, b64 = str(media_data).split(";base64,")
+                content = base64.b64decode(b64)
+            except (ValueError, binascii.Error):
+                await self.send_payload({"error": "media noto'g'ri (data URL kerak)"})
+                return
+            ext = media_extension(header.split("/")[-1])
+            if ext is None:
+                await self.send_payload({"error": "Fayl turi qo'llab-quvvatlanmaydi"})
+                return
+            media_file = ContentFile(content, name=f"{now().timestamp()}.{ext}")
 
-        serialized_msg = await self.serialize_message(msg)
+        # Chat, xabar va payload - bitta tranzaksiya, bitta thread hop
+        try:
+            if media_file is None and not upload_id and writebehind.enabled():
+                # MESSAGE_DURABILITY = "batched": journal'dan keyin ack, INSERT fonda
+                sent = await writebehind.send_message(
+                    self.user,
+                    recipient_id=recipient_id,
+                    chat_id=chat_id,
+                    message_type=message_type,
+                    text=text or "",
+                )
+            else:
+                sent = await self.send_message(
+                    recipient_id=recipient_id,
+                    chat_id=chat_id,
+                    message_type=message_type,
+                    text=text or "",
+                    file=media_file,
+                    upload_id=upload_id,
+                    duration=duration,
+                    waveform=waveform
+                )
+        except SendMessageError as exc:
+            await self.send_payload({"error": str(exc)})
+            return
+        self.chat_actions.clear(sent.chat_id)
+        if not sent.is_group:
+            self.chat_peers[sent.chat_id] = sent.recipient_ids[0] if sent.recipient_ids else self.user.id
 
+        event = {
+            "type": "new_message",
+            "chat_id": sent.chat_id,
+            "message": sent.payload
+        }
         # Recipientga yuborish (group_send)
         """
-        Boshqa userga real-time xabar yuborish.
-        Ular `new_message` methodi orqali qabul qiladi.
+        Avval inboxga: recipient offline bo'lsa ham reconnectda sync orqali oladi.
+        Boshqa userga real-time xabar yuborish - ular `new_message` methodi orqali qabul qiladi.
+        Guruhda - bitta chat stream yozuvi va bitta group_send barcha a'zolarga (chat_cursor bilan).
         """
-        await self.channel_layer.group_send(
-            f"user_{recipient_id}",
-            {
-                'type': 'new_message',
-                'chat_id': chat.id,
-                'message': serialized_msg
-            }
-        )
+        if sent.is_group:
+            chat_cursor = await self.append_chat_inbox(sent.chat_id, event)
+            await self.group_send(
+                f"chat_{sent.chat_id}",
+                {**event, "chat_cursor": chat_cursor, "sender_channel": self.channel_name}
+            )
+            await self.send_payload({**event, "chat_cursor": chat_cursor})
+            return
 
-        await self.send(text_data=json.dumps({
-            "type": "new_message",
-            "chat_id": chat.id,
-            "message": serialized_msg
-        }))
+        cursors = await self.append_inbox([*sent.recipient_ids, self.user.id], event)
+        for recipient_id in sent.recipient_ids:
+            await self.group_send(
+                f"user_{recipient_id}",
+                {**event, "cursor": cursors.get(recipient_id)}
+            )
+        await self.send_payload({**event, "cursor": cursors.get(self.user.id)})
 
     # EVENT HANDLER
     async def new_message(self, event):
@@ -147,77 +452,223 @@ class ChatConsumer(AsyncWebsocketConsumer):
         group_send orqali yuborilgan xabarlarni qabul qiluvchi method.
         Bu method avtomatik chaqiriladi.
         """
-        await self.send(text_data=json.dumps({
+        if event.get("sender_channel") == self.channel_name:
+            return  # o'z xabari - yuboruvchiga allaqachon cursor bilan ketgan
+        if event["chat_id"] not in self.group_chat_ids and event["message"]["sender"]["id"] != self.user.id:
+            self.chat_peers[event["chat_id"]] = event["message"]["sender"]["id"]
+        await self.send_payload({
             "type": "new_message",
             "chat_id": event["chat_id"],
-            "message": event["message"]
-        }))
+            "message": event["message"],
+            **({"chat_cursor": event["chat_cursor"]} if "chat_cursor" in event else {"cursor": event.get("cursor")}),
+        })
 
-    # DB METHODS
+    async def message_updated(self, event):
+        """
+        Fonda tayyor bo'lgan derivative'lar (messenger.derivatives): message'da faqat id va o'zgargan maydonlar.
+        """
+        await self.send_payload({
+            "type": "message_updated",
+            "chat_id": event["chat_id"],
+            "message": event["message"],
+            **({"chat_cursor": event["chat_cursor"]} if "chat_cursor" in event else {"cursor": event.get("cursor")}),
+        })
 
-    @database_sync_to_async
-    def get_user_by_id(self, user_id):
+    async def new_chat(self, event):
         """
-        User ID orqali userni olish (sync -> async).
+        ChatCreateView yangi chat yaratganda ikkala userga keladi.
         """
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        return User.objects.get(id=user_id)
+        peer_ids = [uid for uid in event.get("member_ids", ()) if uid != self.user.id]
+        if peer_ids:
+            self.chat_peers[event["chat"]["id"]] = peer_ids[0]
+        await self.send_payload({
+            "type": "new_chat",
+            "chat": event["chat"],
+            "cursor": event.get("cursor")
+        })
 
-    @database_sync_to_async
-    def get_or_create_chat(self, user1_id, user2_id):
+    async def chat_joined(self, event):
         """
-        Ikki user o'rtasidagi chatni olish yoki yaratish.
-        Chat har doim user ID bo'yicha sort qilinadi (tartib muhim).
+        User guruh chatga qo'shildi: shu ulanish chat group'iga qo'shiladi.
         """
-        user1, user2 = sorted([user1_id, user2_id])
-        chat, _ = Chat.objects.get_or_create(user1_id=user1, user2_id=user2)
-        return chat
+        self.group_chat_ids.add(event["chat_id"])
+        await self.channel_layer.group_add(f"chat_{event['chat_id']}", self.channel_name)
+        await self.send_payload({
+            "type": "new_chat",
+            "chat": event["chat"],
+            "cursor": event.get("cursor")
+        })
 
-    @database_sync_to_async
-    def create_message(self, chat, sender, message_type, text="", file=None, duration=None, waveform=None):
+    async def chat_left(self, event):
         """
-        Yangi xabar yaratish.
-        Xabar turi (text, image, audio, video) avtomatik ishlaydi.
+        User guruh chatdan chiqarildi yoki o'zi chiqdi.
         """
-        return Message.objects.create(
-            chat=chat,
-            sender=sender,
-            type=message_type,
-            text=text,
-            file=file,
-            duration=duration,
-            waveform=waveform,
-            timestamp=now()
-        )
+        self.group_chat_ids.discard(event["chat_id"])
+        await self.channel_layer.group_discard(f"chat_{event['chat_id']}", self.channel_name)
+        await self.send_payload({
+            "type": "chat_left",
+            "chat_id": event["chat_id"],
+            "cursor": event.get("cursor")
+        })
+
+    async def chat_action(self, event):
+        """
+        Chat sherigining typing/recording holati. ttl - client shu muddatdan keyin o'zi o'chiradi.
+        """
+        if event["user_id"] == self.user.id:
+            return
+        await self.send_payload({
+            "type": "chat_action",
+            "chat_id": event["chat_id"],
+            "user_id": event["user_id"],
+            "action": event["action"],
+            "ttl": event["ttl"]
+        })
+
+    async def messages_read(self, event):
+        """
+        Read receipt: yuboruvchiga - xabarlari o'qildi, o'quvchining o'ziga - yangi unread_count.
+        """
+        await self.send_payload({
+            "type": "messages_read",
+            "chat_id": event["chat_id"],
+            "reader_id": event["reader_id"],
+            "message_id": event["message_id"],
+            **({"unread_count": event["unread_count"]} if "unread_count" in event else {}),
+            "cursor": event.get("cursor")
+        })
+
+    async def presence_changed(self, event):
+        """
+        Chat sheriklarining online/offline o'zgarishlari (batch).
+        """
+        await self.send_payload({
+            "type": "presence",
+            "users": event["users"]
+        })
+
+    # CHAT ACTIONS
+
+    async def publish_chat_action(self, chat_id, action):
+        """
+        Guruhda - chat group'iga, shaxsiy chatda - sherikning user group'iga. Inboxga yozilmaydi.
+        """
+        event = {
+            "type": "chat_action",
+            "chat_id": chat_id,
+            "user_id": self.user.id,
+            "action": action,
+            "ttl": settings.CHAT_ACTION_TTL,
+        }
+        if chat_id in self.group_chat_ids:
+            await self.group_send(f"chat_{chat_id}", event)
+        elif chat_id in self.chat_peers:
+            await self.group_send(f"user_{self.chat_peers[chat_id]}", event)
 
-    @database_sync_to_async
-    def get_chat_messages(self, chat_id):
+    async def group_send(self, group, event):
         """
-        Chatdagi barcha xabarlarni olish va serializer orqali formatlash.
+        channel_layer.group_send + latency metrikasi.
+        Layer xatosi (to'lgan kanal, Redis) yuboruvchini yiqitmaydi - event tashlab ketilgan deb sanaladi.
         """
-        from .serializer import MessageSerializer
+        start = time.perf_counter() if metrics.sampled() else None
         try:
-            chat = Chat.objects.get(id=chat_id)
-        except Chat.DoesNotExist:
-            return []
-        messages = chat.messages.order_by("timestamp")
-        return MessageSerializer(messages, many=True, context={"request": None}).data
+            await self.channel_layer.group_send(group, event)
+        except (ChannelFull, RedisError, OSError):
+            logger.exception("group_send: %s ga event yuborilmadi", group)
+            metrics.dropped_deliveries.inc("channel_layer")
+        finally:
+            if start is not None:
+                metrics.group_send_seconds.observe(time.perf_counter() - start)
 
-    @database_sync_to_async
-    def get_user_chats(self):
+    # INBOX
+
+    async def append_inbox(self, user_ids, event):
         """
-        Userga tegishli barcha chatlarni olish.
-        user1=user yoki user2=user bo’lsa - chat ro’yxatga qo’shiladi.
+        Eventni userlar inboxiga yozish. Redis ishlamasa xabar baribir real-time ketadi.
         """
-        from .serializer import ChatSerializer
-        qs = Chat.objects.filter(Q(user1=self.user) | Q(user2=self.user))
-        return ChatSerializer(qs, many=True, context={"user": self.user}).data
+        try:
+            return await inbox.append(user_ids, event)
+        except RedisError:
+            logger.exception("inbox: event yozilmadi")
+            metrics.dropped_deliveries.inc("inbox", amount=len(user_ids))
+            return {}
+
+    async def append_chat_inbox(self, chat_id, event):
+        try:
+            return await inbox.append_chat(chat_id, event)
+        except RedisError:
+            logger.exception("inbox: guruh eventi yozilmadi")
+            metrics.dropped_deliveries.inc("inbox")
+            return None
 
-    @database_sync_to_async
-    def serialize_message(self, message):
+    async def sync_inbox(self, cursor, limit=None, chat_cursors=None):
+        # JSON'da kalitlar string bo'ladi
+        chat_cursors = {int(chat_id): value for chat_id, value in (chat_cursors or {}).items() if str(chat_id).isdigit()}
+        try:
+            return await inbox.read_since(
+                self.user.id, cursor, limit, chat_ids=self.group_chat_ids, chat_cursors=chat_cursors
+            )
+        except RedisError:
+            logger.exception("inbox: sync o'qilmadi")
+            return None
+
+    # DB METHODS
+
+    @database_task
+    def send_message(self, **kwargs):
         """
-        Message modelini JSON ko'rinishiga o'tkazish.
+        Yangi xabar yuborish (services.send_message, sync -> async).
+        """
+        return send_message(self.user, **kwargs)
+
+    @database_task
+    def mark_read(self, chat_id, message_id):
+        return mark_read(self.user, chat_id, message_id)
+
+    @database_task
+    def get_chat_messages(self, chat_id, before=None, after=None, limit=None):
         """
-        from .serializer import MessageSerializer
-        return MessageSerializer(message, context={"request": None}).data
+        Chatdagi xabarlarning bitta sahifasini olish va encoder orqali formatlash.
+        User chat a'zosi bo'lmasa None.
+        """
+        with use_replica(self.user.id):
+            if not ChatMember.objects.filter(chat_id=chat_id, user=self.user).exists():
+                return None
+            messages = Message.objects.filter(chat_id=chat_id).values(*MESSAGE_FIELDS)
+            page = paginate_messages(messages, before=before, after=after, limit=limit)
+        page["messages"] = encode_message_rows(page.pop("items"))
+        return page
+
+    @database_task
+    def search_messages(self, query, chat_id=None, limit=None, offset=None):
+        with use_replica(self.user.id):
+            return search_messages(self.user, query, chat_id=chat_id, limit=limit, offset=offset)
+
+    @database_task
+    def get_chat_routes(self):
+        """
+        User a'zo bo'lgan chatlar, bitta so'rovda:
+        guruh chatlar id'lari va shaxsiy chatlar uchun {chat_id: sherik id}.
+        """
+        group_chat_ids, chat_peers = [], {}
+        rows = ChatMember.objects.filter(user=self.user).values_list(
+            "chat_id", "chat__is_group", "chat__user1_id", "chat__user2_id"
+        )
+        for chat_id, is_group, user1_id, user2_id in rows:
+            if is_group:
+                group_chat_ids.append(chat_id)
+            else:
+                chat_peers[chat_id] = user2_id if user1_id == self.user.id else user1_id
+        return group_chat_ids, chat_peers
+
+    @database_task
+    def get_user_chats(self):
+        """
+        Userga tegishli barcha chatlarni olish.
+        User a'zo bo'lgan (ChatMember) shaxsiy va guruh chatlar ro'yxatga qo'shiladi.
+        Oxirgi faollik bo'yicha tartiblanadi.
+        """
+        from .serializer import ChatSerializer
+        qs = Chat.objects.for_user(self.user)
+        with use_replica(self.user.id):
+            return ChatSerializer(qs, many=True, context={"user": self.user}).data
@@ -0,0 +1,36 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from channels.db import DatabaseSyncToAsync
+from django.conf import settings
+
+from . import metrics
+
+# Consumer'ning DB ishlari uchun alohida, hajmi cheklangan thread pool.
+# database_sync_to_async (va Django'ning aget/acreate'i ham) thread_sensitive=True bilan
+# bitta umumiy thread'da ishlaydi - bir workerdagi barcha socketlar navbatda turadi.
+# Bu yerda har bir thread o'z ulanishini saqlaydi (CONN_MAX_AGE), ya'ni pool = ulanishlar pool'i.
+executor = ThreadPoolExecutor(max_workers=settings.CONSUMER_DB_THREADS, thread_name_prefix="consumer-db")
+
+
+def database_task(func):
+    """
+    database_sync_to_async o'rnini bosadi: funksiya executor thread'larining birida,
+    eskirgan ulanishlar yopilib/qayta ishlatilib bajariladi.
+    Bir chaqiruv ichidagi tranzaksiya (transaction.atomic) bitta thread'da qoladi.
+    Kutish vaqti (navbat + so'rovlar) doppigram_db_call_seconds'ga yoziladi.
+    """
+    call = DatabaseSyncToAsync(func, thread_sensitive=False, executor=executor)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not metrics.sampled():
+            return await call(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await call(*args, **kwargs)
+        finally:
+            metrics.db_call_seconds.observe(time.perf_counter() - start, func.__name__)
+
+    return wrapper
@@ -0,0 +1,192 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from redis.exceptions import RedisError
+
+from users.cache import invalidate_user
+
+from . import inbox, metrics
+from .encoders import encode_derivatives
+from .imaging import EXTENSIONS, render_derivatives
+from .models import ChatMember, Message
+from .waveforms import compute_waveform
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+# Pillow/waveform ishi - alohida process'larda (GIL va event loop bo'shaydi).
+# Jobs - fayl o'qish, process natijasini kutish va saqlash uchun kichik thread pool.
+_process_pool = None
+_jobs = None
+_pool_lock = threading.Lock()
+
+
+def _pools():
+    global _process_pool, _jobs
+    with _pool_lock:
+        if _process_pool is None:
+            # spawn: daphne/asyncio thread'lari bor process'ni fork qilmaslik uchun
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _jobs = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix="image-derivatives")
+        return _process_pool, _jobs
+
+
+def _render(field_file, sizes):
+    with field_file.open("rb") as f:
+        data = f.read()
+    process_pool, _ = _pools()
+    return process_pool.submit(
+        render_derivatives, data, sizes,
+        settings.IMAGE_FORMAT, settings.IMAGE_QUALITY, settings.IMAGE_PLACEHOLDER_SIZE,
+    ).result()
+
+
+def _save(field_name, model, name, data):
+    field = model._meta.get_field(field_name)
+    return field.storage.save(field.generate_filename(None, name), ContentFile(data))
+
+
+def _run(job, *args):
+    close_old_connections()
+    try:
+        job(*args)
+    except Exception:
+        logger.exception("derivatives: %s(%s) bajarilmadi", job.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def schedule(job, *args):
+    """
+    Job'ni fonda bajarish (request/event loop kutmaydi).
+    Tranzaksiya ichidan chaqirilsa transaction.on_commit orqali chaqirish kerak.
+    """
+    _, jobs = _pools()
+    jobs.submit(_run, job, *args)
+
+
+async def _publish(chat_id, is_group, member_ids, event):
+    channel_layer = get_channel_layer()
+    try:
+        if is_group:
+            cursors = {"chat_cursor": await inbox.append_chat(chat_id, event)}
+        else:
+            cursors = await inbox.append(member_ids, event)
+    except RedisError:
+        metrics.dropped_deliveries.inc("inbox")
+        cursors = {}
+    if is_group:
+        groups = {f"chat_{chat_id}": {"chat_cursor": cursors.get("chat_cursor")}}
+    else:
+        groups = {f"user_{uid}": {"cursor": cursors.get(uid)} for uid in member_ids}
+    for group, cursor in groups.items():
+        try:
+            await channel_layer.group_send(group, {**event, **cursor})
+        except (ChannelFull, RedisError, OSError):
+            metrics.dropped_deliveries.inc("channel_layer")
+
+
+def message_updated(message_id, row):
+    """
+    Derivative tayyor bo'ldi: chatga message_updated eventi (faqat o'zgargan maydonlar).
+    Guruhda - chat stream'i va chat group'i, shaxsiy chatda - ikkala a'zoning inbox'i va user group'i
+    (yuboruvchining boshqa qurilmalari ham yangilanadi).
+    """
+    chat = Message.objects.filter(id=message_id).values("chat_id", "chat__is_group").first()
+    if chat is None:
+        return
+    member_ids = [] if chat["chat__is_group"] else list(
+        ChatMember.objects.filter(chat_id=chat["chat_id"]).values_list("user_id", flat=True)
+    )
+    event = {
+        "type": "message_updated",
+        "chat_id": chat["chat_id"],
+        "message": {"id": message_id, **encode_derivatives(row)},
+    }
+    async_to_sync(_publish)(chat["chat_id"], chat["chat__is_group"], member_ids, event)
+
+
+def process_message_image(message_id):
+    """
+    Rasm xabar uchun thumbnail, preview va placeholder.
+    """
+    msg = Message.objects.filter(id=message_id, type="image").only("id", "file").first()
+    if msg is None or not msg.file:
+        return
+    derivatives, placeholder = _render(msg.file, settings.IMAGE_MESSAGE_SIZES)
+    ext = EXTENSIONS[settings.IMAGE_FORMAT]
+    row = {
+        "thumbnail": _save("thumbnail", Message, f"{message_id}.{ext}", derivatives["thumbnail"]),
+        "preview": _save("preview", Message, f"{message_id}.{ext}", derivatives["preview"]),
+        "placeholder": placeholder,
+    }
+    Message.objects.filter(id=message_id).update(**row)
+    message_updated(message_id, row)
+
+
+def process_avatar(user_id):
+    """
+    Avatar uchun kichik nusxa va placeholder. Eski nusxa o'chiriladi.
+    """
+    user = User.objects.filter(id=user_id).only("id", "avatar", "avatar_thumbnail").first()
+    if user is None:
+        return
+    old_thumbnail = user.avatar_thumbnail.name
+    if user.avatar:
+        derivatives, placeholder = _render(user.avatar, {"thumbnail": settings.IMAGE_AVATAR_SIZE})
+        thumbnail = _save(
+            "avatar_thumbnail", User, f"{user_id}.{EXTENSIONS[settings.IMAGE_FORMAT]}", derivatives["thumbnail"]
+        )
+    else:
+        thumbnail, placeholder = None, ""
+
+    User.objects.filter(id=user_id).update(avatar_thumbnail=thumbnail, avatar_placeholder=placeholder)
+    invalidate_user(user_id)
+    if old_thumbnail and old_thumbnail != thumbnail:
+        user.avatar_thumbnail.storage.delete(old_thumbnail)
+
+
+def process_waveform(message_id):
+    """
+    Audio/round video xabar uchun waveform (va client yubormagan bo'lsa duration).
+    Storage lokal bo'lmasa fayl vaqtinchalik faylga yoziladi (ffmpeg path bilan ishlaydi).
+    """
+    msg = Message.objects.filter(id=message_id, type__in=("audio", "round_video")).only("id", "file", "duration").first()
+    if msg is None or not msg.file:
+        return
+    process_pool, _ = _pools()
+    args = (settings.WAVEFORM_SAMPLES, settings.FFMPEG_BINARY)
+    try:
+        path = msg.file.path
+    except NotImplementedError:
+        path = None
+
+    if path:
+        waveform, duration = process_pool.submit(compute_waveform, path, *args).result()
+    else:
+        suffix = os.path.splitext(msg.file.name)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix) as tmp, msg.file.open("rb") as f:
+            for chunk in f.chunks():
+                tmp.write(chunk)
+            tmp.flush()
+            waveform, duration = process_pool.submit(compute_waveform, tmp.name, *args).result()
+
+    if waveform is None:
+        return
+    row = {"waveform": waveform, "duration": msg.duration if msg.duration is not None else round(duration, 2)}
+    Message.objects.filter(id=message_id).update(**row)
+    message_updated(message_id, row)
@@ -0,0 +1,122 @@
+# Realtime yo'l uchun tezkor message encoder.
+# MessageSerializer bilan bir xil JSON shaklini beradi, lekin DRF field'larisiz:
+# model obyektidan ham, `.values()` qatorlaridan ham ishlaydi.
+from datetime import timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+
+from . import waveforms
+from .models import Message
+
+User = get_user_model()
+
+# `.values()` uchun kerakli ustunlar - model obyektlari yaratilmaydi
+MESSAGE_FIELDS = (
+    'id', 'chat_id', 'sender_id', 'sender__full_name', 'sender__avatar',
+    'sender__avatar_thumbnail', 'sender__avatar_placeholder',
+    'type', 'text', 'file', 'thumbnail', 'preview', 'placeholder',
+    'duration', 'waveform', 'timestamp', 'is_read',
+)
+
+_file_url = Message._meta.get_field('file').storage.url
+_avatar_url = User._meta.get_field('avatar').storage.url
+
+
+def format_datetime(value):
+    """
+    DRF DateTimeField bilan bir xil format: UTC, '+00:00' o'rniga 'Z'.
+    """
+    value = value.astimezone(dt_timezone.utc).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _url(get_url, name, request):
+    if not name:
+        return None
+    url = get_url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def _encode(row, sender, request):
+    return {
+        'id': row['id'],
+        'chat': row['chat_id'],
+        'sender': sender,
+        'type': row['type'],
+        'text': row['text'],
+        'file_url': _url(_file_url, row['file'], request),
+        'thumbnail_url': _url(_file_url, row['thumbnail'], request),
+        'preview_url': _url(_file_url, row['preview'], request),
+        'placeholder': row['placeholder'] or None,
+        'duration': row['duration'],
+        'waveform': waveforms.encode(row['waveform']),
+        'timestamp': format_datetime(row['timestamp']),
+        'is_read': row['is_read'],
+    }
+
+
+def encode_message_rows(rows, request=None):
+    """
+    `.values(*MESSAGE_FIELDS)` qatorlarini JSON'ga tayyor dict'larga o'girish.
+    Bir sahifadagi bir xil sender faqat bir marta encode qilinadi.
+    """
+    senders = {}
+    result = []
+    for row in rows:
+        sender = senders.get(row['sender_id'])
+        if sender is None:
+            sender = senders[row['sender_id']] = {
+                'id': row['sender_id'],
+                'full_name': row['sender__full_name'],
+                'avatar': _url(_avatar_url, row['sender__avatar'], request),
+                'avatar_thumbnail': _url(_avatar_url, row['sender__avatar_thumbnail'], request),
+                'avatar_placeholder': row['sender__avatar_placeholder'] or None,
+            }
+        result.append(_encode(row, sender, request))
+    return result
+
+
+def encode_derivatives(row, request=None):
+    """
+    message_updated eventi uchun fonda tayyor bo'lgan maydonlar, _encode bilan bir xil nomlarda:
+    rasm - thumbnail/preview/placeholder, audio - waveform/duration.
+    """
+    encoded = {}
+    if 'thumbnail' in row:
+        encoded.update(
+            thumbnail_url=_url(_file_url, row['thumbnail'], request),
+            preview_url=_url(_file_url, row['preview'], request),
+            placeholder=row['placeholder'] or None,
+        )
+    if 'waveform' in row:
+        encoded.update(duration=row['duration'], waveform=waveforms.encode(row['waveform']))
+    return encoded
+
+
+def encode_message(msg, request=None):
+    """
+    Bitta Message obyektini encode qilish (yangi yuborilgan xabar uchun).
+    """
+    sender = msg.sender
+    return _encode({
+        'id': msg.id,
+        'chat_id': msg.chat_id,
+        'type': msg.type,
+        'text': msg.text,
+        'file': msg.file.name,
+        'thumbnail': msg.thumbnail.name,
+        'preview': msg.preview.name,
+        'placeholder': msg.placeholder,
+        'duration': msg.duration,
+        'waveform': msg.waveform,
+        'timestamp': msg.timestamp,
+        'is_read': msg.is_read,
+    }, {
+        'id': sender.id,
+        'full_name': sender.full_name,
+        'avatar': _url(_avatar_url, sender.avatar.name, request),
+        'avatar_thumbnail': _url(_avatar_url, sender.avatar_thumbnail.name, request),
+        'avatar_placeholder': sender.avatar_placeholder or None,
+    }, request)
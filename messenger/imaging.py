@@ -0,0 +1,48 @@
+# Rasm derivativlari (thumbnail/preview/placeholder) - faqat Pillow, Django'siz.
+# Funksiyalar alohida process'larda (ProcessPoolExecutor) ishlaydi, shuning uchun
+# bu modul model yoki settings import qilmaydi - barcha parametrlar argument bilan keladi.
+import base64
+from io import BytesIO
+
+from PIL import Image, ImageFilter, ImageOps
+
+CONTENT_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+
+def _prepare(data, max_size):
+    image = Image.open(BytesIO(data))
+    # JPEG'da dekodlashning o'zida kichraytirish (DCT scaling) - to'liq o'lchamda ochilmaydi
+    image.draft("RGB", (max_size, max_size))
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    return image.convert("RGBA" if has_alpha else "RGB")
+
+
+def _encode(image, image_format, quality):
+    if image_format == "JPEG" and image.mode == "RGBA":
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    # exif/icc berilmaydi - metadata (GPS, kamera) saqlanmaydi
+    image.save(buffer, format=image_format, quality=quality, method=4 if image_format == "WEBP" else 0)
+    return buffer.getvalue()
+
+
+def render_derivatives(data, sizes, image_format="WEBP", quality=80, placeholder_size=16):
+    """
+    Asl rasmdan har bir o'lcham uchun kichraytirilgan nusxa va blur placeholder.
+    sizes - {"thumbnail": 320, "preview": 1280} (eng katta tomon, kattalashtirilmaydi).
+    ({nom: bytes}, "data:image/...;base64,...") qaytaradi.
+    """
+    image = _prepare(data, max(sizes.values()))
+
+    derivatives = {}
+    for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size), Image.LANCZOS)
+        derivatives[name] = _encode(image, image_format, quality)
+
+    tiny = image.copy()
+    tiny.thumbnail((placeholder_size, placeholder_size), Image.BILINEAR)
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    placeholder = base64.b64encode(_encode(tiny, image_format, 30)).decode()
+    return derivatives, f"data:{CONTENT_TYPES[image_format]};base64,{placeholder}"
@@ -0,0 +1,167 @@
+import time
+
+import msgpack
+from django.conf import settings
+
+from .redis_client import get_redis
+
+# inbox:<user_id> - Redis stream: userga yetkazilishi kerak bo'lgan eventlar.
+# Stream id - clientning cursori; reconnectda faqat undan keyingilari olinadi.
+INBOX_KEY = "inbox:{}"
+# inbox:chat:<chat_id> - guruh chat xabarlari: a'zolar soniga bog'liq bo'lmagan bitta XADD.
+# Client har bir guruh uchun alohida cursor saqlaydi (chat_cursor), sync ularni birga o'qiydi.
+CHAT_INBOX_KEY = "inbox:chat:{}"
+EMPTY_CURSOR = "0-0"
+
+
+def _add(pipe, key, data, min_id):
+    pipe.xadd(key, {"e": data}, maxlen=settings.INBOX_MAX_LEN, approximate=True)
+    pipe.xtrim(key, minid=min_id, approximate=True)
+    pipe.expire(key, settings.INBOX_MAX_AGE)
+
+
+async def append(user_ids, event):
+    """
+    Eventni bir nechta userning inboxiga yozish (bitta pipeline).
+    Stream uzunligi (INBOX_MAX_LEN) va yoshi (INBOX_MAX_AGE) bo'yicha qisqartiriladi.
+    {user_id: cursor} qaytaradi.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    data = msgpack.packb(event, use_bin_type=True)
+    min_id = int((time.time() - settings.INBOX_MAX_AGE) * 1000)
+
+    async with get_redis().pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            _add(pipe, INBOX_KEY.format(user_id), data, min_id)
+        results = await pipe.execute()
+
+    return {user_id: results[i * 3].decode() for i, user_id in enumerate(user_ids)}
+
+
+async def append_chat(chat_id, event):
+    """
+    Guruh chat eventini chat stream'iga yozish. chat_cursor qaytaradi.
+    """
+    data = msgpack.packb(event, use_bin_type=True)
+    min_id = int((time.time() - settings.INBOX_MAX_AGE) * 1000)
+    async with get_redis().pipeline(transaction=False) as pipe:
+        _add(pipe, CHAT_INBOX_KEY.format(chat_id), data, min_id)
+        results = await pipe.execute()
+    return results[0].decode()
+
+
+async def latest_cursor(user_id):
+    """
+    Inboxdagi oxirgi event id'si (to'liq ro'yxat yuborilganda client shundan davom etadi).
+    """
+    entries = await get_redis().xrevrange(INBOX_KEY.format(user_id), count=1)
+    return entries[0][0].decode() if entries else EMPTY_CURSOR
+
+
+async def latest_chat_cursors(chat_ids):
+    """
+    Guruh chat stream'larining oxirgi id'lari: {chat_id: cursor} (bo'sh stream'lar kirmaydi).
+    """
+    chat_ids = list(chat_ids)
+    if not chat_ids:
+        return {}
+    async with get_redis().pipeline(transaction=False) as pipe:
+        for chat_id in chat_ids:
+            pipe.xrevrange(CHAT_INBOX_KEY.format(chat_id), count=1)
+        results = await pipe.execute()
+    return {chat_id: entries[0][0].decode() for chat_id, entries in zip(chat_ids, results) if entries}
+
+
+async def read_since(user_id, cursor, limit=None, chat_ids=(), chat_cursors=None):
+    """
+    Cursordan keyingi eventlar: user inboxi va userning guruh chatlari (chat_ids) stream'lari,
+    stream id (vaqt) tartibida birlashtirilgan. chat_cursors - {chat_id: chat_cursor};
+    client cursor bermagan guruh user cursorining vaqtidan boshlab o'qiladi.
+    Cursor allaqachon o'chirilgan (juda eski) bo'lsa - reset: client to'liq yangilanishi kerak.
+    """
+    cursor = str(cursor)
+    chat_cursors = chat_cursors or {}
+    try:
+        limit = max(1, min(int(limit or settings.INBOX_SYNC_LIMIT), settings.INBOX_SYNC_LIMIT))
+    except (TypeError, ValueError):
+        limit = settings.INBOX_SYNC_LIMIT
+    if not _valid(cursor):
+        return await _reset(user_id, chat_ids)
+
+    # (key, chat_id yoki None, xrange min, client bergan cursor)
+    streams = [(INBOX_KEY.format(user_id), None, f"({cursor}", cursor)]
+    for chat_id in chat_ids:
+        chat_cursor = str(chat_cursors.get(chat_id) or "")
+        if _valid(chat_cursor):
+            streams.append((CHAT_INBOX_KEY.format(chat_id), chat_id, f"({chat_cursor}", chat_cursor))
+        else:
+            streams.append((CHAT_INBOX_KEY.format(chat_id), chat_id, f"{cursor.split('-')[0]}-0", None))
+
+    async with get_redis().pipeline(transaction=False) as pipe:
+        for key, _, start, _ in streams:
+            pipe.xrange(key, count=1)
+            pipe.xrange(key, min=start, count=limit + 1)
+        results = await pipe.execute()
+
+    entries = []
+    for (key, chat_id, _, given), first, stream_entries in zip(streams, results[::2], results[1::2]):
+        # cursor va birinchi saqlangan event orasida yo'qolgan eventlar bo'lishi mumkin.
+        # Guruh stream'i bo'sh bo'lishi (xabar bo'lmagan) normal holat.
+        if chat_id is None:
+            lost = cursor != EMPTY_CURSOR and (not first or _older(cursor, first[0][0].decode()))
+        else:
+            lost = given is not None and given != EMPTY_CURSOR and first and _older(given, first[0][0].decode())
+        if lost:
+            return await _reset(user_id, chat_ids)
+        entries += [(_key(entry_id.decode()), entry_id.decode(), chat_id, fields) for entry_id, fields in stream_entries]
+
+    entries.sort(key=lambda entry: entry[0])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    events = []
+    new_cursor = cursor
+    new_chat_cursors = {chat_id: chat_cursors[chat_id] for chat_id in chat_ids if chat_id in chat_cursors}
+    for _, entry_id, chat_id, fields in entries:
+        event = msgpack.unpackb(fields[b"e"], raw=False)
+        if chat_id is None:
+            event["cursor"] = new_cursor = entry_id
+        else:
+            event["chat_cursor"] = new_chat_cursors[chat_id] = entry_id
+        events.append(event)
+
+    return {
+        "reset": False,
+        "events": events,
+        "cursor": new_cursor,
+        "chat_cursors": new_chat_cursors,
+        "has_more": has_more,
+    }
+
+
+async def _reset(user_id, chat_ids):
+    return {
+        "reset": True,
+        "events": [],
+        "cursor": await latest_cursor(user_id),
+        "chat_cursors": await latest_chat_cursors(chat_ids),
+        "has_more": False,
+    }
+
+
+def _key(stream_id):
+    return tuple(int(part) for part in stream_id.split("-"))
+
+
+def _valid(cursor):
+    try:
+        return len(_key(cursor)) == 2
+    except ValueError:
+        return False
+
+
+def _older(cursor, first_id):
+    """
+    cursor birinchi saqlangan eventdan oldingi (trim qilingan) eventga ishora qiladimi.
+    """
+    return _key(cursor) < _key(first_id)
@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+from django.conf import settings
+
+# Chat action -> shu action bilan yakunlanadigan Message.type
+CHAT_ACTIONS = {
+    "typing": "text",
+    "recording_audio": "audio",
+    "recording_round_video": "round_video",
+}
+CANCEL = "cancel"
+
+
+_states = {}  # loop -> {(user_id, chat_id): ChatActionState}
+
+
+class ChatActionState:
+    """
+    Userning bitta chatdagi holati. owner - oxirgi kiritgan ulanishning ChatActionThrottle'i.
+    """
+
+    __slots__ = ("action", "sent_at", "last_input", "task", "owner")
+
+    def __init__(self, owner):
+        self.action = None  # sheriklarga yuborilgan holat
+        self.sent_at = 0
+        self.last_input = 0  # clientdan oxirgi kelgan vaqt
+        self.task = None
+        self.owner = owner
+
+
+def _loop_states():
+    loop = asyncio.get_running_loop()
+    states = _states.get(loop)
+    if states is None:
+        for old_loop in [old for old in _states if old.is_closed()]:
+            del _states[old_loop]
+        states = _states[loop] = {}
+    return states
+
+
+class ChatActionThrottle:
+    """
+    Typing/recording holatlari (faqat xotirada, bazasiz). Holat worker bo'yicha (user_id, chat_id) kalitida:
+    userning shu workerdagi barcha ulanishlari (tab, qurilma) bitta holatni bo'lishadi.
+    1) bir xil holat har chat uchun CHAT_ACTION_THROTTLE sekundda ko'pi bilan bir marta yuboriladi
+    2) holat o'zgarsa (typing -> recording_audio, cancel) darhol yuboriladi
+    3) client CHAT_ACTION_TTL davomida hech narsa yubormasa server o'zi cancel yuboradi
+    Muddati o'tgan holatning cancel'i oxirgi kiritgan ulanish orqali ketadi; ulanish yopilganda
+    faqat u oxirgi kiritgan holatlar bekor qilinadi. Turli workerlardagi ulanishlar holatni bo'lishmaydi.
+    publish(chat_id, action) - eventni chat sheriklariga yetkazuvchi coroutine.
+    """
+
+    def __init__(self, user_id, publish):
+        self.user_id = user_id
+        self.publish = publish
+        self.states = _loop_states()
+
+    async def update(self, chat_id, action):
+        now = time.monotonic()
+        key = (self.user_id, chat_id)
+        state = self.states.get(key)
+
+        if action == CANCEL:
+            self.clear(chat_id)
+            if state and state.action:
+                await self.publish(chat_id, CANCEL)
+            return
+
+        if state is None:
+            state = self.states[key] = ChatActionState(self)
+        state.owner = self
+        state.last_input = now
+        if state.task is None:
+            state.task = asyncio.create_task(self.expire(key, state))
+        if state.action == action and now - state.sent_at < settings.CHAT_ACTION_THROTTLE:
+            return  # takroriy holat - sheriklar hali ttl ichida
+        state.action, state.sent_at = action, now
+        await self.publish(chat_id, action)
+
+    def clear(self, chat_id):
+        """
+        Holatni event yubormasdan tozalash (masalan xabar yuborilganda - new_message o'zi yetarli).
+        """
+        state = self.states.pop((self.user_id, chat_id), None)
+        if state and state.task and state.task is not asyncio.current_task():
+            state.task.cancel()
+
+    async def expire(self, key, state):
+        # Har holat uchun bitta task: har kiritishda yangisi yaratilmaydi, deadline siljiydi
+        while self.states.get(key) is state:
+            delay = state.last_input + settings.CHAT_ACTION_TTL - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        if self.states.get(key) is not state:
+            return
+        del self.states[key]
+        if state.action:
+            await state.owner.publish(key[1], CANCEL)
+
+    async def close(self):
+        """
+        Ulanish yopildi: shu ulanish oxirgi kiritgan faol holatlar uchun cancel.
+        """
+        owned = [key for key, state in self.states.items() if state.owner is self]
+        chat_ids = [key[1] for key in owned if self.states[key].action]
+        for key in owned:
+            self.clear(key[1])
+        await asyncio.gather(*(self.publish(chat_id, CANCEL) for chat_id in chat_ids))
@@ -0,0 +1,79 @@
+import asyncio
+import statistics
+import time
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from messenger.db import database_task
+from messenger.services import send_message
+
+User = get_user_model()
+PHONE_PREFIX = "bench-db-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Bir workerda bir vaqtda xabar yuborayotgan N ta sender: database_sync_to_async "
+        "(bitta umumiy thread) va messenger.db.database_task (CONSUMER_DB_THREADS ta thread) solishtiriladi. "
+        "Natija PostgreSQL'da ma'noli (SQLite yozuvlarni baribir ketma-ket bajaradi)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--senders", type=int, default=50)
+        parser.add_argument("--messages", type=int, default=20, help="har bir sender uchun")
+        parser.add_argument("--latency", type=float, default=0.0,
+                            help="har bir chaqiruvga qo'shiladigan kutish, ms (bazagacha tarmoq RTT'si)")
+
+    def handle(self, *args, **options):
+        senders, recipient = self.create_users(options["senders"])
+        try:
+            for name, wrapper in (
+                ("database_sync_to_async", database_sync_to_async),
+                (f"database_task x{settings.CONSUMER_DB_THREADS}", database_task),
+            ):
+                elapsed, latencies = asyncio.run(
+                    self.run(wrapper, senders, recipient, options["messages"], options["latency"] / 1000)
+                )
+                total = len(latencies)
+                self.stdout.write(
+                    f"{name:<28} {elapsed:7.2f} s  {total / elapsed:8.0f} msg/s  "
+                    f"p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+                    f"p95 {latencies[int(total * 0.95) - 1] * 1000:7.1f} ms"
+                )
+        finally:
+            User.objects.filter(phone__startswith=PHONE_PREFIX).delete()
+
+    @staticmethod
+    def create_users(count):
+        User.objects.filter(phone__startswith=PHONE_PREFIX).delete()
+        users = User.objects.bulk_create(
+            [User(phone=f"{PHONE_PREFIX}{i}", full_name=f"Bench {i}") for i in range(count + 1)]
+        )
+        if users[0].pk is None:  # bulk_create id qaytarmaydigan baza
+            users = list(User.objects.filter(phone__startswith=PHONE_PREFIX).order_by("id"))
+        return users[1:], users[0]
+
+    @staticmethod
+    async def run(wrapper, senders, recipient, messages, latency):
+        def send(sender, i):
+            if latency:
+                time.sleep(latency)
+            return send_message(sender, recipient_id=recipient.id, text=f"bench {i}")
+
+        call = wrapper(send)
+        latencies = []
+
+        async def sender_loop(sender):
+            for i in range(messages):
+                start = time.perf_counter()
+                await call(sender, i)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(sender_loop(sender) for sender in senders))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        return elapsed, latencies
@@ -0,0 +1,94 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from messenger.encoders import MESSAGE_FIELDS, encode_message, encode_message_rows
+from messenger.models import Message
+from messenger.serializer import MessageSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "MessageSerializer va tezkor encoder'ni N ta xabarda solishtirish (bazasiz)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        count, repeat = options["count"], options["repeat"]
+        messages, rows = self.build_messages(count)
+
+        # Avval natijalar bir xil ekanini tekshiramiz
+        expected = json.dumps(MessageSerializer(messages, many=True, context={"request": None}).data)
+        if json.dumps(encode_message_rows(rows)) != expected:
+            self.stderr.write(self.style.ERROR("encode_message_rows natijasi serializer bilan mos emas"))
+            return
+        if json.dumps([encode_message(m) for m in messages]) != expected:
+            self.stderr.write(self.style.ERROR("encode_message natijasi serializer bilan mos emas"))
+            return
+
+        cases = [
+            ("MessageSerializer", lambda: MessageSerializer(messages, many=True, context={"request": None}).data),
+            ("encode_message", lambda: [encode_message(m) for m in messages]),
+            ("encode_message_rows", lambda: encode_message_rows(rows)),
+        ]
+        baseline = None
+        for name, func in cases:
+            best = min(self.timeit(func) for _ in range(repeat))
+            baseline = baseline or best
+            self.stdout.write(
+                f"{name:<22} {best * 1000:9.1f} ms  {count / best:12.0f} msg/s  x{baseline / best:.1f}"
+            )
+
+    @staticmethod
+    def timeit(func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    @staticmethod
+    def build_messages(count):
+        senders = [
+            User(
+                id=i, full_name=f"User {i}", phone=str(i),
+                avatar=f"profil/image/{i}.jpg" if i % 2 else None,
+                avatar_thumbnail=f"profil/thumbs/{i}.webp" if i % 2 else None,
+                avatar_placeholder="data:image/webp;base64,UklGRg" if i % 2 else "",
+            )
+            for i in range(1, 51)
+        ]
+        timestamp = now()
+        messages, rows = [], []
+        for i in range(count):
+            sender = senders[i % len(senders)]
+            is_image = i % 10 == 5
+            msg = Message(
+                id=i + 1, chat_id=1, sender=sender,
+                type="audio" if i % 10 == 0 else "image" if is_image else "text",
+                text=f"Xabar {i}",
+                file=f"chat/files/{i}.ogg" if i % 10 == 0 else f"chat/files/{i}.jpg" if is_image else None,
+                thumbnail=f"chat/thumbs/{i}.webp" if is_image else None,
+                preview=f"chat/previews/{i}.webp" if is_image else None,
+                placeholder="data:image/webp;base64,UklGRg" if is_image else "",
+                duration=3.5 if i % 10 == 0 else None,
+                waveform=bytes(range(0, 256, 4)) if i % 10 == 0 else None,
+                timestamp=timestamp, is_read=bool(i % 3),
+            )
+            messages.append(msg)
+            rows.append({
+                "id": msg.id, "chat_id": msg.chat_id, "sender_id": sender.id,
+                "sender__full_name": sender.full_name, "sender__avatar": sender.avatar.name,
+                "sender__avatar_thumbnail": sender.avatar_thumbnail.name,
+                "sender__avatar_placeholder": sender.avatar_placeholder,
+                "type": msg.type, "text": msg.text, "file": msg.file.name,
+                "thumbnail": msg.thumbnail.name, "preview": msg.preview.name, "placeholder": msg.placeholder,
+                "duration": msg.duration,
+                "waveform": msg.waveform, "timestamp": msg.timestamp, "is_read": msg.is_read,
+            })
+        assert set(rows[0]) == set(MESSAGE_FIELDS)
+        return messages, rows
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from messenger.uploads import delete_stale_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Tashlab ketilgan bo'laklab yuklashlarni tozalash: CHUNKED_UPLOAD_EXPIRY dan beri chunk kelmagan "
+        "pending upload qatori va uning .part fayli o'chiriladi. Cron'da ishlatiladi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-age", type=float, default=settings.CHUNKED_UPLOAD_EXPIRY,
+                            help="sekund, default CHUNKED_UPLOAD_EXPIRY")
+
+    def handle(self, *args, **options):
+        deleted = delete_stale_uploads(options["max_age"])
+        self.stdout.write(self.style.SUCCESS(f"{deleted} ta eskirgan upload o'chirildi"))
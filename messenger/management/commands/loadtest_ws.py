@@ -0,0 +1,329 @@
+import asyncio
+import base64
+import json
+import os
+import random
+import ssl
+import struct
+import time
+from urllib.parse import urlparse
+
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils.timezone import now
+from rest_framework_simplejwt.tokens import AccessToken
+
+from messenger.models import Chat, Message
+
+User = get_user_model()
+PHONE_PREFIX = "loadtest-"
+ACTIONS = ("send", "fetch_messages", "fetch_chats")
+# Action -> kutilayotgan javob turi
+REPLY_TYPES = {"send": "new_message", "fetch_messages": "messages_list", "fetch_chats": "chat_list"}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def parse_mix(value):
+    """
+    "send=70,fetch_messages=20,fetch_chats=10" -> {action: vazn}
+    """
+    mix = {}
+    try:
+        for part in value.split(","):
+            action, weight = part.split("=")
+            mix[action.strip()] = float(weight)
+    except ValueError:
+        raise CommandError("--mix formati: send=70,fetch_messages=20,fetch_chats=10")
+    unknown = set(mix) - set(ACTIONS)
+    if unknown:
+        raise CommandError(f"Noma'lum action: {', '.join(sorted(unknown))}")
+    return mix
+
+
+class RemoteCommunicator:
+    """
+    WebsocketCommunicator'ning shu yerda ishlatiladigan qismi, ishlab turgan server uchun (--url).
+    Minimal RFC 6455 client (stdlib): JSON text frame'lar, ping'ga pong.
+    autobahn'ning asyncio clienti ishlamaydi - daphne txaio'ni Twisted'ga bog'lab qo'yadi.
+    """
+
+    def __init__(self, url, token):
+        self.url = urlparse(url)
+        self.token = token
+        self.reader = self.writer = None
+
+    async def connect(self, timeout):
+        secure = self.url.scheme == "wss"
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(
+            self.url.hostname, self.url.port or (443 if secure else 80),
+            ssl=ssl.create_default_context() if secure else None,
+        ), timeout)
+        path = (self.url.path or "/") + (f"?{self.url.query}" if self.url.query else "")
+        self.writer.write((
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {self.url.netloc}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {base64.b64encode(os.urandom(16)).decode()}\r\n"
+            "Sec-WebSocket-Version: 13\r\n"
+            f"Authorization: Bearer {self.token}\r\n\r\n"
+        ).encode())
+        head = await asyncio.wait_for(self.reader.readuntil(b"\r\n\r\n"), timeout)
+        return head.split(b" ", 2)[1] == b"101", None
+
+    def _send_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, 0x80 | length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, length)
+        mask = os.urandom(4)
+        # client frame'lari mask qilinadi (XOR butun payload bo'yicha bitta int amalida)
+        key = (mask * (length // 4 + 1))[:length]
+        masked = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+        self.writer.write(header + mask + masked)
+
+    async def _receive_message(self):
+        message = b""
+        while True:
+            first, second = await self.reader.readexactly(2)
+            opcode, length = first & 0x0F, second & 0x7F
+            if length == 126:
+                length, = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                length, = struct.unpack("!Q", await self.reader.readexactly(8))
+            payload = await self.reader.readexactly(length)  # server frame'lari mask qilinmaydi
+            if opcode == 0x8:
+                raise ConnectionError("ulanish yopildi")
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            message += payload
+            if first & 0x80:
+                return message
+
+    async def send_json_to(self, data):
+        self._send_frame(0x1, json.dumps(data).encode())
+        await self.writer.drain()
+
+    async def receive_json_from(self, timeout):
+        return json.loads(await asyncio.wait_for(self._receive_message(), timeout))
+
+    async def disconnect(self):
+        if self.writer is not None:
+            self._send_frame(0x8, struct.pack("!H", 1000))
+            self.writer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "config.asgi.application'ga N ta simulyatsiya qilingan WebSocket client (ws/chat/, JWT bilan): "
+        "send / fetch_messages / fetch_chats aralashmasi, har bir action uchun p50/p95/p99 va throughput.\n"
+        "Default: ilova shu process ichida ishlaydi (WebsocketCommunicator) - tarmoq va daphne parsing hisobga kirmaydi. "
+        "Presence va inbox uchun lokal Redis kerak (--redis-url); channel layer - in-memory yoki Redis.\n"
+        "WS_RATE_LIMITS shu process ichida o'chiriladi (--rate-limits - yoqilgan holda o'lchash).\n"
+        "--url ws://host:port/ws/chat/ - ishlab turgan serverga (runserver, manage.py serve); "
+        "server shu bazani ishlatishi va WS_RATE_LIMITS=off env bilan ishga tushirilishi kerak, "
+        "aks holda javoblar limitga uriladi (rate_limited ustuni).\n"
+        "Test userlari (phone loadtest-*) va ularning chatlari yaratiladi va oxirida o'chiriladi. "
+        "SQLite yozuvlarni bloklaydi (database is locked) - o'lchov uchun PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=100)
+        parser.add_argument("--duration", type=float, default=30, help="sekund")
+        parser.add_argument("--mix", default="send=70,fetch_messages=20,fetch_chats=10")
+        parser.add_argument("--think", type=float, default=0, help="actionlar orasidagi pauza, ms")
+        parser.add_argument("--url", help="ishlab turgan server, masalan ws://localhost:8000/ws/chat/")
+        parser.add_argument("--layer", choices=["memory", "redis"], default="memory")
+        parser.add_argument("--redis-url", default=settings.REDIS_URL)
+        parser.add_argument("--seed-messages", type=int, default=50, help="har bir chatga oldindan yoziladigan xabarlar")
+        parser.add_argument("--timeout", type=float, default=30, help="bitta javobni kutish, sekund")
+        parser.add_argument("--random-seed", type=int, default=None)
+        parser.add_argument("--keep", action="store_true", help="test userlarini o'chirmaslik")
+        parser.add_argument(
+            "--rate-limits", action="store_true", help="WS_RATE_LIMITS'ni o'chirmaslik (faqat --url'siz)"
+        )
+
+    def handle(self, *args, **options):
+        if options["clients"] < 2:
+            raise CommandError("--clients kamida 2")
+        mix = parse_mix(options["mix"])
+        rng = random.Random(options["random_seed"])
+
+        if options["layer"] == "memory":
+            layers = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+        else:
+            layers = {"default": {
+                **settings.CHANNEL_LAYERS["default"],
+                "CONFIG": {**settings.CHANNEL_LAYERS["default"].get("CONFIG", {}), "hosts": [options["redis_url"]]},
+            }}
+
+        self.stdout.write("Baza tayyorlanmoqda...")
+        clients = self.seed(options["clients"], options["seed_messages"])
+        try:
+            if options["url"]:
+                def communicator(token):
+                    return RemoteCommunicator(options["url"], token)
+
+                stats, elapsed = asyncio.run(self.run(communicator, clients, mix, rng, options))
+            else:
+                limits = settings.WS_RATE_LIMITS if options["rate_limits"] else {}
+                with override_settings(
+                    CHANNEL_LAYERS=layers, REDIS_URL=options["redis_url"], WS_RATE_LIMITS=limits
+                ):
+                    from config.asgi import application
+
+                    def communicator(token):
+                        return WebsocketCommunicator(
+                            application, "/ws/chat/", headers=[(b"authorization", f"Bearer {token}".encode())]
+                        )
+
+                    stats, elapsed = asyncio.run(self.run(communicator, clients, mix, rng, options))
+            self.report(stats, elapsed, len(clients))
+        finally:
+            if not options["keep"]:
+                User.objects.filter(phone__startswith=PHONE_PREFIX).delete()
+
+    # SEED
+
+    @staticmethod
+    def seed(count, seed_messages):
+        """
+        count ta user, juft-juft shaxsiy chatlar (0-1, 2-3, ...), har bir chatda seed_messages ta xabar.
+        [(user, token, chat_id, partner_id)] qaytaradi.
+        """
+        User.objects.filter(phone__startswith=PHONE_PREFIX).delete()
+        User.objects.bulk_create(
+            [User(phone=f"{PHONE_PREFIX}{i}", full_name=f"Load {i}") for i in range(count)]
+        )
+        users = list(User.objects.filter(phone__startswith=PHONE_PREFIX).order_by("id"))
+
+        clients = []
+        messages = []
+        for i, user in enumerate(users):
+            partner = users[i ^ 1] if i ^ 1 < len(users) else users[0]
+            chat, created = Chat.objects.get_or_create_direct(user.id, partner.id)
+            if created:
+                messages.extend(
+                    Message(chat=chat, sender=(user, partner)[j % 2], text=f"seed {j}", timestamp=now())
+                    for j in range(seed_messages)
+                )
+            clients.append((user, str(AccessToken.for_user(user)), chat.id, partner.id))
+        Message.objects.bulk_create(messages, batch_size=1000)
+        for chat in Chat.objects.filter(user1__phone__startswith=PHONE_PREFIX):
+            last = chat.messages.order_by("-id").first()
+            if last:
+                Chat.objects.filter(id=chat.id).update(last_message=last, last_activity_at=last.timestamp)
+        return clients
+
+    # RUN
+
+    async def run(self, make_communicator, clients, mix, rng, options):
+        stats = {action: {"latencies": [], "errors": 0, "rate_limited": 0} for action in ("connect", *ACTIONS)}
+        stats["delivered"] = 0
+        actions, weights = list(mix), list(mix.values())
+        timeout, think = options["timeout"], options["think"] / 1000
+
+        async def receive(communicator, expected, user_id):
+            """
+            Kutilgan javobgacha frame'lar o'qiladi; yo'lda kelgan sherik xabarlari sanaladi.
+            """
+            while True:
+                payload = await communicator.receive_json_from(timeout=timeout)
+                if payload.get("type") == "new_message" and payload["message"]["sender"]["id"] != user_id:
+                    stats["delivered"] += 1
+                    continue
+                if "error" in payload or payload.get("type") == expected:
+                    return payload
+
+        async def client(user, token, chat_id, partner_id, deadline):
+            communicator = make_communicator(token)
+            start = time.perf_counter()
+            try:
+                connected, _ = await communicator.connect(timeout=timeout)
+                if not connected:
+                    stats["connect"]["errors"] += 1
+                    return
+                await receive(communicator, "chat_list", user.id)
+            except Exception:
+                stats["connect"]["errors"] += 1
+                return
+            stats["connect"]["latencies"].append(time.perf_counter() - start)
+
+            try:
+                sent = 0
+                while time.perf_counter() < deadline:
+                    action = rng.choices(actions, weights)[0]
+                    if action == "send":
+                        sent += 1
+                        frame = {"recipient_id": partner_id, "text": f"load {user.id}-{sent}"}
+                    elif action == "fetch_messages":
+                        frame = {"action": "fetch_messages", "chat_id": chat_id}
+                    else:
+                        frame = {"action": "fetch_chats"}
+
+                    start = time.perf_counter()
+                    await communicator.send_json_to(frame)
+                    reply = await receive(communicator, REPLY_TYPES[action], user.id)
+                    if "retry_after" in reply:
+                        stats[action]["rate_limited"] += 1
+                    elif "error" in reply:
+                        stats[action]["errors"] += 1
+                    else:
+                        stats[action]["latencies"].append(time.perf_counter() - start)
+                    if think:
+                        await asyncio.sleep(think)
+            except Exception:
+                # Timeout yoki ilova yopildi - client to'xtaydi, xato sifatida hisoblanadi
+                stats[action]["errors"] += 1
+            finally:
+                try:
+                    await communicator.disconnect()
+                except Exception:
+                    pass
+
+        deadline = time.perf_counter() + options["duration"]
+        start = time.perf_counter()
+        await asyncio.gather(*(client(*args, deadline) for args in clients))
+        return stats, time.perf_counter() - start
+
+    # REPORT
+
+    def report(self, stats, elapsed, clients):
+        self.stdout.write(
+            f"{'':<16}{'count':>9}{'errors':>8}{'rate_limited':>14}{'rps':>10}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+        )
+        total = 0
+        for action in ("connect", *ACTIONS):
+            latencies = sorted(stats[action]["latencies"])
+            if action != "connect":
+                total += len(latencies)
+            self.stdout.write(
+                f"{action:<16}{len(latencies):>9}{stats[action]['errors']:>8}"
+                f"{stats[action]['rate_limited']:>14}{len(latencies) / elapsed:>10.0f}"
+                + "".join(f"{percentile(latencies, p) * 1000:>10.1f}" for p in (50, 95, 99))
+                + f"{(latencies[-1] if latencies else 0) * 1000:>10.1f}"
+            )
+        self.stdout.write(
+            f"{clients} client, {elapsed:.1f} s: {total / elapsed:.0f} action/s, "
+            f"{stats['delivered'] / elapsed:.0f} yetkazilgan xabar/s"
+        )
+        if any(stats[action]["rate_limited"] for action in ACTIONS):
+            self.stdout.write(self.style.WARNING(
+                "Javoblar WS_RATE_LIMITS'ga urildi - natija server limitini o'lchaydi "
+                "(serverni WS_RATE_LIMITS=off bilan ishga tushiring)"
+            ))
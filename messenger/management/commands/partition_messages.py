@@ -0,0 +1,208 @@
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+
+from messenger.models import Message
+
+TABLE = Message._meta.db_table
+LEGACY = f"{TABLE}_legacy"
+SEQUENCE = f"{TABLE}_id_seq"
+
+# 0008 migratsiyadagi qidiruv trigger'i - bo'lingan jadvalda parent'da bo'ladi (PostgreSQL 13+)
+SEARCH_TRIGGER = f"""
+DROP TRIGGER IF EXISTS messenger_message_search_vector_trigger ON {LEGACY};
+CREATE TRIGGER messenger_message_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF text ON {TABLE}
+    FOR EACH ROW EXECUTE FUNCTION messenger_message_search_vector_update();
+"""
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def q(name):
+    return connection.ops.quote_name(name)
+
+
+class Command(BaseCommand):
+    help = (
+        "messenger_message jadvalini timestamp bo'yicha oylik partitionlarga bo'lish (PostgreSQL).\n"
+        "  convert - mavjud jadval ma'lumot ko'chirmasdan birinchi (legacy) partition bo'ladi\n"
+        "  ensure  - kelgusi oylar uchun partitionlar (cron'da kuniga bir marta)\n"
+        "  archive --before YYYY-MM - eski partitionlarni ajratib arxiv schema'ga ko'chirish yoki o'chirish\n"
+        "PostgreSQL 13+ kerak (bo'lingan jadvalda BEFORE trigger)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["convert", "ensure", "archive"])
+        parser.add_argument("--months", type=int, default=settings.MESSAGE_PARTITION_MONTHS_AHEAD,
+                            help="ensure: necha oy oldinga partition yaratish")
+        parser.add_argument("--before", help="archive: shu oydan (YYYY-MM) oldingi partitionlar")
+        parser.add_argument("--drop", action="store_true", help="archive: arxivlamasdan o'chirish")
+        parser.add_argument("--concurrently", action="store_true",
+                            help="archive: DETACH ... CONCURRENTLY (PostgreSQL 14+, yozuvlarni bloklamaydi)")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning faqat PostgreSQL'da ishlaydi")
+        getattr(self, options["action"])(**options)
+
+    # CONVERT
+
+    def convert(self, months, **options):
+        """
+        1) eski jadval legacy nomini oladi, PK (id, timestamp) bo'ladi (partition kaliti PK'da bo'lishi shart)
+        2) bir xil ustunli bo'lingan jadval yaratiladi: indekslar, FK'lar, id sequence
+        3) legacy jadval (MINVALUE .. keyingi oy) oralig'i bilan ATTACH qilinadi - qatorlar ko'chirilmaydi
+        4) qidiruv trigger'i parent'ga o'tadi, kelgusi oylar uchun partitionlar yaratiladi
+        Default partition yo'q (u DETACH CONCURRENTLY'ni taqiqlaydi) - ensure cron'da ishlashi shart.
+        """
+        cutover = add_months(month_start(datetime.now(dt_timezone.utc)), 1)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if self.is_partitioned(cursor):
+                self.stdout.write("Jadval allaqachon bo'lingan")
+                return
+
+            cursor.execute(f"LOCK TABLE {q(TABLE)} IN ACCESS EXCLUSIVE MODE")
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {q(TABLE)}")
+            max_id = cursor.fetchone()[0]
+
+            # Parent'da qayta yaratiladigan indekslar va FK'lar (asl nomlari bilan)
+            cursor.execute("""
+                SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+                FROM pg_index i WHERE i.indrelid = %s::regclass AND NOT i.indisprimary AND NOT i.indisunique
+            """, [TABLE])
+            indexes = cursor.fetchall()
+            cursor.execute("""
+                SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+                WHERE conrelid = %s::regclass AND contype = 'f'
+            """, [TABLE])
+            foreign_keys = cursor.fetchall()
+            cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [TABLE])
+            primary_key = cursor.fetchone()[0]
+
+            # 1) legacy
+            cursor.execute(f"ALTER TABLE {q(TABLE)} RENAME TO {q(LEGACY)}")
+            for name, _ in indexes:
+                cursor.execute(f"ALTER INDEX {q(name)} RENAME TO {q(name[:56] + '_legacy')}")
+            cursor.execute(f"ALTER TABLE {q(LEGACY)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+            cursor.execute(f"ALTER TABLE {q(LEGACY)} ALTER COLUMN id DROP DEFAULT")
+            cursor.execute(f"ALTER TABLE {q(LEGACY)} DROP CONSTRAINT {q(primary_key)}")
+            cursor.execute(f'ALTER TABLE {q(LEGACY)} ADD CONSTRAINT {q(LEGACY + "_pkey")} PRIMARY KEY (id, "timestamp")')
+
+            # 2) bo'lingan parent
+            cursor.execute(f"""
+                CREATE TABLE {q(TABLE)} (LIKE {q(LEGACY)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)
+                PARTITION BY RANGE ("timestamp")
+            """)
+            cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {q(SEQUENCE)}")
+            cursor.execute("SELECT setval(%s, %s, false)", [SEQUENCE, max_id + 1])
+            cursor.execute(f"ALTER TABLE {q(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+            cursor.execute(f"ALTER SEQUENCE {q(SEQUENCE)} OWNED BY {q(TABLE)}.id")
+            cursor.execute(f'ALTER TABLE {q(TABLE)} ADD CONSTRAINT {q(TABLE + "_pkey")} PRIMARY KEY (id, "timestamp")')
+            for _, definition in indexes:
+                # ATTACH paytida legacy'dagi bir xil indekslar ulanadi, qayta qurilmaydi
+                cursor.execute(definition)
+            for name, definition in foreign_keys:
+                cursor.execute(f"ALTER TABLE {q(TABLE)} ADD CONSTRAINT {q(name)} {definition}")
+
+            # 3) CHECK bilan ATTACH jadvalni qayta skan qilmaydi
+            cursor.execute(
+                f'ALTER TABLE {q(LEGACY)} ADD CONSTRAINT legacy_range CHECK ("timestamp" < %s)', [cutover]
+            )
+            cursor.execute(
+                f"ALTER TABLE {q(TABLE)} ATTACH PARTITION {q(LEGACY)} FOR VALUES FROM (MINVALUE) TO (%s)", [cutover]
+            )
+            cursor.execute(f"ALTER TABLE {q(LEGACY)} DROP CONSTRAINT legacy_range")
+
+            # 4)
+            cursor.execute(SEARCH_TRIGGER)
+
+        self.stdout.write(self.style.SUCCESS(f"{TABLE} bo'lindi: {LEGACY} < {cutover:%Y-%m-%d}"))
+        self.ensure(months)
+
+    # ENSURE
+
+    def ensure(self, months, **options):
+        """
+        Joriy oydan `months` oy oldinga partitionlar. Mavjudlari (yoki legacy qamragan oylar) o'tkaziladi.
+        """
+        with connection.cursor() as cursor:
+            if not self.is_partitioned(cursor):
+                raise CommandError("Jadval bo'linmagan, avval: partition_messages convert")
+
+            start = month_start(datetime.now(dt_timezone.utc))
+            for i in range(months + 1):
+                lower, upper = add_months(start, i), add_months(start, i + 1)
+                name = f"{TABLE}_p{lower:%Y%m}"
+                try:
+                    with transaction.atomic():
+                        cursor.execute(
+                            f"CREATE TABLE IF NOT EXISTS {q(name)} PARTITION OF {q(TABLE)} "
+                            f"FOR VALUES FROM (%s) TO (%s)", [lower, upper]
+                        )
+                except DatabaseError as exc:
+                    # Oraliq legacy partition ichida
+                    self.stdout.write(f"{name}: o'tkazildi ({str(exc).strip().splitlines()[0]})")
+                    continue
+                self.stdout.write(f"{name}: tayyor")
+
+    # ARCHIVE
+
+    def archive(self, before, drop, concurrently, **options):
+        """
+        Yuqori chegarasi `before` oyidan oshmagan partitionlarni ajratish (DETACH).
+        Ajratilgan jadval arxiv schema'ga o'tadi (pg_dump bilan alohida saqlash mumkin) yoki o'chiriladi.
+        Chat.last_message arxivdagi xabarga ishora qilsa - ro'yxatda None bo'ladi (db_constraint=False).
+        """
+        if not before:
+            raise CommandError("--before YYYY-MM kerak")
+        try:
+            cutoff = datetime.strptime(before, "%Y-%m").replace(tzinfo=dt_timezone.utc)
+        except ValueError:
+            raise CommandError("--before formati noto'g'ri (YYYY-MM)")
+
+        with connection.cursor() as cursor:
+            if not self.is_partitioned(cursor):
+                raise CommandError("Jadval bo'linmagan")
+            cursor.execute("""
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+            """, [TABLE])
+            partitions = cursor.fetchall()
+
+            for name, bound in partitions:
+                upper = re.search(r"TO \('([^']+)'\)", bound or "")
+                if not upper:
+                    continue  # MAXVALUE
+                cursor.execute("SELECT %s::timestamptz <= %s", [upper.group(1), cutoff])
+                if not cursor.fetchone()[0]:
+                    continue
+
+                cursor.execute(
+                    f"ALTER TABLE {q(TABLE)} DETACH PARTITION {q(name)}{' CONCURRENTLY' if concurrently else ''}"
+                )
+                if drop:
+                    cursor.execute(f"DROP TABLE {q(name)}")
+                    self.stdout.write(f"{name}: o'chirildi")
+                else:
+                    schema = settings.MESSAGE_ARCHIVE_SCHEMA
+                    cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {q(schema)}")
+                    cursor.execute(f"ALTER TABLE {q(name)} SET SCHEMA {q(schema)}")
+                    self.stdout.write(f"{name}: {schema} schema'ga ko'chirildi")
+
+    @staticmethod
+    def is_partitioned(cursor):
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", [TABLE])
+        return cursor.fetchone()[0]
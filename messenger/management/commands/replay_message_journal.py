@@ -0,0 +1,41 @@
+import time
+
+import msgpack
+import redis
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from messenger.writebehind import flush_messages, send_receipts
+
+
+class Command(BaseCommand):
+    help = (
+        "Write-behind journal'ida qolgan (worker yiqilishi sababli yozilmagan) xabarlarni bazaga yozish. "
+        "Idempotent: allaqachon yozilganlari o'tkaziladi. Deploy'dan keyin yoki cron'da ishlatiladi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-age", type=float, default=60,
+                            help="shundan yosh (sekund) yozuvlar tirik worker buferida bo'lishi mumkin - o'tkaziladi")
+
+    def handle(self, *args, **options):
+        client = redis.Redis.from_url(settings.REDIS_URL)
+        key = settings.MESSAGE_JOURNAL_KEY
+        max_id = str(int((time.time() - options["min_age"]) * 1000))
+        start, written, total = "-", 0, 0
+
+        while True:
+            entries = client.xrange(key, min=start, max=max_id, count=settings.MESSAGE_BATCH_SIZE)
+            if not entries:
+                break
+            rows = [msgpack.unpackb(fields[b"m"], raw=False) for _, fields in entries]
+            flushed = flush_messages(rows)
+            written += flushed.written
+            async_to_sync(send_receipts)(flushed.receipts)
+            total += len(entries)
+            entry_ids = [entry_id for entry_id, _ in entries]
+            client.xdel(key, *entry_ids)
+            start = f"({entry_ids[-1].decode()}"
+
+        self.stdout.write(self.style.SUCCESS(f"Journal: {total} ta yozuv, {written} ta xabar bazaga yozildi"))
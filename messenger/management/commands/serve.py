@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+# Drain paytida WebSocket'lar shu kod bilan yopiladi: 1012 (Service Restart) ning private nusxasi,
+# autobahn 1000 va 3000-4999 dan boshqasini yubormaydi. Client ?cursor= bilan qayta ulanadi.
+DRAIN_CLOSE_CODE = 4012
+
+
+def queued_bytes(transport):
+    """
+    Twisted TCP transport'ida hali socketga yozilmagan baytlar (FileDescriptor buferi).
+    ASGI'da backpressure yo'q - consumer send() har doim darhol qaytadi, navbat shu yerda o'sadi.
+    """
+    return (
+        len(getattr(transport, "dataBuffer", b"")) - getattr(transport, "offset", 0)
+        + getattr(transport, "_tempDataLen", 0)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Production ASGI: listening socket shu yerda ochiladi va N ta daphne worker process'iga beriladi - "
+        "kernel ulanishlarni ular orasida taqsimlaydi. Yiqilgan worker qayta ishga tushiriladi.\n"
+        "SIGTERM/SIGINT (deploy): workerlar yangi ulanish qabul qilmaydi, WebSocket'larni "
+        f"{DRAIN_CLOSE_CODE} kodi bilan yopadi (consumer disconnect'i ishlaydi) va ASGI_DRAIN_TIMEOUT "
+        "ichida ulanishlar tugashini kutadi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="0.0.0.0")
+        parser.add_argument("--port", type=int, default=8000)
+        parser.add_argument("--workers", type=int, default=settings.ASGI_WORKERS or os.cpu_count())
+        parser.add_argument("--drain-timeout", type=float, default=settings.ASGI_DRAIN_TIMEOUT)
+        parser.add_argument("--backlog", type=int, default=2048)
+        # Ichki: worker process'i (master tomonidan ishga tushiriladi)
+        parser.add_argument("--worker-fd", type=int, help=argparse.SUPPRESS)
+        parser.add_argument("--worker-family", default="INET", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker_fd"] is not None:
+            self.run_worker(options["worker_fd"], options["worker_family"], options["drain_timeout"])
+        else:
+            self.run_master(options)
+
+    # MASTER
+
+    def run_master(self, options):
+        family = socket.AF_INET6 if ":" in options["host"] else socket.AF_INET
+        sock = socket.socket(family)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((options["host"], options["port"]))
+        sock.listen(options["backlog"])
+        sock.set_inheritable(True)
+
+        command = [
+            sys.executable, "-m", "django", "serve",
+            "--worker-fd", str(sock.fileno()),
+            "--worker-family", "INET6" if family == socket.AF_INET6 else "INET",
+            "--drain-timeout", str(options["drain_timeout"]),
+        ]
+
+        def spawn():
+            return subprocess.Popen(command, pass_fds=(sock.fileno(),))
+
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        workers = [spawn() for _ in range(options["workers"])]
+        self.stdout.write(
+            f"{options['host']}:{options['port']} - {len(workers)} ta worker "
+            f"(pid {', '.join(str(worker.pid) for worker in workers)})"
+        )
+
+        # Batched rejim: yiqilgan workerlar buferidan journal'da qolgan xabarlar
+        replay = settings.MESSAGE_DURABILITY == "batched"
+        next_replay = time.monotonic()
+
+        while not stopping:
+            if replay and time.monotonic() >= next_replay:
+                self.replay_journal()
+                next_replay = time.monotonic() + settings.MESSAGE_REPLAY_INTERVAL
+            for i, worker in enumerate(workers):
+                if worker.poll() is not None:
+                    self.stderr.write(f"worker {worker.pid} to'xtadi (kod {worker.returncode}), qayta ishga tushiriladi")
+                    time.sleep(1)  # darhol yiqiladigan konfiguratsiyada aylanib qolmaslik uchun
+                    workers[i] = spawn()
+            time.sleep(0.5)
+
+        self.stdout.write(f"Drain: {options['drain_timeout']:.0f} s gacha kutiladi")
+        for worker in workers:
+            if worker.poll() is None:
+                worker.send_signal(signal.SIGTERM)
+        deadline = time.monotonic() + options["drain_timeout"] + 5
+        for worker in workers:
+            try:
+                worker.wait(timeout=max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                worker.kill()
+                worker.wait()
+        sock.close()
+
+    def replay_journal(self):
+        try:
+            call_command("replay_message_journal", stdout=self.stdout, stderr=self.stderr)
+        except Exception as exc:
+            # Redis yoki baza vaqtincha ishlamasa master yiqilmaydi, keyingi safar qayta urinadi
+            self.stderr.write(f"replay_message_journal: {exc!r}")
+
+    # WORKER
+
+    def run_worker(self, fd, family, drain_timeout):
+        # daphne.server import'i Twisted asyncio reactor'ini o'rnatadi - reactor'dan oldin
+        from channels.routing import get_default_application
+        from daphne.server import Server
+        from daphne.ws_protocol import WebSocketProtocol
+        from twisted.internet import reactor
+        from twisted.internet.endpoints import AdoptedStreamServerEndpoint
+
+        from messenger import metrics, writebehind
+        from messenger.ratelimit import POLICY_CLOSE_CODE
+
+        class BoundedWebSocketProtocol(WebSocketProtocol):
+            """
+            Outbound navbati WS_OUTBOUND_BUFFER bilan cheklangan (WS_SLOW_CONSUMER_POLICY).
+            """
+
+            def serverSend(self, content, binary=False):
+                if self.state == self.STATE_CLOSING:
+                    return
+                if self.state == self.STATE_OPEN and queued_bytes(self.transport) > settings.WS_OUTBOUND_BUFFER:
+                    metrics.slow_consumers.inc(settings.WS_SLOW_CONSUMER_POLICY)
+                    if settings.WS_SLOW_CONSUMER_POLICY == "close":
+                        self.sendClose(code=POLICY_CLOSE_CODE, reason="slow consumer")
+                    return
+                super().serverSend(content, binary)
+
+        class DrainingServer(Server):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.ports = []
+
+            def listen_success(self, port):
+                self.ports.append(port)
+                super().listen_success(port)
+
+            def drain(self):
+                """
+                Yangi ulanishlar to'xtatiladi, WebSocket'lar yopiladi, ulanishlar tugagach
+                write-behind buferi yoziladi va reactor to'xtaydi.
+                """
+                for port in self.ports:
+                    port.stopListening()
+                for protocol in list(self.connections):
+                    if isinstance(protocol, WebSocketProtocol) and protocol.state == protocol.STATE_OPEN:
+                        protocol.sendClose(code=DRAIN_CLOSE_CODE, reason="server restart")
+                deadline = time.monotonic() + drain_timeout
+
+                def check():
+                    # HTTP so'rovlar tugashi va consumer disconnect'lari ishlashi kutiladi
+                    busy = [
+                        details for details in self.connections.values()
+                        if not details.get("application_instance") or not details["application_instance"].done()
+                    ]
+                    if not busy or time.monotonic() > deadline:
+                        # ack olgan, lekin hali yozilmagan xabarlar (MESSAGE_DURABILITY = "batched")
+                        flush = asyncio.ensure_future(writebehind.drain())
+                        flush.add_done_callback(lambda _: reactor.stop())
+                    else:
+                        reactor.callLater(0.2, check)
+
+                check()
+
+        def adopt():
+            # Master ochgan socket: Twisted'ning serverFromString'ida "fd:" endpoint yo'q
+            endpoint = AdoptedStreamServerEndpoint(reactor, fd, getattr(socket, f"AF_{family}"))
+            server.ws_factory.protocol = BoundedWebSocketProtocol
+            listener = endpoint.listen(server.http_factory)
+            listener.addCallback(server.listen_success)
+            listener.addErrback(server.listen_error)
+
+        server = DrainingServer(
+            application=get_default_application(),
+            endpoints=[f"adopted:fileno={fd}"],
+            ready_callable=adopt,
+            signal_handlers=False,
+            action_logger=None,
+            application_close_timeout=drain_timeout,
+            websocket_max_message_size=settings.WS_MAX_FRAME_SIZE,
+            proxy_forwarded_address_header="X-Forwarded-For",
+            proxy_forwarded_port_header="X-Forwarded-Port",
+            proxy_forwarded_proto_header="X-Forwarded-Proto",
+        )
+        server.endpoints = []  # daphne endpoint'siz ishga tushmaydi, socket adopt() da ulanadi
+        signal.signal(signal.SIGTERM, lambda signum, frame: reactor.callFromThread(server.drain))
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # terminaldagi Ctrl+C - master orqali
+        server.run()
@@ -0,0 +1,228 @@
+# Hot path metrikalari, Prometheus text formatida (prometheus_client'siz).
+# Har bir worker o'z registry'sini saqlaydi va METRICS_PUBLISH_INTERVAL'da Redis'ga snapshot yozadi;
+# /metrics/ barcha tirik workerlarnikini `worker` label'i bilan birlashtiradi
+# (bir socketni bir nechta process tinglaganda ham bitta scrape hammasini ko'radi).
+# Histogramlar METRICS_SAMPLE_RATE bo'yicha sampling qilinadi, counter va gauge'lar har doim.
+import asyncio
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from bisect import bisect_left
+
+import msgpack
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+WORKER = f"{socket.gethostname()}-{os.getpid()}"
+SNAPSHOTS_KEY = "metrics:workers"  # hash: worker -> msgpack snapshot
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# Label qiymatlari cheklangan bo'lishi kerak - noma'lum action "other" bo'ladi
+WS_ACTIONS = frozenset({
+    "send", "fetch_messages", "fetch_chats", "heartbeat", "fetch_presence", "sync", "search",
+    "mark_read", "typing", "recording_audio", "recording_round_video", "cancel",
+})
+
+_registry = []
+
+
+def sampled():
+    """
+    Shu hodisa histogramga yoziladimi. 0 bo'lsa histogramlar umuman o'lchanmaydi.
+    """
+    rate = settings.METRICS_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()  # DB thread'lari va event loop'dan yoziladi
+        _registry.append(self)
+
+    def _labels(self, values):
+        return list(zip(self.labelnames, values))
+
+    def samples(self):
+        """
+        [(suffix, [(label, qiymat)], son)]
+        """
+        with self._lock:
+            return [("", self._labels(labels), value) for labels, value in self._values.items()]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        return [("_total", labels, value) for _, labels, value in super().samples()]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # har bir bucket, +Inf, sum
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+
+    def samples(self):
+        result = []
+        with self._lock:
+            items = [(labels, list(state)) for labels, state in self._values.items()]
+        for labels, state in items:
+            labels = self._labels(labels)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), state):
+                cumulative += count
+                result.append(("_bucket", [*labels, ("le", str(bound))], cumulative))
+            result.append(("_sum", labels, state[-1]))
+            result.append(("_count", labels, cumulative))
+        return result
+
+
+ws_action_seconds = Histogram(
+    "doppigram_ws_action_seconds", "ChatConsumer.receive: action bajarilish vaqti", ("action",)
+)
+ws_actions = Counter("doppigram_ws_actions", "ChatConsumer.receive: qabul qilingan actionlar", ("action",))
+db_call_seconds = Histogram(
+    "doppigram_db_call_seconds", "database_task chaqiruvi (pool navbati bilan)", ("func",)
+)
+group_send_seconds = Histogram("doppigram_group_send_seconds", "channel_layer.group_send vaqti")
+payload_bytes = Histogram(
+    "doppigram_ws_payload_bytes", "WebSocket frame hajmi", ("direction",), buckets=SIZE_BUCKETS
+)
+connections = Gauge("doppigram_ws_connections", "Ochiq WebSocket ulanishlar")
+dropped_deliveries = Counter(
+    "doppigram_dropped_deliveries", "Yetkazilmagan (yoki inboxga yozilmagan) eventlar", ("reason",)
+)
+rate_limited = Counter("doppigram_ws_rate_limited", "Limit sababli rad etilgan frame'lar", ("action",))
+slow_consumers = Counter(
+    "doppigram_ws_slow_consumers", "Outbound buferi to'lgan ulanishlar (drop - har bir frame)", ("policy",)
+)
+
+
+def snapshot():
+    return [
+        (metric.name, metric.type, metric.documentation, metric.samples())
+        for metric in _registry
+    ]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render(snapshots):
+    """
+    {worker: snapshot} -> Prometheus text exposition (0.0.4). HELP/TYPE har bir family uchun bir marta.
+    """
+    families = {}
+    for worker, metrics in sorted(snapshots.items()):
+        for name, metric_type, documentation, samples in metrics:
+            family = families.setdefault(name, (metric_type, documentation, []))
+            for suffix, labels, value in samples:
+                family[2].append((suffix, [("worker", worker), *labels], value))
+
+    lines = []
+    for name, (metric_type, documentation, samples) in families.items():
+        lines.append(f"# HELP {name} {_escape(documentation)}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for suffix, labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels)
+            lines.append(f"{name}{suffix}{{{label_text}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# PUBLISH
+
+_publishers = {}
+
+
+async def _publish_forever():
+    while True:
+        try:
+            await get_redis().hset(SNAPSHOTS_KEY, WORKER, msgpack.packb(
+                {"time": time.time(), "metrics": snapshot()}, use_bin_type=True
+            ))
+        except RedisError:
+            logger.warning("metrics: snapshot Redis'ga yozilmadi")
+        await asyncio.sleep(settings.METRICS_PUBLISH_INTERVAL)
+
+
+def start_publisher():
+    """
+    Shu event loop'da snapshot yozuvchi task (bir marta). Consumer connect'da chaqiriladi.
+    """
+    loop = asyncio.get_running_loop()
+    task = _publishers.get(loop)
+    if task is None or task.done():
+        for old_loop in [old for old in _publishers if old.is_closed()]:
+            del _publishers[old_loop]
+        _publishers[loop] = loop.create_task(_publish_forever())
+
+
+def collect(client):
+    """
+    Barcha tirik workerlarning snapshotlari (sync Redis client bilan, /metrics/ view uchun).
+    Eskirganlari (3 interval yangilanmagan) o'chiriladi. Shu process'niki har doim yangi.
+    """
+    snapshots = {WORKER: snapshot()}
+    stale_before = time.time() - settings.METRICS_PUBLISH_INTERVAL * 3
+    try:
+        stored = client.hgetall(SNAPSHOTS_KEY)
+    except RedisError:
+        logger.warning("metrics: boshqa workerlar snapshotlari o'qilmadi")
+        return snapshots
+
+    stale = []
+    for worker, data in stored.items():
+        worker = worker.decode()
+        entry = msgpack.unpackb(data, raw=False)
+        if entry["time"] < stale_before:
+            stale.append(worker)
+        elif worker != WORKER:
+            snapshots[worker] = entry["metrics"]
+    if stale:
+        try:
+            client.hdel(SNAPSHOTS_KEY, *stale)
+        except RedisError:
+            pass
+    return snapshots
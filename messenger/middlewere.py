@@ -1,20 +1,21 @@
 import jwt
 from django.conf import settings
-from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from channels.middleware import BaseMiddleware
-from channels.db import database_sync_to_async
 
-User = get_user_model()
+from users.cache import get_cached_user, get_local_user
+
+from .db import database_task
 
 class JWTAuthMiddleware(BaseMiddleware):
-    @database_sync_to_async
-    def get_user(self, token):
+    async def get_user(self, token):
         try:
             payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-            return User.objects.get(id=payload["user_id"])
+            user_id = payload["user_id"]
         except Exception:
             return None
+        # Reconnect paytida lokal keshdan thread hop'siz, bo'lmasa Redis/baza orqali
+        return get_local_user(user_id) or await database_task(get_cached_user)(user_id)
 
     async def __call__(self, scope, receive, send):
         headers = dict(scope["headers"])
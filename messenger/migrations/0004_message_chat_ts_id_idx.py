@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0003_message_duration_message_type_message_waveform_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', 'timestamp', 'id'], name='message_chat_ts_id_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_last_message(apps, schema_editor):
+    Chat = apps.get_model('messenger', 'Chat')
+    Message = apps.get_model('messenger', 'Message')
+    latest = Message.objects.filter(chat=OuterRef('pk')).order_by('-timestamp', '-id')
+    Chat.objects.update(
+        last_message_id=Subquery(latest.values('id')[:1]),
+        last_activity_at=Coalesce(Subquery(latest.values('timestamp')[:1]), F('created_at')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0004_message_chat_ts_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='messenger.message'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['user1', '-last_activity_at'], name='chat_user1_activity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['user2', '-last_activity_at'], name='chat_user2_activity_idx'),
+        ),
+    ]
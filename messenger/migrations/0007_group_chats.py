@@ -0,0 +1,84 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_direct_members(apps, schema_editor):
+    Chat = apps.get_model('messenger', 'Chat')
+    ChatMember = apps.get_model('messenger', 'ChatMember')
+    members = []
+    for chat_id, user1_id, user2_id in Chat.objects.values_list('id', 'user1_id', 'user2_id').iterator():
+        for user_id in {user1_id, user2_id}:
+            members.append(ChatMember(chat_id=chat_id, user_id=user_id))
+        if len(members) >= 5000:
+            ChatMember.objects.bulk_create(members, ignore_conflicts=True)
+            members = []
+    ChatMember.objects.bulk_create(members, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0006_upload'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_admin', models.BooleanField(default=False)),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='chat',
+            name='chat_user1_activity_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='chat',
+            name='chat_user2_activity_idx',
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='is_group',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='title',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='chat',
+            name='user1',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chats1', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='chat',
+            name='user2',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chats2', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chatmember',
+            name='chat',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='messenger.chat'),
+        ),
+        migrations.AddField(
+            model_name='chatmember',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_memberships', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='chatmember',
+            index=models.Index(fields=['user', 'chat'], name='chatmember_user_chat_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='chatmember',
+            unique_together={('chat', 'user')},
+        ),
+        migrations.RunPython(create_direct_members, migrations.RunPython.noop),
+    ]
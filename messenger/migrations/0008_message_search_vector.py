@@ -0,0 +1,60 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:18
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+# messenger.search.SEARCH_CONFIG bilan bir xil bo'lishi kerak
+CREATE_TRIGGER = """
+CREATE OR REPLACE FUNCTION messenger_message_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('simple', coalesce(NEW.text, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS messenger_message_search_vector_trigger ON messenger_message;
+CREATE TRIGGER messenger_message_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF text ON messenger_message
+    FOR EACH ROW EXECUTE FUNCTION messenger_message_search_vector_update();
+
+UPDATE messenger_message SET search_vector = to_tsvector('simple', coalesce(text, ''));
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS messenger_message_search_vector_trigger ON messenger_message;
+DROP FUNCTION IF EXISTS messenger_message_search_vector_update();
+"""
+
+
+def create_trigger(apps, schema_editor):
+    # Trigger faqat PostgreSQL'da (boshqa bazada qidiruv ishlamaydi)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGGER)
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0007_group_chats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='message_search_gin'),
+        ),
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_reversed_chats(apps, schema_editor):
+    """
+    (B, A) tartibidagi shaxsiy chatlar: (A, B) chati bo'lsa xabarlar va a'zolar unga
+    ko'chiriladi va dublikat o'chiriladi, bo'lmasa juftlik joyida almashtiriladi.
+    """
+    Chat = apps.get_model('messenger', 'Chat')
+    ChatMember = apps.get_model('messenger', 'ChatMember')
+    Message = apps.get_model('messenger', 'Message')
+
+    reversed_chats = Chat.objects.filter(
+        user1__isnull=False, user2__isnull=False, user1__gt=models.F('user2'),
+    )
+    for chat in reversed_chats.iterator():
+        target = Chat.objects.filter(user1_id=chat.user2_id, user2_id=chat.user1_id).first()
+        if target is None:
+            Chat.objects.filter(pk=chat.pk).update(user1_id=chat.user2_id, user2_id=chat.user1_id)
+            continue
+
+        Message.objects.filter(chat_id=chat.pk).update(chat_id=target.pk)
+        user_ids = ChatMember.objects.filter(chat_id=chat.pk).values_list('user_id', flat=True)
+        ChatMember.objects.bulk_create(
+            [ChatMember(chat_id=target.pk, user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+        ChatMember.objects.filter(chat_id=chat.pk).delete()
+
+        last = Message.objects.filter(chat_id=target.pk).order_by('-timestamp', '-id').first()
+        Chat.objects.filter(pk=target.pk).update(
+            last_message_id=last.pk if last else None,
+            last_activity_at=max(filter(None, [
+                last.timestamp if last else None, target.last_activity_at, chat.last_activity_at,
+            ])),
+        )
+        chat.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0008_message_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Constraint 0015 da: o'zgargan qatorlarning FK trigger'lari commit'gacha kutadi,
+        # PostgreSQL shu tranzaksiyada ALTER TABLE qilmaydi
+        migrations.RunPython(merge_reversed_chats, migrations.RunPython.noop),
+    ]
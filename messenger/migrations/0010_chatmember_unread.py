@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:21
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_unread_counts(apps, schema_editor):
+    """
+    Mavjud o'qilmagan xabarlar: bitta GROUP BY so'rov, keyin har bir a'zo uchun
+    o'zi yubormagan xabarlar yig'indisi.
+    """
+    ChatMember = apps.get_model('messenger', 'ChatMember')
+    Message = apps.get_model('messenger', 'Message')
+
+    unread = defaultdict(dict)
+    rows = Message.objects.filter(is_read=False).values('chat_id', 'sender_id').annotate(n=Count('id'))
+    for row in rows.iterator():
+        unread[row['chat_id']][row['sender_id']] = row['n']
+
+    members = []
+    for member in ChatMember.objects.iterator():
+        counts = unread.get(member.chat_id)
+        if not counts:
+            continue
+        member.unread_count = sum(n for sender_id, n in counts.items() if sender_id != member.user_id)
+        members.append(member)
+        if len(members) >= 5000:
+            ChatMember.objects.bulk_update(members, ['unread_count'])
+            members = []
+    ChatMember.objects.bulk_update(members, ['unread_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0009_chat_canonical_pair'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmember',
+            name='last_read_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatmember',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0010_chatmember_unread'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='placeholder',
+            field=models.CharField(blank=True, editable=False, max_length=1024),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='preview',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='chat/previews/'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='chat/thumbs/'),
+        ),
+    ]
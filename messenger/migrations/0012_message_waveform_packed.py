@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+WAVEFORM_SAMPLES = 64
+
+
+def _pack(values):
+    # messenger.waveforms.pack bilan bir xil (migratsiya app kodiga bog'lanmasligi uchun nusxa)
+    try:
+        values = [abs(float(value)) for value in values]
+    except (TypeError, ValueError):
+        return None
+    if not values:
+        return None
+    buckets = []
+    for i in range(WAVEFORM_SAMPLES):
+        start = i * len(values) // WAVEFORM_SAMPLES
+        end = max((i + 1) * len(values) // WAVEFORM_SAMPLES, start + 1)
+        buckets.append(max(values[start:end]) if start < len(values) else 0.0)
+    peak = max(buckets) or 1.0
+    return bytes(min(255, round(value / peak * 255)) for value in buckets)
+
+
+def pack_waveforms(apps, schema_editor):
+    Message = apps.get_model('messenger', 'Message')
+    batch = []
+    rows = Message.objects.filter(waveform__isnull=False).only('id', 'waveform').iterator(chunk_size=2000)
+    for msg in rows:
+        msg.waveform_packed = _pack(msg.waveform) if isinstance(msg.waveform, list) else None
+        batch.append(msg)
+        if len(batch) >= 2000:
+            Message.objects.bulk_update(batch, ['waveform_packed'])
+            batch = []
+    Message.objects.bulk_update(batch, ['waveform_packed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0011_message_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='waveform_packed',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.RunPython(pack_waveforms, migrations.RunPython.noop),
+    ]
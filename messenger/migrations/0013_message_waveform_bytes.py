@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Sxema o'zgarishi 0012 dagi ma'lumot ko'chirishdan alohida tranzaksiyada
+
+    dependencies = [
+        ('messenger', '0012_message_waveform_packed'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='message',
+            name='waveform',
+        ),
+        migrations.RenameField(
+            model_name='message',
+            old_name='waveform_packed',
+            new_name='waveform',
+        ),
+    ]
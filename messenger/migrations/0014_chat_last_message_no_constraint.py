@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messenger', '0013_message_waveform_bytes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chat',
+            name='last_message',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='messenger.message'),
+        ),
+    ]
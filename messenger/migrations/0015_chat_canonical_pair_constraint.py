@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Sxema o'zgarishi 0009 dagi ma'lumot ko'chirishdan alohida tranzaksiyada
+
+    dependencies = [
+        ('messenger', '0014_chat_last_message_no_constraint'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='chat',
+            constraint=models.CheckConstraint(condition=models.Q(('user1__isnull', True), ('user1__lte', models.F('user2')), _connector='OR'), name='chat_canonical_pair'),
+        ),
+    ]
@@ -1,20 +1,111 @@
-from django.db import models
+import uuid
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 
 User = settings.AUTH_USER_MODEL
 
+
+def canonical_pair(user_a_id, user_b_id):
+    """
+    Shaxsiy chat juftligining yagona ko'rinishi: kichik id user1, kattasi user2.
+    """
+    return (user_a_id, user_b_id) if user_a_id <= user_b_id else (user_b_id, user_a_id)
+
+
+class ChatQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """
+        Userga tegishli chatlar (shaxsiy va guruh): oxirgi faollik bo'yicha, N+1 so'rovlarsiz.
+        """
+        return (
+            self.filter(members__user=user)
+            .annotate(unread_count=models.F('members__unread_count'))
+            .select_related('user1', 'user2', 'last_message')
+            .order_by('-last_activity_at', '-id')
+        )
+
+    def direct(self, user_a_id, user_b_id):
+        """
+        Ikki user o'rtasidagi shaxsiy chat: juftlik kanonik tartibda (user1 <= user2),
+        shuning uchun (user1, user2) unique indeksiga bitta murojaat.
+        """
+        user1_id, user2_id = canonical_pair(user_a_id, user_b_id)
+        return self.filter(user1_id=user1_id, user2_id=user2_id)
+
+    def get_or_create_direct(self, user1_id, user2_id):
+        """
+        Ikki user o'rtasidagi shaxsiy chat. Juftlik sort qilinadi,
+        yangi chat yaratilsa a'zolari ham yoziladi.
+        """
+        user1_id, user2_id = canonical_pair(user1_id, user2_id)
+        with transaction.atomic():
+            chat, created = self.get_or_create(user1_id=user1_id, user2_id=user2_id)
+            if created:
+                ChatMember.objects.bulk_create([
+                    ChatMember(chat=chat, user_id=user_id) for user_id in {user1_id, user2_id}
+                ])
+        return chat, created
+
+
 class Chat(models.Model):
-    user1 = models.ForeignKey(User, related_name='chats1', on_delete=models.CASCADE)
-    user2 = models.ForeignKey(User, related_name='chats2', on_delete=models.CASCADE)
+    # Shaxsiy chatda user1/user2 to'ldiriladi, guruhda bo'sh - a'zolar ChatMember'da
+    user1 = models.ForeignKey(User, related_name='chats1', on_delete=models.CASCADE, null=True, blank=True)
+    user2 = models.ForeignKey(User, related_name='chats2', on_delete=models.CASCADE, null=True, blank=True)
+    is_group = models.BooleanField(default=False)
+    title = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Chat ro'yxati uchun denormalizatsiya: create_message har safar yangilaydi.
+    # db_constraint=False: messenger_message timestamp bo'yicha bo'lingan (partition_messages),
+    # bunday jadvalda faqat id'ga FK bo'lmaydi; arxivlangan xabarga ishora None bo'lib ko'rinadi.
+    last_message = models.ForeignKey(
+        'Message', related_name='+', on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False
+    )
+    last_activity_at = models.DateTimeField(default=timezone.now)
+
+    objects = ChatQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user1', 'user2')
+        constraints = [
+            # Kanonik juftlik: (A, B) va (B, A) ikki xil chat bo'lib qolmasligi uchun
+            models.CheckConstraint(
+                condition=models.Q(user1__isnull=True) | models.Q(user1__lte=models.F('user2')),
+                name='chat_canonical_pair',
+            ),
+        ]
 
     def __str__(self):
+        if self.is_group:
+            return f"Group: {self.title}"
         return f"Chat: {self.user1} & {self.user2}"
 
 
+class ChatMember(models.Model):
+    chat = models.ForeignKey(Chat, related_name='members', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='chat_memberships', on_delete=models.CASCADE)
+    is_admin = models.BooleanField(default=False)
+    joined_at = models.DateTimeField(auto_now_add=True)
+    # O'qilmagan xabarlar soni: send_message'da +1, mark_read'da qayta hisoblanadi
+    unread_count = models.PositiveIntegerField(default=0)
+    # User o'qigan eng oxirgi xabar id'si (high-water mark)
+    last_read_id = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('chat', 'user')
+        indexes = [
+            # userning chatlar ro'yxati uchun (chat, user) unique indeksi teskari tartibda
+            models.Index(fields=['user', 'chat'], name='chatmember_user_chat_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} in {self.chat_id}"
+
+
 class Message(models.Model):
     MESSAGE_TYPES = (
         ("text", "Text"),
@@ -32,12 +123,51 @@ class Message(models.Model):
     text = models.TextField(blank=True)
 
     file = models.FileField(upload_to='chat/files/', blank=True, null=True)
+    # Rasm xabarlar uchun fonda yaratiladigan derivativlar (messenger.derivatives)
+    thumbnail = models.ImageField(upload_to='chat/thumbs/', blank=True, null=True, editable=False)
+    preview = models.ImageField(upload_to='chat/previews/', blank=True, null=True, editable=False)
+    placeholder = models.CharField(max_length=1024, blank=True, editable=False)  # blur data URL
 
     duration = models.FloatField(null=True, blank=True)  # video/audio davomiyligi
-    waveform = models.JSONField(null=True, blank=True)   # voice (voice note) waves
+    # voice/round video waves: WAVEFORM_SAMPLES ta 8-bit amplituda (messenger.waveforms)
+    waveform = models.BinaryField(null=True, blank=True)
 
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    # To'liq matnli qidiruv: bazadagi trigger `text`dan avtomatik to'ldiradi
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['chat', 'timestamp', 'id'], name='message_chat_ts_id_idx'),
+            GinIndex(fields=['search_vector'], name='message_search_gin'),
+        ]
+
     def __str__(self):
         return f"{self.type.upper()} from {self.sender}"
+
+
+class Upload(models.Model):
+    """
+    Bo'laklab (chunk) yuklanadigan media fayl.
+    Yuklash tugagach WebSocket xabari faqat upload id'ni yuboradi.
+    """
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("complete", "Complete"),
+        ("attached", "Attached"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, related_name='uploads', on_delete=models.CASCADE)
+    file_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()               # e'lon qilingan umumiy hajm (bayt)
+    offset = models.BigIntegerField(default=0)    # hozirgacha qabul qilingan bayt
+    file = models.FileField(upload_to='chat/files/', blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.offset}/{self.size})"
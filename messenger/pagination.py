@@ -0,0 +1,88 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(message):
+    """
+    Message'ning (timestamp, id) juftligini frontend uchun qisqa stringga o'giradi.
+    Model obyekti ham, `.values()` qatori (dict) ham qabul qilinadi.
+    """
+    if isinstance(message, dict):
+        timestamp, message_id = message["timestamp"], message["id"]
+    else:
+        timestamp, message_id = message.timestamp, message.id
+    raw = f"{timestamp.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    encode_cursor teskarisi: string -> (timestamp, id).
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, message_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (ValueError, TypeError, UnicodeDecodeError) as exc:
+        raise InvalidCursor(str(cursor)) from exc
+
+
+def parse_limit(value):
+    """
+    Sahifa hajmini tekshirish: noto'g'ri qiymat bo'lsa default, katta bo'lsa max.
+    """
+    default = settings.MESSAGE_PAGE_SIZE
+    try:
+        limit = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, settings.MESSAGE_PAGE_MAX_SIZE))
+
+
+def paginate_messages(queryset, before=None, after=None, limit=None):
+    """
+    Xabarlarni (timestamp, id) bo'yicha keyset (cursor) usulida sahifalash.
+    - cursor yo'q: eng yangi `limit` ta xabar
+    - before: shu cursordan eskiroq xabarlar (tepaga scroll)
+    - after: shu cursordan yangiroq xabarlar
+    Har doim xabarlar eskidan yangiga tartiblangan holda qaytadi.
+    Oddiy timestamp chegarasi (gte/lte) ham qo'shiladi: bo'lingan (partitioned) jadvalda
+    faqat kerakli partitionlar o'qiladi, indeksda esa range scan bo'ladi.
+    """
+    limit = parse_limit(limit)
+
+    if after:
+        timestamp, message_id = decode_cursor(after)
+        queryset = queryset.filter(
+            Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=message_id),
+            timestamp__gte=timestamp,
+        ).order_by("timestamp", "id")
+    else:
+        if before:
+            timestamp, message_id = decode_cursor(before)
+            queryset = queryset.filter(
+                Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id),
+                timestamp__lte=timestamp,
+            )
+        queryset = queryset.order_by("-timestamp", "-id")
+
+    items = list(queryset[:limit + 1])
+    has_more = len(items) > limit
+    items = items[:limit]
+    if not after:
+        items.reverse()
+
+    return {
+        "items": items,
+        "has_more": has_more,
+        "before": encode_cursor(items[0]) if items else before,
+        "after": encode_cursor(items[-1]) if items else after,
+    }
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db.models import Q
+from redis.exceptions import RedisError
+
+from .db import database_task
+from .encoders import format_datetime
+from .models import Chat, ChatMember
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# presence:conns:<user_id> - ZSET: channel_name -> amal qilish muddati (unix time)
+CONNECTIONS_KEY = "presence:conns:{}"
+# HASH: user_id -> oxirgi marta offline bo'lgan vaqt
+LAST_SEEN_KEY = "presence:last_seen"
+# HASH: user_id -> oxirgi yuborilgan holat ("1"/"0"), takroriy eventlarni oldini olish uchun
+PUBLISHED_KEY = "presence:published"
+# ZSET: user_id -> eng kech ulanishining muddati. Sweeper shu bo'yicha jim o'lgan ulanishlarni topadi
+# (worker yiqilgan, socket uzilgani bilinmagan, heartbeat to'xtagan - disconnect chaqirilmagan)
+EXPIRY_KEY = "presence:expiry"
+
+_sweepers = {}
+
+
+async def user_connected(user_id, channel_name):
+    """
+    Yangi ulanish: userning ulanishlar ro'yxatiga qo'shiladi.
+    Bitta userda bir nechta ulanish (telefon, web) bo'lishi mumkin.
+    """
+    key = CONNECTIONS_KEY.format(user_id)
+    now = time.time()
+    try:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(key, "-inf", now)
+            pipe.zadd(key, {channel_name: now + settings.PRESENCE_TTL})
+            pipe.expire(key, settings.PRESENCE_TTL)
+            pipe.zadd(EXPIRY_KEY, {user_id: now + settings.PRESENCE_TTL}, gt=True)
+            await pipe.execute()
+    except RedisError:
+        logger.exception("presence: connect yozilmadi")
+        return
+    broadcaster.mark(user_id)
+
+
+async def heartbeat(user_id, channel_name):
+    """
+    Client har PRESENCE_HEARTBEAT_INTERVAL sekundda yuboradi - ulanish muddati uzayadi.
+    Ulanish ro'yxatda yo'q bo'lsa (sweeper offline deb olib tashlagan) - user yana online.
+    """
+    key = CONNECTIONS_KEY.format(user_id)
+    try:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            expires = time.time() + settings.PRESENCE_TTL
+            pipe.zadd(key, {channel_name: expires})
+            pipe.expire(key, settings.PRESENCE_TTL)
+            pipe.zadd(EXPIRY_KEY, {user_id: expires}, gt=True)
+            added, *_ = await pipe.execute()
+    except RedisError:
+        logger.exception("presence: heartbeat yozilmadi")
+        return
+    if added:
+        broadcaster.mark(user_id)
+
+
+async def user_disconnected(user_id, channel_name):
+    """
+    Ulanish yopildi. Boshqa ulanish qolmagan bo'lsa last_seen yoziladi.
+    """
+    key = CONNECTIONS_KEY.format(user_id)
+    now = time.time()
+    try:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.zrem(key, channel_name)
+            pipe.zremrangebyscore(key, "-inf", now)
+            pipe.zcard(key)
+            *_, remaining = await pipe.execute()
+        if not remaining:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.hset(LAST_SEEN_KEY, user_id, now)
+                pipe.zrem(EXPIRY_KEY, user_id)
+                await pipe.execute()
+    except RedisError:
+        logger.exception("presence: disconnect yozilmadi")
+        return
+    broadcaster.mark(user_id)
+
+
+async def sweep():
+    """
+    Muddati o'tgan userlarni EXPIRY_KEY'dan olish (MULTI ichida - bir nechta worker bo'lsa ham
+    har bir userni bittasi oladi). Tirik ulanishi qolmaganlarga last_seen (oxirgi heartbeat vaqti)
+    yoziladi va sheriklarga offline event ketadi. Orada qayta ulanganlar indeksga qaytariladi.
+    """
+    now = time.time()
+    redis = get_redis()
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.zrangebyscore(EXPIRY_KEY, "-inf", now, withscores=True)
+        pipe.zremrangebyscore(EXPIRY_KEY, "-inf", now)
+        expired, _ = await pipe.execute()
+    if not expired:
+        return
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for user_id, _ in expired:
+            key = CONNECTIONS_KEY.format(user_id.decode())
+            pipe.zremrangebyscore(key, "-inf", now)
+            pipe.zrange(key, -1, -1, withscores=True)
+        results = await pipe.execute()
+
+    last_seen, alive = {}, {}
+    for (user_id, expires), latest in zip(expired, results[1::2]):
+        user_id = int(user_id)
+        if latest:
+            alive[user_id] = latest[0][1]
+        else:
+            last_seen[user_id] = expires - settings.PRESENCE_TTL
+    async with redis.pipeline(transaction=False) as pipe:
+        if alive:
+            pipe.zadd(EXPIRY_KEY, alive, gt=True)
+        if last_seen:
+            pipe.hset(LAST_SEEN_KEY, mapping=last_seen)
+        await pipe.execute()
+    for user_id in last_seen:
+        broadcaster.mark(user_id)
+
+
+async def _sweep_forever():
+    while True:
+        await asyncio.sleep(settings.PRESENCE_SWEEP_INTERVAL)
+        try:
+            await sweep()
+        except RedisError:
+            logger.exception("presence: sweep bajarilmadi")
+
+
+def start_sweeper():
+    """
+    Shu event loop'da sweeper task (bir marta). Consumer connect'da chaqiriladi.
+    """
+    loop = asyncio.get_running_loop()
+    task = _sweepers.get(loop)
+    if task is None or task.done():
+        for old_loop in [old for old in _sweepers if old.is_closed()]:
+            del _sweepers[old_loop]
+        _sweepers[loop] = loop.create_task(_sweep_forever())
+
+
+async def get_presence(user_ids):
+    """
+    Userlarning hozirgi holati: [{"user_id", "online", "last_seen"}].
+    Muddati o'tgan (heartbeat kelmagan) ulanishlar hisobga olinmaydi.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return []
+    now = time.time()
+    redis = get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            pipe.zcount(CONNECTIONS_KEY.format(user_id), now, "+inf")
+        pipe.hmget(LAST_SEEN_KEY, user_ids)
+        *counts, last_seen = await pipe.execute()
+
+    result = []
+    for user_id, count, seen in zip(user_ids, counts, last_seen):
+        online = count > 0
+        result.append({
+            "user_id": user_id,
+            "online": online,
+            "last_seen": None if online or not seen else format_datetime(
+                datetime.fromtimestamp(float(seen), dt_timezone.utc)
+            ),
+        })
+    return result
+
+
+@database_task
+def get_chat_partners(user_ids):
+    """
+    Har bir user uchun u bilan chati bor userlar: {user_id: {partner_id, ...}}.
+    Shaxsiy chatlar - user1/user2, guruhlar - userning guruhlaridagi boshqa a'zolar.
+    """
+    user_ids = set(user_ids)
+    partners = defaultdict(set)
+    rows = Chat.objects.filter(Q(user1_id__in=user_ids) | Q(user2_id__in=user_ids)).values_list("user1_id", "user2_id")
+    for user1_id, user2_id in rows:
+        if user1_id in user_ids:
+            partners[user1_id].add(user2_id)
+        if user2_id in user_ids:
+            partners[user2_id].add(user1_id)
+
+    rows = ChatMember.objects.filter(
+        chat__is_group=True, chat__members__user_id__in=user_ids
+    ).values_list("chat__members__user_id", "user_id").distinct()
+    for user_id, partner_id in rows:
+        if partner_id != user_id:
+            partners[user_id].add(partner_id)
+    return partners
+
+
+class PresenceBroadcaster:
+    """
+    Presence o'zgarishlarini PRESENCE_BATCH_WINDOW davomida yig'ib, faqat
+    chat sheriklariga yuboradi. Oyna ichida ulanib-uzilgan (flap) user uchun
+    holati o'zgarmagan bo'lsa event umuman ketmaydi.
+    """
+
+    def __init__(self):
+        self.pending = set()
+        self.task = None
+
+    def mark(self, user_id):
+        self.pending.add(user_id)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while self.pending:
+            await asyncio.sleep(settings.PRESENCE_BATCH_WINDOW)
+            user_ids, self.pending = self.pending, set()
+            try:
+                await self.publish(user_ids)
+            except Exception:
+                logger.exception("presence: o'zgarishlar yuborilmadi")
+
+    async def publish(self, user_ids):
+        states = await get_presence(user_ids)
+        redis = get_redis()
+        published = await redis.hmget(PUBLISHED_KEY, [state["user_id"] for state in states])
+
+        changed = [
+            state for state, old in zip(states, published)
+            if old != (b"1" if state["online"] else b"0")
+        ]
+        if not changed:
+            return
+        await redis.hset(PUBLISHED_KEY, mapping={
+            state["user_id"]: "1" if state["online"] else "0" for state in changed
+        })
+
+        # Har bir sherikka bitta event - ichida o'zgargan barcha userlar
+        partners = await get_chat_partners([state["user_id"] for state in changed])
+        updates = defaultdict(list)
+        for state in changed:
+            for partner_id in partners.get(state["user_id"], ()):
+                updates[partner_id].append(state)
+
+        channel_layer = get_channel_layer()
+        for partner_id, users in updates.items():
+            await channel_layer.group_send(f"user_{partner_id}", {
+                "type": "presence_changed",
+                "users": users,
+            })
+
+
+broadcaster = PresenceBroadcaster()
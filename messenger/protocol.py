@@ -0,0 +1,53 @@
+import json
+
+import msgpack
+
+# Client `Sec-WebSocket-Protocol` orqali so'rasa - binary msgpack frame'lar
+MSGPACK_SUBPROTOCOL = "doppigram.msgpack"
+
+
+class JsonCodec:
+    """
+    Default protokol: JSON text frame'lar.
+    """
+    subprotocol = None
+
+    def encode(self, payload):
+        return {"text_data": json.dumps(payload)}
+
+
+class MsgpackCodec:
+    """
+    `doppigram.msgpack`: har bir action binary msgpack frame'da.
+    Media xom bayt (bytes) ko'rinishida base64'siz keladi.
+    """
+    subprotocol = MSGPACK_SUBPROTOCOL
+
+    def encode(self, payload):
+        return {"bytes_data": msgpack.packb(payload, use_bin_type=True)}
+
+
+def negotiate(scope):
+    """
+    Client taklif qilgan subprotocol'lar ichidan codec tanlash.
+    """
+    if MSGPACK_SUBPROTOCOL in scope.get("subprotocols", []):
+        return MsgpackCodec()
+    return JsonCodec()
+
+
+def decode_frame(text_data=None, bytes_data=None):
+    """
+    Kelgan frame'ni dict'ga o'girish: text -> JSON, binary -> msgpack.
+    Noto'g'ri frame bo'lsa ValueError.
+    """
+    try:
+        if bytes_data is not None:
+            data = msgpack.unpackb(bytes_data, raw=False)
+        else:
+            data = json.loads(text_data)
+    except (msgpack.UnpackException, ValueError, TypeError) as exc:
+        raise ValueError("Frame noto'g'ri") from exc
+    if not isinstance(data, dict):
+        raise ValueError("Frame noto'g'ri")
+    return data
@@ -0,0 +1,94 @@
+# WebSocket action'lari uchun token bucket (WS_RATE_LIMITS).
+# Har bir ulanishning o'z bucket'lari bor; bundan tashqari user bo'yicha umumiy bucket
+# (bir nechta tab/qurilma) - u worker xotirasida, Redis'ga borilmaydi: bir user'ning ulanishlari
+# turli workerlarga tushsa umumiy limit workerlar soniga ko'payadi.
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .indicators import CANCEL, CHAT_ACTIONS
+
+# 1008 (Policy Violation) ning private nusxasi: limitni buzgan va sekin o'qiydigan ulanishlar
+POLICY_CLOSE_CODE = 4008
+ALL_FRAMES = "*"  # decode'dan oldin har bir frame uchun
+USER_BUCKETS_MAX = 100_000  # worker xotirasidagi user bucket'lari (LRU)
+
+_user_buckets = OrderedDict()  # (user_id, key) -> TokenBucket
+
+
+class TokenBucket:
+    """
+    Sekundiga `rate` token, ko'pi bilan `burst` ta jamg'ariladi.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """
+        Token yetmasa keyingisigacha qolgan sekund, yetsa 0.
+        """
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+def rate_key(action):
+    """
+    Action -> WS_RATE_LIMITS kaliti. Chat action'lar bitta bucket'da,
+    noma'lum action xabar yuborish sifatida ishlanadi (receive ham shunday qiladi).
+    """
+    if action in CHAT_ACTIONS or action == CANCEL:
+        return "chat_action"
+    if action in settings.WS_RATE_LIMITS and action != ALL_FRAMES:
+        return action
+    return "send"
+
+
+def _user_bucket(user_id, key, rate, burst):
+    bucket = _user_buckets.get((user_id, key))
+    if bucket is None:
+        multiplier = settings.WS_USER_RATE_MULTIPLIER
+        bucket = _user_buckets[user_id, key] = TokenBucket(rate * multiplier, burst * multiplier)
+        if len(_user_buckets) > USER_BUCKETS_MAX:
+            _user_buckets.popitem(last=False)
+    else:
+        _user_buckets.move_to_end((user_id, key))
+    return bucket
+
+
+class RateLimiter:
+    """
+    Bitta ulanishning limitlari. check() 0 qaytarsa action bajariladi,
+    aks holda - necha sekunddan keyin qayta urinish mumkin (token sarflanmaydi).
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.buckets = {}
+
+    def check(self, key):
+        limit = settings.WS_RATE_LIMITS.get(key)
+        if limit is None:
+            return 0
+        rate, burst = limit
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(rate, burst)
+        buckets = (bucket, _user_bucket(self.user_id, key, rate, burst))
+
+        now = time.monotonic()
+        for bucket in buckets:
+            bucket.refill(now)
+        wait = max(bucket.wait_time() for bucket in buckets)
+        if wait:
+            return wait
+        for bucket in buckets:
+            bucket.tokens -= 1
+        return 0
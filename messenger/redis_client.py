@@ -0,0 +1,21 @@
+import asyncio
+
+import redis.asyncio as aioredis
+from django.conf import settings
+
+# Har bir event loop uchun bitta client (connection pool bilan)
+_clients = {}
+
+
+def get_redis():
+    """
+    REDIS_URL bo'yicha async Redis client (presence, inbox va h.k. uchun).
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        # async_to_sync har chaqiriqda yangi loop ochishi mumkin - yopilganlarini tozalaymiz
+        for old_loop in [old for old in _clients if old.is_closed()]:
+            del _clients[old_loop]
+        client = _clients[loop] = aioredis.from_url(settings.REDIS_URL)
+    return client
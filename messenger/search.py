@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+
+from .encoders import MESSAGE_FIELDS, encode_message_rows
+from .models import ChatMember, Message
+
+# 0008 migratsiyadagi trigger bilan bir xil bo'lishi kerak
+SEARCH_CONFIG = "simple"
+
+
+def build_query(text):
+    """
+    Foydalanuvchi kiritgan matndan tsquery ("so'z1 so'z2", "-so'z", "iqtibos" formatlari).
+    """
+    return SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+
+
+def search_messages(user, text, chat_id=None, limit=None, offset=0, request=None):
+    """
+    Userning chatlari bo'yicha xabar qidirish (GIN indeks + rank).
+    Natija rank, keyin vaqt bo'yicha; sahifalash offset bilan (SEARCH_MAX_OFFSET gacha).
+    """
+    try:
+        limit = max(1, min(int(limit or settings.SEARCH_PAGE_SIZE), settings.SEARCH_PAGE_SIZE))
+        offset = max(0, min(int(offset or 0), settings.SEARCH_MAX_OFFSET))
+    except (TypeError, ValueError):
+        limit, offset = settings.SEARCH_PAGE_SIZE, 0
+
+    query = build_query(text)
+    messages = Message.objects.filter(
+        chat_id__in=ChatMember.objects.filter(user=user).values("chat_id"),
+        search_vector=query,
+    )
+    if chat_id:
+        messages = messages.filter(chat_id=chat_id)
+
+    rows = list(
+        messages.annotate(rank=SearchRank(F("search_vector"), query))
+        .order_by("-rank", "-timestamp", "-id")
+        .values(*MESSAGE_FIELDS)[offset:offset + limit + 1]
+    )
+    has_more = len(rows) > limit
+    return {
+        "messages": encode_message_rows(rows[:limit], request=request),
+        "offset": offset,
+        "has_more": has_more,
+        "next_offset": offset + limit if has_more and offset + limit <= settings.SEARCH_MAX_OFFSET else None,
+    }
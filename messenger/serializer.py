@@ -1,52 +1,89 @@
+import os
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from .models import Message, Chat
+from . import waveforms
+from .models import Message, Chat, Upload
+from .uploads import media_extension
 User = get_user_model()
 
 
 class ChatSerializer(serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Chat
-        fields = ['id', 'user', 'last_message', 'created_at']
+        fields = ['id', 'is_group', 'title', 'user', 'last_message', 'unread_count', 'last_activity_at', 'created_at']
 
     def get_user(self, obj):
+        if obj.is_group:
+            return None
         context_user = self.context.get('user') or self.context.get('request', {}).user
 
         if not context_user or not hasattr(context_user, "id"):
             return None
 
-        other_user = obj.user2 if obj.user1 == context_user else obj.user1
+        other_user = obj.user2 if obj.user1_id == context_user.id else obj.user1
         return UserShortSerializer(other_user, context=self.context).data
 
+    def get_unread_count(self, obj):
+        # Chat.objects.for_user ChatMember.unread_count'ni annotate qiladi (xabarlar sanalmaydi)
+        return getattr(obj, 'unread_count', 0)
+
     def get_last_message(self, obj):
-        if not hasattr(obj, "messages"):
-            return None
-        last_msg = obj.messages.order_by('-timestamp').first()
+        # Chat.last_message create_message'da yangilanadi, select_related bilan keladi
+        last_msg = obj.last_message
         if last_msg:
             return {
                 'text': last_msg.text,
                 'timestamp': last_msg.timestamp.isoformat(),
-                'sender_id': last_msg.sender.id,
+                'sender_id': last_msg.sender_id,
                 'is_read': last_msg.is_read
             }
         return None
 
 
+class GroupChatCreateSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=255)
+    member_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.GROUP_MAX_MEMBERS - 1
+    )
+
+
+class ChatMembersSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.GROUP_MAX_MEMBERS - 1
+    )
+
+
 class UserShortSerializer(serializers.ModelSerializer):
     avatar = serializers.ImageField(use_url=True, required=False)
+    avatar_thumbnail = serializers.ImageField(use_url=True, read_only=True)
+    avatar_placeholder = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ['id', 'full_name', 'avatar']
+        fields = ['id', 'full_name', 'avatar', 'avatar_thumbnail', 'avatar_placeholder']
+
+    def get_avatar_placeholder(self, obj):
+        return obj.avatar_placeholder or None
 
 
 
 class MessageSerializer(serializers.ModelSerializer):
     sender = UserShortSerializer(read_only=True)
     file_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
+    placeholder = serializers.SerializerMethodField()
+    waveform = serializers.SerializerMethodField()
 
     class Meta:
         model = Message
@@ -55,18 +92,37 @@ class MessageSerializer(serializers.ModelSerializer):
             'type',
             'text',
             'file_url',
+            'thumbnail_url',
+            'preview_url',
+            'placeholder',
             'duration',
             'waveform',
             'timestamp',
             'is_read'
         ]
 
-    def get_file_url(self, obj):
-        if obj.file:
+    def _absolute_url(self, field_file):
+        if field_file:
             request = self.context.get('request')
-            return request.build_absolute_uri(obj.file.url) if request else obj.file.url
+            return request.build_absolute_uri(field_file.url) if request else field_file.url
         return None
 
+    def get_file_url(self, obj):
+        return self._absolute_url(obj.file)
+
+    def get_thumbnail_url(self, obj):
+        return self._absolute_url(obj.thumbnail)
+
+    def get_preview_url(self, obj):
+        return self._absolute_url(obj.preview)
+
+    def get_placeholder(self, obj):
+        return obj.placeholder or None
+
+    def get_waveform(self, obj):
+        # 8-bit amplitudalar base64 ko'rinishida (JSON float ro'yxati o'rniga)
+        return waveforms.encode(obj.waveform)
+
 
 # Faqat `sender` ning ismi bilan — soddalashtirilgan
 class MessageSimpleSerializer(serializers.ModelSerializer):
@@ -77,18 +133,29 @@ class MessageSimpleSerializer(serializers.ModelSerializer):
         fields = ['id', 'chat', 'sender', 'sender_full_name', 'text', 'timestamp', 'is_read']
 
 
-# class MessageUploadSerializer(serializers.ModelSerializer):
-#     class Meta:
-#         model = Message
-#         fields = ['chat', 'file']
-#
-#     def validate_file(self, file):
-#         # 🔒 Cheklovlar: ruxsat etilgan turlar va hajm
-#         max_size = 10 * 1024 * 1024  # 10MB
-#         allowed_types = ['image/jpeg', 'image/png', 'video/mp4', 'application/pdf']
-#
-#         if file.size > max_size:
-#             raise serializers.ValidationError("Fayl hajmi 10MB dan oshmasligi kerak.")
-#         if file.content_type not in allowed_types:
-#             raise serializers.ValidationError("Ruxsat etilmagan fayl turi.")
-#         return file
+class MessageUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Upload
+        fields = ['id', 'file_name', 'content_type', 'size', 'offset', 'status', 'created_at']
+        read_only_fields = ['id', 'offset', 'status', 'created_at']
+
+    def validate_size(self, size):
+        # 🔒 Cheklovlar: ruxsat etilgan turlar va hajm
+        if size <= 0:
+            raise serializers.ValidationError("Fayl hajmi noto‘g‘ri.")
+        if size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            max_mb = settings.CHUNKED_UPLOAD_MAX_SIZE // (1024 * 1024)
+            raise serializers.ValidationError(f"Fayl hajmi {max_mb}MB dan oshmasligi kerak.")
+        return size
+
+    def validate_content_type(self, content_type):
+        if content_type not in settings.CHUNKED_UPLOAD_CONTENT_TYPES:
+            raise serializers.ValidationError("Ruxsat etilmagan fayl turi.")
+        return content_type
+
+    def validate(self, data):
+        # Fayl nomi kengaytmasi e'lon qilingan turga mos bo'lishi shart (x.html + image/png emas)
+        ext = os.path.splitext(os.path.basename(data['file_name']))[1]
+        if media_extension(ext, data['content_type']) is None:
+            raise serializers.ValidationError({'file_name': "Fayl kengaytmasi fayl turiga mos emas."})
+        return data
@@ -0,0 +1,167 @@
+import threading
+from collections import OrderedDict, namedtuple
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from config.routers import mark_write
+
+from . import derivatives, waveforms
+from .encoders import encode_message
+from .models import Chat, ChatMember, Message, canonical_pair
+from .uploads import claim_upload
+
+# (user1_id, user2_id) -> chat_id, worker ichidagi LRU kesh
+CHAT_CACHE_SIZE = 10000
+_chat_cache = OrderedDict()
+_chat_cache_lock = threading.Lock()
+
+
+class SendMessageError(Exception):
+    pass
+
+
+SentMessage = namedtuple("SentMessage", ["chat_id", "is_group", "recipient_ids", "payload"])
+ReadReceipt = namedtuple("ReadReceipt", ["chat_id", "message_id", "unread_count", "sender_ids"])
+
+
+def get_chat_id(user1_id, user2_id):
+    """
+    Ikki user o'rtasidagi chat id'si. Avval keshdan, bo'lmasa bazadan (get_or_create).
+    Juftlik har doim kanonik tartibda (canonical_pair).
+    """
+    key = canonical_pair(user1_id, user2_id)
+    with _chat_cache_lock:
+        chat_id = _chat_cache.get(key)
+        if chat_id is not None:
+            _chat_cache.move_to_end(key)
+            return chat_id
+
+    chat, _ = Chat.objects.get_or_create_direct(key[0], key[1])
+
+    with _chat_cache_lock:
+        _chat_cache[key] = chat.id
+        if len(_chat_cache) > CHAT_CACHE_SIZE:
+            _chat_cache.popitem(last=False)
+    return chat.id
+
+
+def forget_chat(user1_id, user2_id):
+    with _chat_cache_lock:
+        _chat_cache.pop(canonical_pair(user1_id, user2_id), None)
+
+
+def get_chat_members(chat_id, user_id):
+    """
+    Chat a'zolari va chat turi, bitta so'rovda. User a'zo bo'lmasa SendMessageError.
+    (is_group, [member_id, ...]) qaytaradi.
+    """
+    rows = list(ChatMember.objects.filter(chat_id=chat_id).values_list("user_id", "chat__is_group"))
+    member_ids = [member_id for member_id, _ in rows]
+    if user_id not in member_ids:
+        raise SendMessageError("Chat topilmadi")
+    return rows[0][1], member_ids
+
+
+def send_message(sender, recipient_id=None, chat_id=None, message_type="text", text="", file=None,
+                 upload_id=None, duration=None, waveform=None):
+    """
+    Xabar yuborishning butun DB qismi - bitta tranzaksiya, bitta thread hop:
+    1) upload bo'lsa uni band qilish
+    2) chatni topish: recipient_id bo'lsa shaxsiy chat (kesh orqali),
+       chat_id bo'lsa - sender a'zoligini tekshirish (guruh chatlar uchun)
+    3) xabarni yozish va chatning last_message'ini yangilash
+    4) frontendga ketadigan payloadni tayyorlash
+    SentMessage qaytaradi.
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                if upload_id:
+                    file = claim_upload(upload_id, sender)
+                    if not file:
+                        raise SendMessageError("Upload topilmadi yoki yakunlanmagan")
+
+                if chat_id is not None:
+                    is_group, member_ids = get_chat_members(chat_id, sender.id)
+                    msg_chat_id = chat_id
+                else:
+                    is_group, member_ids = False, [sender.id, recipient_id]
+                    msg_chat_id = get_chat_id(sender.id, recipient_id)
+
+                msg = Message.objects.create(
+                    chat_id=msg_chat_id,
+                    sender=sender,
+                    type=message_type,
+                    text=text,
+                    file=file,
+                    duration=duration,
+                    waveform=waveforms.pack(waveform, settings.WAVEFORM_SAMPLES) if isinstance(waveform, list) else None,
+                    timestamp=now()
+                )
+                Chat.objects.filter(id=msg_chat_id).update(last_message=msg, last_activity_at=msg.timestamp)
+                if msg.type == "image" and msg.file:
+                    # thumbnail/preview fonda, commit'dan keyin (xabar kutib turmaydi)
+                    transaction.on_commit(partial(derivatives.schedule, derivatives.process_message_image, msg.id))
+                elif msg.type in ("audio", "round_video") and msg.file:
+                    # waveform fayldan serverda hisoblanadi, clientniki vaqtinchalik
+                    transaction.on_commit(partial(derivatives.schedule, derivatives.process_waveform, msg.id))
+                # O'qilmaganlar hisoblagichi - COUNT(*) o'rniga har xabarda +1
+                ChatMember.objects.filter(chat_id=msg_chat_id).exclude(user_id=sender.id).update(
+                    unread_count=F("unread_count") + 1
+                )
+                payload = encode_message(msg)
+            mark_write(sender.id)
+            return SentMessage(
+                chat_id=msg_chat_id,
+                is_group=is_group,
+                recipient_ids=[member_id for member_id in member_ids if member_id != sender.id],
+                payload=payload,
+            )
+        except IntegrityError:
+            # Keshdagi chat o'chirilgan yoki recipient mavjud emas
+            if recipient_id is not None:
+                forget_chat(sender.id, recipient_id)
+            if attempt or chat_id is not None:
+                raise SendMessageError("Foydalanuvchi topilmadi")
+
+
+def mark_read(user, chat_id, message_id):
+    """
+    Chatdagi message_id gacha (shu jumladan) bo'lgan xabarlarni o'qilgan deb belgilash:
+    1) high-water mark faqat oldinga siljiydi (chatning oxirgi xabaridan oshmaydi; batched rejimda -
+       oxirgi band qilingan id'dan: ack olgan, lekin hali yozilmagan xabarlar ham o'qilishi mumkin)
+    2) is_read bitta UPDATE bilan, faqat oldingi belgidan keyingi xabarlar uchun
+    3) unread_count qolgan (belgidan keyingi) xabarlar bo'yicha qayta hisoblanadi
+    User a'zo bo'lmasa None, aks holda ReadReceipt (sender_ids - receipt oluvchilar).
+    """
+    from . import writebehind  # writebehind services'ni import qiladi
+    with transaction.atomic():
+        member = ChatMember.objects.select_for_update().filter(chat_id=chat_id, user=user).first()
+        if member is None:
+            return None
+        last_message_id = Chat.objects.filter(id=chat_id).values_list("last_message_id", flat=True).first() or 0
+        if writebehind.enabled():
+            # Yozilmaganlarining is_read'i, unread_count'i va receipt'i flush'da (writebehind._apply)
+            last_message_id = max(last_message_id, writebehind.last_reserved_message_id())
+        message_id = min(message_id, last_message_id)
+        if member.last_read_id is not None and message_id <= member.last_read_id:
+            return ReadReceipt(chat_id, member.last_read_id, member.unread_count, [])
+
+        unread = Message.objects.filter(chat_id=chat_id, id__lte=message_id, is_read=False).exclude(sender=user)
+        if member.last_read_id is not None:
+            unread = unread.filter(id__gt=member.last_read_id)
+        sender_ids = list(unread.order_by().values_list("sender_id", flat=True).distinct())
+        if sender_ids:
+            unread.update(is_read=True)
+
+        member.last_read_id = message_id
+        member.unread_count = (
+            Message.objects.filter(chat_id=chat_id, id__gt=message_id).exclude(sender=user).count()
+        )
+        member.save(update_fields=["last_read_id", "unread_count"])
+    mark_write(user.id)
+    return ReadReceipt(chat_id, message_id, member.unread_count, sender_ids)
@@ -1,3 +1,352 @@
-from django.test import TestCase
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import SkipTest
 
-# Create your tests here.
+import redis
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db.models import Max
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+
+from users.models import AbstractUser
+
+from . import inbox, presence, services, writebehind
+from .models import Chat, ChatMember, Message, Upload
+from .pagination import InvalidCursor, encode_cursor, paginate_messages
+from .uploads import delete_stale_uploads, media_extension, partial_path
+from .writebehind import flush_messages
+
+
+def make_row(msg_id, chat, sender, text="salom", timestamp=None):
+    return {
+        "id": msg_id,
+        "chat_id": chat.id,
+        "sender_id": sender.id,
+        "type": "text",
+        "text": text,
+        "timestamp": (timestamp or now()).isoformat(),
+    }
+
+
+class FlushMessagesTests(TestCase):
+    """
+    Write-behind flush: idempotentlik va hisoblagichlar.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = AbstractUser.objects.create_user("+998900000001", "Alice")
+        cls.bob = AbstractUser.objects.create_user("+998900000002", "Bob")
+        cls.chat, _ = Chat.objects.get_or_create_direct(cls.alice.id, cls.bob.id)
+
+    def member(self, user):
+        return ChatMember.objects.get(chat=self.chat, user=user)
+
+    def test_flush_writes_rows_and_counters(self):
+        rows = [make_row(10_001, self.chat, self.alice), make_row(10_002, self.chat, self.alice)]
+        flushed = flush_messages(rows)
+
+        self.assertEqual(flushed.written, 2)
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 2)
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.last_message_id, 10_002)
+        self.assertEqual(self.member(self.bob).unread_count, 2)
+        self.assertEqual(self.member(self.alice).unread_count, 0)
+
+    def test_flush_is_idempotent(self):
+        rows = [make_row(10_001, self.chat, self.alice), make_row(10_002, self.chat, self.alice)]
+        flush_messages(rows)
+        flushed = flush_messages(rows + [make_row(10_003, self.chat, self.alice)])
+
+        self.assertEqual(flushed.written, 1)
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 3)
+        self.assertEqual(self.member(self.bob).unread_count, 3)
+
+    def test_keeps_journal_timestamp(self):
+        timestamp = now() - timedelta(minutes=5)
+        flush_messages([make_row(10_001, self.chat, self.alice, timestamp=timestamp)])
+        self.assertEqual(Message.objects.get(id=10_001).timestamp, timestamp)
+
+    def test_read_before_flush(self):
+        # Bob xabar bazaga tushmasidan oldin mark_read qilgan
+        ChatMember.objects.filter(chat=self.chat, user=self.bob).update(last_read_id=10_002)
+        rows = [make_row(msg_id, self.chat, self.alice) for msg_id in (10_001, 10_002, 10_003)]
+        flushed = flush_messages(rows)
+
+        self.assertEqual(self.member(self.bob).unread_count, 1)
+        self.assertEqual(
+            list(Message.objects.filter(chat=self.chat).order_by("id").values_list("is_read", flat=True)),
+            [True, True, False],
+        )
+        self.assertEqual(flushed.receipts, [(self.chat.id, self.bob.id, 10_002, self.alice.id)])
+
+
+class FlushMessagesFallbackTests(TransactionTestCase):
+    """
+    FK xatosi (DEFERRABLE) commit paytida chiqadi - haqiqiy tranzaksiyalar kerak.
+    """
+
+    def setUp(self):
+        # Oldingi testlardan qolgan worker holati: write-behind buferlari va chat keshi
+        writebehind._buffers.clear()
+        services._chat_cache.clear()
+        Message.objects.all().delete()
+
+    def test_missing_sender_does_not_stop_batch(self):
+        alice = AbstractUser.objects.create_user("+998900000001", "Alice")
+        bob = AbstractUser.objects.create_user("+998900000002", "Bob")
+        chat, _ = Chat.objects.get_or_create_direct(alice.id, bob.id)
+        rows = [make_row(10_001, chat, alice), make_row(10_002, chat, alice)]
+        # Sequence testlar orasida tiklanmaydi - bazada yo'q id'ni hisoblab olamiz
+        rows[0]["sender_id"] = AbstractUser.objects.aggregate(Max("id"))["id__max"] + 1
+        flushed = flush_messages(rows)
+
+        self.assertEqual(flushed.written, 1)
+        self.assertEqual(list(Message.objects.values_list("id", flat=True)), [10_002])
+        self.assertEqual(ChatMember.objects.get(chat=chat, user=bob).unread_count, 1)
+
+
+class PaginateMessagesTests(TestCase):
+    """
+    (timestamp, id) keyset sahifalash.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = AbstractUser.objects.create_user("+998900000001", "Alice")
+        cls.bob = AbstractUser.objects.create_user("+998900000002", "Bob")
+        cls.chat, _ = Chat.objects.get_or_create_direct(cls.alice.id, cls.bob.id)
+        start = now()
+        cls.messages = [
+            Message.objects.create(chat=cls.chat, sender=cls.alice, text=str(i))
+            for i in range(5)
+        ]
+        # Ikkita xabar bir xil timestamp bilan - tartib id bo'yicha
+        for i, msg in enumerate(cls.messages):
+            msg.timestamp = start + timedelta(seconds=min(i, 3))
+        Message.objects.bulk_update(cls.messages, ["timestamp"])
+
+    def page(self, **kwargs):
+        page = paginate_messages(Message.objects.filter(chat=self.chat), **kwargs)
+        return [msg.id for msg in page["items"]], page
+
+    def test_latest_page(self):
+        ids, page = self.page(limit=2)
+        self.assertEqual(ids, [msg.id for msg in self.messages[3:]])
+        self.assertTrue(page["has_more"])
+        self.assertEqual(page["before"], encode_cursor(self.messages[3]))
+
+    def test_before_and_after(self):
+        _, page = self.page(limit=2)
+        ids, older = self.page(before=page["before"], limit=2)
+        self.assertEqual(ids, [msg.id for msg in self.messages[1:3]])
+
+        ids, _ = self.page(before=older["before"], limit=2)
+        self.assertEqual(ids, [self.messages[0].id])
+
+        ids, newer = self.page(after=encode_cursor(self.messages[1]), limit=10)
+        self.assertEqual(ids, [msg.id for msg in self.messages[2:]])
+        self.assertFalse(newer["has_more"])
+
+    def test_same_timestamp_not_skipped(self):
+        ids, _ = self.page(before=encode_cursor(self.messages[4]), limit=1)
+        self.assertEqual(ids, [self.messages[3].id])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            self.page(before="yaroqsiz")
+
+
+class UploadCleanupTests(TestCase):
+    """
+    Eskirgan pending upload'lar va userning ochiq upload'lari chegarasi.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = AbstractUser.objects.create_user("+998900000001", "Alice")
+
+    def setUp(self):
+        upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(upload_dir.cleanup)
+        settings_override = override_settings(CHUNKED_UPLOAD_DIR=upload_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, age, part_age=None):
+        upload = Upload.objects.create(owner=self.alice, file_name="a.pdf", content_type="application/pdf", size=10)
+        Upload.objects.filter(id=upload.id).update(created_at=now() - timedelta(seconds=age))
+        if part_age is not None:
+            path = partial_path(upload)
+            with open(path, "wb") as part:
+                part.write(b"12345")
+            os.utime(path, (time.time() - part_age,) * 2)
+        return upload
+
+    def test_deletes_stale_row_and_part(self):
+        stale = self.upload(age=7200, part_age=7200)
+        self.upload(age=7200)
+        fresh = self.upload(age=60)
+        active = self.upload(age=7200, part_age=60)  # sekin, lekin chunk kelyapti
+
+        self.assertEqual(delete_stale_uploads(3600), 2)
+        self.assertFalse(os.path.exists(partial_path(stale)))
+        self.assertEqual(set(Upload.objects.values_list("id", flat=True)), {fresh.id, active.id})
+
+    @override_settings(CHUNKED_UPLOAD_MAX_PENDING=2, CHUNKED_UPLOAD_EXPIRY=3600)
+    def test_open_uploads_limit(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        self.upload(age=7200)  # muddati o'tgan - hisobga kirmaydi
+        data = {"file_name": "a.pdf", "content_type": "application/pdf", "size": 10}
+        statuses = [client.post(reverse("message-upload"), data).status_code for _ in range(3)]
+        self.assertEqual(statuses, [201, 201, 429])
+
+    def test_file_name_must_match_content_type(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        data = {"file_name": "x.html", "content_type": "image/png", "size": 10}
+        response = client.post(reverse("message-upload"), data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("file_name", response.data)
+
+
+class MediaExtensionTests(SimpleTestCase):
+    """
+    Xom bayt/data URL media kengaytmasi CHUNKED_UPLOAD_CONTENT_TYPES bo'yicha.
+    """
+
+    def test_allowed(self):
+        for ext, expected in (("png", "png"), (".JPG", "jpg"), ("jpeg", "jpeg"), ("mov", "mov"), ("m4a", "m4a")):
+            self.assertEqual(media_extension(ext), expected)
+
+    def test_rejected(self):
+        for ext in (None, "", "bin", "html", "svg+xml", "../png", "png/x"):
+            self.assertIsNone(media_extension(ext))
+
+    def test_content_type_must_match(self):
+        self.assertEqual(media_extension(".jpg", "image/jpeg"), "jpg")
+        self.assertIsNone(media_extension(".html", "image/png"))
+        self.assertIsNone(media_extension(".jpg", "image/png"))
+        self.assertIsNone(media_extension(".svg", "image/svg+xml"))  # ro'yxatda yo'q tur
+
+
+class ChatPartnersTests(TestCase):
+    """
+    Presence eventi kimlarga ketadi: shaxsiy chat sheriklari va guruhdoshlar.
+    """
+
+    def test_direct_and_group_partners(self):
+        alice, bob, carol, dave = (
+            AbstractUser.objects.create_user(f"+99890000001{i}", name)
+            for i, name in enumerate(("Alice", "Bob", "Carol", "Dave"))
+        )
+        Chat.objects.get_or_create_direct(alice.id, dave.id)
+        group = Chat.objects.create(is_group=True, title="Guruh")
+        ChatMember.objects.bulk_create(ChatMember(chat=group, user=user) for user in (alice, bob, carol))
+
+        partners = presence.get_chat_partners.__wrapped__([alice.id, carol.id])
+        self.assertEqual(partners[alice.id], {bob.id, carol.id, dave.id})
+        self.assertEqual(partners[carol.id], {alice.id, bob.id})
+        self.assertNotIn(bob.id, partners)
+
+
+class InboxReadSinceTests(TestCase):
+    """
+    Offline inbox: cursordan keyingi eventlar va trim qilingan cursor -> reset. Redis kerak.
+    """
+
+    user_id = 900_000_001
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.redis = redis.Redis.from_url(settings.REDIS_URL)
+        try:
+            cls.redis.ping()
+        except redis.RedisError:
+            raise SkipTest("Redis ishlamayapti")
+
+    chat_ids = (900_000_101, 900_000_102)
+
+    def setUp(self):
+        self.key = inbox.INBOX_KEY.format(self.user_id)
+        keys = [self.key, *(inbox.CHAT_INBOX_KEY.format(chat_id) for chat_id in self.chat_ids)]
+        self.redis.delete(*keys)
+        self.addCleanup(self.redis.delete, *keys)
+
+    def append(self, n):
+        return [
+            async_to_sync(inbox.append)([self.user_id], {"type": "new_message", "n": i})[self.user_id]
+            for i in range(n)
+        ]
+
+    def test_read_since_cursor(self):
+        cursors = self.append(3)
+        result = async_to_sync(inbox.read_since)(self.user_id, cursors[0])
+
+        self.assertFalse(result["reset"])
+        self.assertEqual([event["n"] for event in result["events"]], [1, 2])
+        self.assertEqual(result["cursor"], cursors[-1])
+
+    def test_limit_and_has_more(self):
+        self.append(3)
+        result = async_to_sync(inbox.read_since)(self.user_id, inbox.EMPTY_CURSOR, limit=2)
+        self.assertEqual(len(result["events"]), 2)
+        self.assertTrue(result["has_more"])
+
+    def test_trimmed_cursor_resets(self):
+        cursors = self.append(3)
+        self.redis.xtrim(self.key, maxlen=1, approximate=False)
+        result = async_to_sync(inbox.read_since)(self.user_id, cursors[0])
+
+        self.assertTrue(result["reset"])
+        self.assertEqual(result["events"], [])
+        self.assertEqual(result["cursor"], cursors[-1])
+
+    def test_expired_inbox_resets(self):
+        cursor = f"{int(time.time() * 1000)}-0"
+        result = async_to_sync(inbox.read_since)(self.user_id, cursor)
+        self.assertTrue(result["reset"])
+
+    def test_malformed_cursor_resets(self):
+        self.append(1)
+        self.assertTrue(async_to_sync(inbox.read_since)(self.user_id, "abc")["reset"])
+
+    def test_group_streams_merged(self):
+        first, second = self.chat_ids
+        old_chat_cursor = async_to_sync(inbox.append_chat)(first, {"type": "new_message", "n": "old"})
+        user_cursor = self.append(1)[0]
+        async_to_sync(inbox.append_chat)(first, {"type": "new_message", "n": "a"})
+        async_to_sync(inbox.append_chat)(second, {"type": "new_message", "n": "b"})
+        self.append(1)
+
+        result = async_to_sync(inbox.read_since)(
+            self.user_id, user_cursor, chat_ids=self.chat_ids, chat_cursors={first: old_chat_cursor}
+        )
+        self.assertFalse(result["reset"])
+        self.assertEqual([event["n"] for event in result["events"]], ["a", "b", 0])
+        self.assertEqual(set(result["chat_cursors"]), {first, second})
+        self.assertEqual(result["chat_cursors"][second], result["events"][1]["chat_cursor"])
+
+        # Qaytgan cursor'lar bilan keyingi sync bo'sh
+        again = async_to_sync(inbox.read_since)(
+            self.user_id, result["cursor"], chat_ids=self.chat_ids, chat_cursors=result["chat_cursors"]
+        )
+        self.assertEqual(again["events"], [])
+
+    def test_group_limit_keeps_order(self):
+        first, _ = self.chat_ids
+        for i in range(3):
+            async_to_sync(inbox.append_chat)(first, {"type": "new_message", "n": i})
+        result = async_to_sync(inbox.read_since)(
+            self.user_id, inbox.EMPTY_CURSOR, limit=2, chat_ids=self.chat_ids
+        )
+        self.assertEqual([event["n"] for event in result["events"]], [0, 1])
+        self.assertTrue(result["has_more"])
+        self.assertEqual(result["chat_cursors"][first], result["events"][1]["chat_cursor"])
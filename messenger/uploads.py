@@ -0,0 +1,148 @@
+import mimetypes
+import os
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils.timezone import now
+
+from .models import Upload
+
+# request body'dan bir martada o'qiladigan hajm (xotira chegarasi)
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+def media_extension(ext, content_type=None):
+    """
+    Media kengaytmasi: CHUNKED_UPLOAD_CONTENT_TYPES'ning subtype'lari va ularning mimetypes kengaytmalari.
+    content_type berilsa - faqat shu turniki (e'lon qilingan tur va fayl nomi mos bo'lishi uchun).
+    Ruxsat etilmagan bo'lsa None.
+    """
+    ext = str(ext or "").strip(".").lower()
+    content_types = settings.CHUNKED_UPLOAD_CONTENT_TYPES
+    if content_type is not None:
+        content_types = [content_type] if content_type in content_types else []
+    for content_type in content_types:
+        if ext == content_type.split("/")[-1] or f".{ext}" in mimetypes.guess_all_extensions(content_type):
+            return ext
+    return None
+
+
+def partial_path(upload):
+    """
+    Yuklanayotgan faylning vaqtinchalik (.part) joylashuvi.
+    """
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{upload.id}.part")
+
+
+def append_chunk(upload_id, owner, offset, stream, length):
+    """
+    Upload'ga navbatdagi chunkni qo'shish.
+    1) offset serverdagi offset bilan mos bo'lishi shart (resumable)
+    2) body xotiraga to'liq o'qilmaydi - bloklab diskka yoziladi
+    3) oxirgi chunkdan so'ng fayl storage'ga ko'chiriladi
+    """
+    with transaction.atomic():
+        try:
+            upload = Upload.objects.select_for_update().get(id=upload_id, owner=owner)
+        except Upload.DoesNotExist:
+            raise UploadError("Upload topilmadi")
+
+        if upload.status != "pending":
+            raise UploadError("Upload allaqachon yakunlangan")
+        if offset != upload.offset:
+            raise UploadError(f"Offset mos emas, kutilgan: {upload.offset}")
+        if length <= 0 or upload.offset + length > upload.size:
+            raise UploadError("Chunk hajmi noto'g'ri")
+
+        path = partial_path(upload)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        received = 0
+        with open(path, "r+b" if os.path.exists(path) else "wb") as part:
+            part.seek(upload.offset)
+            part.truncate()
+            while received < length:
+                block = stream.read(min(READ_BLOCK_SIZE, length - received))
+                if not block:
+                    break
+                part.write(block)
+                received += len(block)
+
+        upload.offset += received
+        if upload.offset == upload.size:
+            finalize_upload(upload)
+        upload.save(update_fields=["offset", "file", "status"])
+        return upload
+
+
+def finalize_upload(upload):
+    """
+    To'liq yuklangan .part faylni storage'ga bloklab ko'chirish.
+    """
+    path = partial_path(upload)
+    name, ext = os.path.splitext(os.path.basename(upload.file_name))
+    if media_extension(ext, upload.content_type) is None:
+        # tekshiruvdan oldin yaratilgan upload: kengaytma e'lon qilingan turdan olinadi
+        ext = mimetypes.guess_extension(upload.content_type) or f".{upload.content_type.split('/')[-1]}"
+    with open(path, "rb") as part:
+        upload.file.save(f"{name}{ext}", File(part), save=False)
+    os.remove(path)
+    upload.status = "complete"
+
+
+def claim_upload(upload_id, owner):
+    """
+    Yakunlangan upload'ni xabarga biriktirish. Har bir upload faqat bir marta ishlatiladi.
+    Fayl nomini qaytaradi yoki None.
+    """
+    try:
+        upload_id = uuid.UUID(str(upload_id))
+    except ValueError:
+        return None
+    updated = Upload.objects.filter(id=upload_id, owner=owner, status="complete").update(status="attached")
+    if not updated:
+        return None
+    return Upload.objects.values_list("file", flat=True).get(id=upload_id)
+
+
+def open_uploads(owner):
+    """
+    Userning hali muddati o'tmagan pending upload'lari (CHUNKED_UPLOAD_MAX_PENDING uchun).
+    """
+    cutoff = now() - timedelta(seconds=settings.CHUNKED_UPLOAD_EXPIRY)
+    return Upload.objects.filter(owner=owner, status="pending", created_at__gte=cutoff)
+
+
+def delete_stale_uploads(max_age):
+    """
+    max_age sekunddan beri chunk kelmagan pending upload'lar: qator va .part fayl o'chiriladi.
+    Oxirgi chunk vaqti - .part faylning mtime'i (sekin, lekin davom etayotgan yuklash o'chmaydi).
+    O'chirilganlar sonini qaytaradi.
+    """
+    deadline = time.time() - max_age
+    candidates = Upload.objects.filter(status="pending", created_at__lt=now() - timedelta(seconds=max_age))
+    deleted = 0
+    for upload in candidates.iterator():
+        with transaction.atomic():
+            # chunk yozilayotgan bo'lsa append_chunk tugashini kutadi
+            upload = Upload.objects.select_for_update().filter(id=upload.id, status="pending").first()
+            if upload is None:
+                continue
+            path = partial_path(upload)
+            try:
+                if os.path.getmtime(path) > deadline:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            upload.delete()
+            deleted += 1
+    return deleted
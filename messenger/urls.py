@@ -1,11 +1,18 @@
 # chat/urls.py
 from django.urls import path
-from .views import ChatListView, ChatCreateView, MessageListView
+from .views import ChatListView, ChatCreateView, MessageListView, UploadMessageView, UploadChunkView, \
+    GroupChatCreateView, ChatMembersView, ChatMemberDetailView, MessageSearchView, MetricsView
 
 urlpatterns = [
     path('chats/', ChatListView.as_view(), name='chat-list'),
     path('chats/create/', ChatCreateView.as_view(), name='chat-create'),
+    path('chats/groups/', GroupChatCreateView.as_view(), name='group-chat-create'),
+    path('chats/<int:pk>/members/', ChatMembersView.as_view(), name='chat-members'),
+    path('chats/<int:pk>/members/<int:user_id>/', ChatMemberDetailView.as_view(), name='chat-member-detail'),
     path('messages/', MessageListView.as_view(), name='message-list'),
-    # path('messages/upload/', UploadMessageView.as_view(), name='message-upload'),
+    path('messages/search/', MessageSearchView.as_view(), name='message-search'),
+    path('messages/upload/', UploadMessageView.as_view(), name='message-upload'),
+    path('messages/upload/<uuid:pk>/', UploadChunkView.as_view(), name='message-upload-chunk'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 
 ]
@@ -1,24 +1,66 @@
+import hmac
+
+import redis
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from django.db import models
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.views import View
 from rest_framework.generics import CreateAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from redis.exceptions import RedisError
+
+from config.routers import replica_read
+
+from . import inbox, metrics
+from .conditional import chat_list_etag, message_page_etag, not_modified, with_cache_headers
+from .encoders import MESSAGE_FIELDS, encode_message_rows
+from .models import Chat, ChatMember, Upload
+from .pagination import InvalidCursor, paginate_messages
+from .search import search_messages
+from .serializer import ChatMembersSerializer, ChatSerializer, GroupChatCreateSerializer, MessageUploadSerializer
+from .uploads import UploadError, append_chunk, open_uploads
+
+User = get_user_model()
 
-from .models import Chat
-from .serializer import ChatSerializer, MessageSerializer
-from django.db.models import Q
 
 class ChatListView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @replica_read
     def get(self, request):
         user = request.user
-        chats = Chat.objects.filter(Q(user1=user) | Q(user2=user))
+        # Mobil client har ochilishda so'raydi: o'zgarmagan bo'lsa 304, serializer ishlamaydi
+        etag = chat_list_etag(user)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        chats = Chat.objects.for_user(user)
 
         serializer = ChatSerializer(chats, many=True, context={'request': request})
-        return Response(serializer.data)
+        return with_cache_headers(Response(serializer.data), etag)
+
+def notify_users(user_ids, event):
+    """
+    Eventni userlarga yuborish: avval inboxga (offline bo'lsa sync uchun), keyin real-time.
+    """
+    try:
+        cursors = async_to_sync(inbox.append)(user_ids, event)
+    except RedisError:
+        cursors = {}
+
+    channel_layer = get_channel_layer()
+    for uid in user_ids:
+        async_to_sync(channel_layer.group_send)(
+            f"user_{uid}",
+            {**event, "cursor": cursors.get(uid)}
+        )
+
 
 class ChatCreateView(CreateAPIView):
     serializer_class = ChatSerializer
@@ -31,7 +73,7 @@ class ChatCreateView(CreateAPIView):
         if not user2_id:
             return  # foydalanuvchi tanlanmagan bo‘lsa
 
-        chat, created = Chat.objects.get_or_create(user1=user1, user2_id=user2_id)
+        chat, created = Chat.objects.get_or_create_direct(user1.id, int(user2_id))
 
         if created:
             serializer.instance = chat
@@ -39,50 +81,224 @@ class ChatCreateView(CreateAPIView):
             # ✅ model object uzatilyapti (chat), dict emas!
             serialized_chat = ChatSerializer(chat, context={"user": self.request.user}).data
 
-            channel_layer = get_channel_layer()
-            for uid in [user1.id, int(user2_id)]:
-                async_to_sync(channel_layer.group_send)(
-                    f"user_{uid}",
-                    {
-                        "type": "new_chat",
-                        "chat": serialized_chat
-                    }
-                )
+            notify_users([user1.id, int(user2_id)], {
+                "type": "new_chat",
+                "chat": serialized_chat,
+                "member_ids": [user1.id, int(user2_id)]
+            })
+
+
+class GroupChatCreateView(APIView):
+    """
+    Guruh chat yaratish: yaratuvchi admin bo'ladi, a'zolarga chat_joined eventi ketadi.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = GroupChatCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        member_ids = set(
+            User.objects.filter(id__in=serializer.validated_data['member_ids']).values_list('id', flat=True)
+        )
+        member_ids.discard(request.user.id)
+
+        with transaction.atomic():
+            chat = Chat.objects.create(is_group=True, title=serializer.validated_data['title'])
+            ChatMember.objects.bulk_create(
+                [ChatMember(chat=chat, user=request.user, is_admin=True)] +
+                [ChatMember(chat=chat, user_id=uid) for uid in member_ids]
+            )
+
+        data = ChatSerializer(chat, context={'request': request}).data
+        notify_users([request.user.id, *member_ids], {
+            "type": "chat_joined",
+            "chat_id": chat.id,
+            "chat": data
+        })
+        return Response(data, status=201)
+
+
+class ChatMembersView(APIView):
+    """
+    Guruh chatga a'zo qo'shish (chatning istalgan a'zosi qo'sha oladi).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        chat = get_object_or_404(Chat, id=pk, is_group=True, members__user=request.user)
+        serializer = ChatMembersSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        existing = set(chat.members.values_list('user_id', flat=True))
+        new_ids = set(
+            User.objects.filter(id__in=serializer.validated_data['user_ids']).values_list('id', flat=True)
+        ) - existing
+        if len(existing) + len(new_ids) > settings.GROUP_MAX_MEMBERS:
+            return Response({"error": "Guruh a'zolari soni chegaradan oshdi"}, status=400)
+
+        ChatMember.objects.bulk_create([ChatMember(chat=chat, user_id=uid) for uid in new_ids], ignore_conflicts=True)
+
+        if new_ids:
+            notify_users(list(new_ids), {
+                "type": "chat_joined",
+                "chat_id": chat.id,
+                "chat": ChatSerializer(chat, context={'request': request}).data
+            })
+        return Response({"added": sorted(new_ids)})
+
+
+class ChatMemberDetailView(APIView):
+    """
+    Guruhdan chiqish (o'zini) yoki a'zoni chiqarish (faqat admin).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, pk, user_id):
+        membership = get_object_or_404(ChatMember, chat_id=pk, chat__is_group=True, user=request.user)
+        if user_id != request.user.id and not membership.is_admin:
+            return Response({"error": "Faqat admin a'zoni chiqara oladi"}, status=403)
+
+        deleted, _ = ChatMember.objects.filter(chat_id=pk, user_id=user_id).delete()
+        if not deleted:
+            return Response({"error": "A'zo topilmadi"}, status=404)
+
+        notify_users([user_id], {
+            "type": "chat_left",
+            "chat_id": pk
+        })
+        return Response(status=204)
 
 
 class MessageListView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @replica_read
     def get(self, request):
+        # user_id - shaxsiy chat, chat_id - guruh (yoki istalgan a'zo bo'lgan) chat
         user_id = request.query_params.get("user_id", None)
-        if not user_id:
-            return Response({"error": "user_id kerak"}, status=400)
+        chat_id = request.query_params.get("chat_id", None)
+        if not user_id and not chat_id:
+            return Response({"error": "user_id yoki chat_id kerak"}, status=400)
 
         try:
-            chat = Chat.objects.get(
-                (models.Q(user1=request.user, user2_id=user_id) |
-                 models.Q(user1_id=user_id, user2=request.user))
-            )
-        except Chat.DoesNotExist:
+            if chat_id:
+                chat = Chat.objects.get(id=chat_id, members__user=request.user)
+            else:
+                chat = Chat.objects.direct(request.user.id, int(user_id)).get()
+        except (Chat.DoesNotExist, ValueError):
             return Response({"error": "Chat mavjud emas"}, status=404)
 
-        messages = chat.messages.order_by("timestamp")
-        serializer = MessageSerializer(messages, many=True, context={'request': request})
-        return Response(serializer.data)
-
-
-# class UploadMessageView(APIView):
-#     permission_classes = [IsAuthenticated]
-#     parser_classes = [MultiPartParser, FormParser]
-#
-#     def post(self, request, *args, **kwargs):
-#         serializer = MessageUploadSerializer(data=request.data)
-#         if serializer.is_valid():
-#             msg = serializer.save(sender=request.user)
-#             return Response({
-#                 "message_id": msg.id,
-#                 "chat": msg.chat.id,
-#                 "file_url": msg.file.url,
-#                 "timestamp": msg.timestamp.isoformat()
-#             })
-#         return Response(serializer.errors, status=400)
+        # ?before= sahifalari (tarix) client keshida MESSAGE_HISTORY_MAX_AGE saqlanadi
+        history = request.query_params.get("before") and not request.query_params.get("after")
+        max_age = settings.MESSAGE_HISTORY_MAX_AGE if history else None
+        try:
+            etag = message_page_etag(chat, request)
+        except InvalidCursor:
+            return Response({"error": "cursor noto'g'ri"}, status=400)
+        cached = not_modified(request, etag, max_age)
+        if cached:
+            return cached
+
+        messages = chat.messages.values(*MESSAGE_FIELDS)
+        try:
+            page = paginate_messages(
+                messages,
+                before=request.query_params.get("before"),
+                after=request.query_params.get("after"),
+                limit=request.query_params.get("limit"),
+            )
+        except InvalidCursor:
+            return Response({"error": "cursor noto'g'ri"}, status=400)
+
+        page["messages"] = encode_message_rows(page.pop("items"), request=request)
+        return with_cache_headers(Response(page), etag, max_age)
+
+
+class MessageSearchView(APIView):
+    """
+    Userning barcha chatlari (yoki bitta chat_id) bo'yicha xabar qidirish.
+    ?q=...&chat_id=...&limit=...&offset=...
+    """
+    permission_classes = [IsAuthenticated]
+
+    @replica_read
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"error": "q kerak"}, status=400)
+
+        chat_id = request.query_params.get("chat_id")
+        if chat_id and not chat_id.isdigit():
+            return Response({"error": "chat_id noto'g'ri"}, status=400)
+
+        return Response(search_messages(
+            request.user,
+            query,
+            chat_id=chat_id,
+            limit=request.query_params.get("limit"),
+            offset=request.query_params.get("offset"),
+            request=request,
+        ))
+
+
+class UploadMessageView(APIView):
+    """
+    Bo'laklab yuklashni boshlash: fayl nomi, turi va umumiy hajmi yuboriladi.
+    Javobdagi id bilan chunklar UploadChunkView'ga PATCH qilinadi.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = MessageUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if open_uploads(request.user).count() >= settings.CHUNKED_UPLOAD_MAX_PENDING:
+            return Response({"error": "Yakunlanmagan upload'lar juda ko'p"}, status=429)
+        upload = serializer.save(owner=request.user)
+        data = MessageUploadSerializer(upload).data
+        data["chunk_size"] = settings.CHUNKED_UPLOAD_CHUNK_SIZE
+        return Response(data, status=201)
+
+
+class UploadChunkView(APIView):
+    """
+    GET - upload holati (qayerdan davom ettirish kerakligi, offset).
+    PATCH - navbatdagi chunk: body xom baytlar, `Upload-Offset` headerida boshlanish nuqtasi.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        upload = get_object_or_404(Upload, id=pk, owner=request.user)
+        return Response(MessageUploadSerializer(upload).data)
+
+    def patch(self, request, pk):
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+            length = int(request.headers.get("Content-Length", ""))
+        except ValueError:
+            return Response({"error": "Upload-Offset va Content-Length kerak"}, status=400)
+
+        try:
+            upload = append_chunk(pk, request.user, offset, request.stream, length)
+        except UploadError as exc:
+            return Response({"error": str(exc)}, status=409)
+
+        return Response(MessageUploadSerializer(upload).data)
+
+
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint: barcha workerlarning metrikalari (messenger.metrics).
+    METRICS_TOKEN berilgan bo'lsa Authorization: Bearer <token> kerak.
+    """
+
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return HttpResponse(status=403)
+        client = redis.Redis.from_url(settings.REDIS_URL)
+        try:
+            body = metrics.render(metrics.collect(client))
+        finally:
+            client.close()
+        return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,81 @@
+# Audio/round video waveform: fiksirlangan uzunlikdagi 8-bit amplitudalar (bytes).
+# imaging.py kabi Django'siz - compute_waveform process pool'da ishlaydi.
+import base64
+import shutil
+import subprocess
+import wave
+from array import array
+
+PCM_RATE = 8000  # ffmpeg shu chastotaga resample qiladi (waveform uchun yetarli)
+
+
+def pack(values, samples):
+    """
+    Istalgan uzunlikdagi amplitudalar ro'yxatini `samples` ta baytga siqish:
+    har bir bo'lakning maksimumi, eng baland nuqta 255 ga normallashtiriladi.
+    Noto'g'ri qiymat bo'lsa None.
+    """
+    try:
+        values = [abs(float(value)) for value in values]
+    except (TypeError, ValueError):
+        return None
+    if not values:
+        return None
+
+    buckets = []
+    for i in range(samples):
+        start = i * len(values) // samples
+        end = max((i + 1) * len(values) // samples, start + 1)
+        buckets.append(max(values[start:end]) if start < len(values) else 0.0)
+    peak = max(buckets) or 1.0
+    return bytes(min(255, round(value / peak * 255)) for value in buckets)
+
+
+def encode(packed):
+    """
+    Wire formati: base64 (JSON va msgpack uchun bir xil). Bo'sh bo'lsa None.
+    """
+    if not packed:
+        return None
+    return base64.b64encode(bytes(packed)).decode()
+
+
+def _read_ffmpeg(path, ffmpeg):
+    result = subprocess.run(
+        [ffmpeg, "-v", "error", "-nostdin", "-i", path, "-vn", "-ac", "1", "-ar", str(PCM_RATE), "-f", "s16le", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=60, check=True,
+    )
+    pcm = array("h")
+    pcm.frombytes(result.stdout[:len(result.stdout) // 2 * 2])
+    return pcm, PCM_RATE
+
+
+def _read_wav(path):
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            return None, None
+        channels, rate = wav.getnchannels(), wav.getframerate()
+        pcm = array("h")
+        pcm.frombytes(wav.readframes(wav.getnframes()))
+    if channels > 1:
+        pcm = pcm[::channels]  # birinchi kanal yetarli
+    return pcm, rate
+
+
+def compute_waveform(path, samples, ffmpeg="ffmpeg"):
+    """
+    Fayldan waveform va davomiylik: (packed_bytes, duration_seconds) yoki (None, None).
+    ffmpeg bo'lsa istalgan audio/video, bo'lmasa faqat 16-bit WAV (`wave` moduli).
+    """
+    ffmpeg = shutil.which(ffmpeg) if ffmpeg else None
+    try:
+        pcm, rate = _read_ffmpeg(path, ffmpeg) if ffmpeg else _read_wav(path)
+    except (OSError, EOFError, wave.Error, subprocess.SubprocessError):
+        return None, None
+    if not pcm:
+        return None, None
+
+    # Har bir bo'lak uchun eng baland nuqta (peak), keyin pack() normallashtiradi
+    step = max(1, len(pcm) // samples)
+    peaks = [max(max(chunk), -min(chunk)) for chunk in (pcm[i:i + step] for i in range(0, len(pcm), step))]
+    return pack(peaks, samples), len(pcm) / rate
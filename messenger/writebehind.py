@@ -0,0 +1,353 @@
+# Write-behind (MESSAGE_DURABILITY = "batched"): xabar id'si sequence'dan band qilinadi,
+# qator Redis journal'ga (stream) yoziladi va client darhol ack oladi.
+# INSERT'lar worker buferidan MESSAGE_BATCH_SIZE yoki MESSAGE_BATCH_INTERVAL bo'yicha, bitta so'rov bilan.
+# manage.py serve to'xtashdan oldin buferni yozadi; worker yiqilsa buferdagilar journal'da qoladi -
+# serve master'i replay_message_journal'ni MESSAGE_REPLAY_INTERVAL'da o'zi ishga tushiradi.
+# Id'lar workerlar orasida o'sib boradi, lekin qatorlar id tartibida ko'rinmaydi: boshqa worker flush'i
+# kichikroq id'ni keyinroq commit qilishi mumkin. ?after= bilan sahifalovchi client bunday xabarni
+# o'tkazib yuborishi mumkin (real-time event esa ack paytida yuboriladi).
+import asyncio
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+from redis.exceptions import RedisError
+
+from config.routers import mark_write
+
+from . import inbox, metrics
+from .db import database_task
+from .encoders import encode_message
+from .models import Chat, ChatMember, Message
+from .redis_client import get_redis
+from .services import SendMessageError, SentMessage, forget_chat, get_chat_id, get_chat_members
+
+logger = logging.getLogger(__name__)
+
+# Har bir event loop uchun bitta bufer (redis_client kabi)
+_buffers = {}
+
+Flushed = namedtuple("Flushed", ["written", "receipts"])
+
+
+def enabled():
+    """
+    Batched rejim faqat PostgreSQL'da (id sequence'dan band qilinadi), boshqa bazada - strict.
+    """
+    return settings.MESSAGE_DURABILITY == "batched" and connections["default"].vendor == "postgresql"
+
+
+def reserve_message_id():
+    """
+    Keyingi xabar id'si - INSERT'siz, commit'siz bitta nextval.
+    Blok emas, har safar bittadan: workerlar orasida id'lar vaqt bo'yicha o'sib boradi
+    (sahifalash va mark_read id tartibiga tayanadi).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'))", [Message._meta.db_table])
+        return cursor.fetchone()[0]
+
+
+def prepare_message(sender, recipient_id=None, chat_id=None, message_type="text", text=""):
+    """
+    services.send_message'ning bazaga yozmaydigan qismi: chatni topish, id band qilish va payload.
+    (SentMessage, Message) qaytaradi - Message hali saqlanmagan.
+    """
+    try:
+        if chat_id is not None:
+            is_group, member_ids = get_chat_members(chat_id, sender.id)
+            msg_chat_id = chat_id
+        else:
+            is_group, member_ids = False, [sender.id, recipient_id]
+            msg_chat_id = get_chat_id(sender.id, recipient_id)
+    except IntegrityError:
+        if recipient_id is not None:
+            forget_chat(sender.id, recipient_id)
+        raise SendMessageError("Foydalanuvchi topilmadi")
+
+    msg = Message(
+        id=reserve_message_id(),
+        chat_id=msg_chat_id,
+        sender=sender,
+        type=message_type,
+        text=text,
+        timestamp=now(),
+    )
+    mark_write(sender.id)
+    sent = SentMessage(
+        chat_id=msg_chat_id,
+        is_group=is_group,
+        recipient_ids=[member_id for member_id in member_ids if member_id != sender.id],
+        payload=encode_message(msg),
+    )
+    return sent, msg
+
+
+def to_row(msg):
+    return {
+        "id": msg.id,
+        "chat_id": msg.chat_id,
+        "sender_id": msg.sender_id,
+        "type": msg.type,
+        "text": msg.text,
+        "timestamp": msg.timestamp.isoformat(),
+    }
+
+
+def from_row(row):
+    return Message(
+        id=row["id"],
+        chat_id=row["chat_id"],
+        sender_id=row["sender_id"],
+        type=row["type"],
+        text=row["text"],
+        timestamp=datetime.fromisoformat(row["timestamp"]),
+    )
+
+
+def last_reserved_message_id():
+    """
+    Sequence'dan oxirgi band qilingan id (barcha chatlar bo'yicha). Hali yozilmagan xabarlar
+    ham shundan oshmaydi - mark_read batched rejimda shu bilan cheklaydi.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_sequence_last_value(pg_get_serial_sequence(%s, 'id')::regclass)", [Message._meta.db_table]
+        )
+        return cursor.fetchone()[0] or 0
+
+
+def _read_marks(chat_ids):
+    """
+    Batchdagi chatlar a'zolarining o'qish belgilari: {chat_id: {user_id: last_read_id}}.
+    Qatorlar qulflanadi (mark_read ham a'zo qatorini select_for_update qiladi), id tartibida - deadlock'siz.
+    """
+    marks = {}
+    members = ChatMember.objects.select_for_update().filter(chat_id__in=chat_ids).order_by("id")
+    for chat_id, user_id, last_read_id in members.values_list("chat_id", "user_id", "last_read_id"):
+        marks.setdefault(chat_id, {})[user_id] = last_read_id or 0
+    return marks
+
+
+def _insert(messages):
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNING id - faqat shu chaqiruv yozgan id'lar.
+    Replay va flush bir vaqtda bir xil qatorni yozsa yon ta'sirlar faqat bittasida bo'ladi.
+    Konflikt maqsadi ko'rsatilmagan: partitionlangan jadvalda PK (id, timestamp).
+    Qiymatlar pre_save'siz olinadi - timestamp journal'dagicha qoladi (auto_now_add uni almashtirardi).
+    """
+    fields = Message._meta.concrete_fields
+    qn = connection.ops.quote_name
+    row = f"({', '.join(['%s'] * len(fields))})"
+    sql = (
+        f"INSERT INTO {qn(Message._meta.db_table)} ({', '.join(qn(field.column) for field in fields)}) "
+        f"VALUES {', '.join([row] * len(messages))} ON CONFLICT DO NOTHING RETURNING {qn('id')}"
+    )
+    params = [
+        field.get_db_prep_save(getattr(msg, field.attname), connection)
+        for msg in messages for field in fields
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _apply(messages, marks):
+    """
+    send_message'dagi yon ta'sirlar, batch bo'yicha: chatning last_message'i va unread_count.
+    Xabar bazaga tushmasidan oldin o'qilgan bo'lsa (a'zoning last_read_id'si undan katta yoki teng)
+    unread_count oshirilmaydi, yuboruvchiga esa read receipt qaytariladi.
+    [(chat_id, reader_id, message_id, sender_id)] qaytaradi.
+    """
+    latest = {}
+    by_chat = {}
+    for msg in messages:
+        if msg.chat_id not in latest or msg.id > latest[msg.chat_id].id:
+            latest[msg.chat_id] = msg
+        by_chat.setdefault(msg.chat_id, []).append(msg)
+
+    for chat_id, msg in latest.items():
+        Chat.objects.filter(Q(last_message__isnull=True) | Q(last_message__lt=msg.id), id=chat_id).update(
+            last_message=msg.id, last_activity_at=msg.timestamp
+        )
+
+    receipts = set()
+    for chat_id, chat_messages in by_chat.items():
+        increments = {}  # qo'shiladigan son -> [user_id]
+        for user_id, last_read_id in marks.get(chat_id, {}).items():
+            unread = 0
+            for msg in chat_messages:
+                if msg.sender_id == user_id:
+                    continue
+                if msg.id > last_read_id:
+                    unread += 1
+                else:
+                    receipts.add((chat_id, user_id, last_read_id, msg.sender_id))
+            if unread:
+                increments.setdefault(unread, []).append(user_id)
+        for count, user_ids in increments.items():
+            ChatMember.objects.filter(chat_id=chat_id, user_id__in=user_ids).update(
+                unread_count=F("unread_count") + count
+            )
+    return sorted(receipts)
+
+
+def _mark_read_before_insert(messages, marks):
+    """
+    Boshqa a'zo allaqachon o'qigan xabar is_read=True bilan yoziladi (mark_read uni topa olmagan).
+    """
+    for msg in messages:
+        msg.is_read = any(
+            user_id != msg.sender_id and last_read_id >= msg.id
+            for user_id, last_read_id in marks.get(msg.chat_id, {}).items()
+        )
+
+
+def flush_messages(rows):
+    """
+    Journal qatorlarini bazaga yozish. Idempotent: yon ta'sirlar (last_message, unread_count, receipt)
+    faqat haqiqatan INSERT bo'lgan qatorlar uchun.
+    Chat yoki sender o'chirilgan qator butun batchni to'xtatmaydi - log qilinib tashlab ketiladi.
+    Flushed(yozilganlar soni, read receipt'lar) qaytaradi.
+    """
+    messages = [from_row(row) for row in rows]
+    if not messages:
+        return Flushed(0, [])
+
+    try:
+        with transaction.atomic():
+            marks = _read_marks({msg.chat_id for msg in messages})
+            _mark_read_before_insert(messages, marks)
+            inserted = _insert(messages)
+            written = [msg for msg in messages if msg.id in inserted]
+            return Flushed(len(written), _apply(written, marks))
+    except IntegrityError:
+        pass
+
+    # Har bir qator o'z tranzaksiyasida: FK tekshiruvi (DEFERRABLE) commit paytida
+    written, receipts = 0, []
+    for msg in messages:
+        try:
+            with transaction.atomic():
+                marks = _read_marks({msg.chat_id})
+                _mark_read_before_insert([msg], marks)
+                applied = _apply([msg], marks) if _insert([msg]) else None
+        except IntegrityError:
+            logger.warning("write-behind: xabar %s yozilmadi (chat yoki sender topilmadi)", msg.id)
+            continue
+        if applied is not None:
+            written += 1
+            receipts += applied
+    return Flushed(written, receipts)
+
+
+async def send_receipts(receipts):
+    """
+    flush_messages aniqlagan read receipt'larni yuboruvchilarga yetkazish (inbox + real-time).
+    """
+    channel_layer = get_channel_layer()
+    for chat_id, reader_id, message_id, sender_id in receipts:
+        event = {"type": "messages_read", "chat_id": chat_id, "reader_id": reader_id, "message_id": message_id}
+        try:
+            cursor = (await inbox.append([sender_id], event)).get(sender_id)
+        except RedisError:
+            metrics.dropped_deliveries.inc("inbox")
+            cursor = None
+        try:
+            await channel_layer.group_send(f"user_{sender_id}", {**event, "cursor": cursor})
+        except (ChannelFull, RedisError, OSError):
+            metrics.dropped_deliveries.inc("channel_layer")
+
+
+class MessageBuffer:
+    """
+    Worker ichidagi yozilmagan xabarlar. Birinchi xabar kelganda flush task ishga tushadi
+    va bufer bo'shaguncha ishlaydi. Flush xato bersa qatorlar keyingi urinishga qaytadi.
+    """
+
+    def __init__(self):
+        self.rows = []  # [(journal entry id, row)]
+        self.full = asyncio.Event()
+        self.task = None
+
+    def add(self, entry_id, row):
+        self.rows.append((entry_id, row))
+        if len(self.rows) >= settings.MESSAGE_BATCH_SIZE:
+            self.full.set()
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while self.rows:
+            try:
+                await asyncio.wait_for(self.full.wait(), settings.MESSAGE_BATCH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.full.clear()
+            await self.flush()
+
+    async def flush(self):
+        batch, self.rows = self.rows[:settings.MESSAGE_BATCH_SIZE], self.rows[settings.MESSAGE_BATCH_SIZE:]
+        try:
+            flushed = await database_task(flush_messages)([row for _, row in batch])
+        except Exception:
+            logger.exception("write-behind: %s ta xabar yozilmadi, qayta urinamiz", len(batch))
+            self.rows[:0] = batch
+            return False
+        if len(self.rows) >= settings.MESSAGE_BATCH_SIZE:
+            self.full.set()
+        try:
+            await get_redis().xdel(settings.MESSAGE_JOURNAL_KEY, *[entry_id for entry_id, _ in batch])
+        except RedisError:
+            # Qatorlar bazada - replay ularni o'tkazib yuboradi
+            logger.exception("write-behind: journal tozalanmadi")
+        await send_receipts(flushed.receipts)
+        return True
+
+
+def get_buffer():
+    loop = asyncio.get_running_loop()
+    buffer = _buffers.get(loop)
+    if buffer is None:
+        for old_loop in [old for old in _buffers if old.is_closed()]:
+            del _buffers[old_loop]
+        buffer = _buffers[loop] = MessageBuffer()
+    return buffer
+
+
+async def drain():
+    """
+    Shu loop buferidagi barcha xabarlarni yozish (worker to'xtashidan oldin, manage.py serve drain).
+    Baza ishlamasa to'xtaydi - yozilmaganlari journal'da qoladi (replay).
+    """
+    buffer = _buffers.get(asyncio.get_running_loop())
+    while buffer is not None and buffer.rows:
+        if not await buffer.flush():
+            break
+
+
+async def send_message(sender, **kwargs):
+    """
+    Batched rejimda xabar yuborish (faqat matnli - media strict yo'ldan ketadi).
+    Ack journal'ga yozilgandan keyin; Redis ishlamasa xabar shu yerning o'zida yoziladi (strict).
+    """
+    sent, msg = await database_task(prepare_message)(sender, **kwargs)
+    row = to_row(msg)
+    try:
+        entry_id = await get_redis().xadd(
+            settings.MESSAGE_JOURNAL_KEY, {"m": msgpack.packb(row, use_bin_type=True)}
+        )
+    except RedisError:
+        logger.exception("write-behind: journal ishlamayapti, xabar darhol yoziladi")
+        flushed = await database_task(flush_messages)([row])
+        await send_receipts(flushed.receipts)
+        return sent
+    get_buffer().add(entry_id, row)
+    return sent
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+User = get_user_model()
+
+# Keshga parol hash'isiz maydonlar qiymati yoziladi. password kerak bo'lsa (check_password,
+# CHECK_REVOKE_TOKEN) deferred maydon sifatida bazadan o'qiladi.
+CACHED_FIELDS = [field for field in User._meta.concrete_fields if field.attname != "password"]
+CACHED_FIELD_NAMES = [field.attname for field in CACHED_FIELDS]
+
+
+class TTLCache:
+    """
+    Worker ichidagi hajmi cheklangan (LRU) va muddatli (TTL) kesh.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+_local_users = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
+
+def _cache_key(user_id):
+    return f"auth_user_fields:{user_id}"
+
+
+def _to_cache(user):
+    return tuple(field.get_prep_value(getattr(user, field.attname)) for field in CACHED_FIELDS)
+
+
+def _from_cache(values):
+    # Har safar yangi instance, shunda bir request'dagi o'zgarish boshqasiga o'tmaydi
+    return User.from_db(DEFAULT_DB_ALIAS, CACHED_FIELD_NAMES, values)
+
+
+def _shared_cache():
+    # Redis tier ixtiyoriy: USER_CACHE_ALIAS=None bo'lsa faqat lokal kesh
+    if not settings.USER_CACHE_ALIAS:
+        return None
+    return caches[settings.USER_CACHE_ALIAS]
+
+
+def get_local_user(user_id):
+    """
+    Faqat worker ichidagi keshdan (DB va tarmoqsiz) - async koddan to'g'ridan-to'g'ri chaqirsa bo'ladi.
+    """
+    values = _local_users.get(str(user_id))
+    return _from_cache(values) if values is not None else None
+
+
+def get_cached_user(user_id):
+    """
+    Autentifikatsiya uchun userni olish:
+    1) worker ichidagi kesh
+    2) umumiy (Redis) kesh - barcha workerlar uchun bitta
+    3) baza (pk bo'yicha)
+    Topilmasa None.
+    """
+    user = get_local_user(user_id)
+    if user is not None:
+        return user
+
+    values = None
+    shared = _shared_cache()
+    if shared is not None:
+        try:
+            values = shared.get(_cache_key(user_id))
+        except Exception:
+            pass  # Redis ishlamasa bazaga tushamiz
+
+    if values is None:
+        try:
+            values = _to_cache(User.objects.get(pk=user_id))
+        except (User.DoesNotExist, ValueError, TypeError):
+            return None
+        if shared is not None:
+            try:
+                shared.set(_cache_key(user_id), values, settings.USER_CACHE_SHARED_TTL)
+            except Exception:
+                pass
+
+    user = _from_cache(values)
+    _local_users.set(str(user.pk), values)
+    return user
+
+
+def invalidate_user(user_id):
+    """
+    User o'zgarganda (profil, parol, logout) keshdan o'chirish.
+    Boshqa workerlarning lokal keshi USER_CACHE_TTL ichida yangilanadi.
+    """
+    _local_users.delete(str(user_id))
+    shared = _shared_cache()
+    if shared is not None:
+        try:
+            shared.delete(_cache_key(user_id))
+        except Exception:
+            pass
+
+
+def user_changed(sender, instance, using, **kwargs):
+    """
+    User post_save/post_delete: tranzaksiya commit bo'lgach keshdan o'chirish.
+    queryset.update() signal bermaydi - u yerda invalidate_user qo'lda chaqiriladi.
+    """
+    transaction.on_commit(partial(invalidate_user, instance.pk), using=using)
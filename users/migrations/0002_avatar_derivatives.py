@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='abstractuser',
+            name='avatar_placeholder',
+            field=models.CharField(blank=True, editable=False, max_length=1024),
+        ),
+        migrations.AddField(
+            model_name='abstractuser',
+            name='avatar_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='profil/thumbs'),
+        ),
+    ]
@@ -34,6 +34,9 @@ class AbstractUser(AbstractBaseUser, PermissionsMixin):
     full_name = models.CharField(max_length=255)
     phone = models.CharField(max_length=15, unique=True)
     avatar = models.ImageField(upload_to='profil/image', blank=True, null=True)
+    # Fonda (messenger.derivatives) yaratiladi: chat ro'yxati va xabarlar uchun kichik nusxa
+    avatar_thumbnail = models.ImageField(upload_to='profil/thumbs', blank=True, null=True, editable=False)
+    avatar_placeholder = models.CharField(max_length=1024, blank=True, editable=False)
     bio = models.CharField(max_length=200, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -70,8 +70,8 @@ class UserPasswordChangeSerializer(serializers.Serializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = AbstractUser
-        fields = ['id', 'phone', 'full_name', 'avatar', 'bio', 'created_at']
-        read_only_fields = ['id', 'phone', 'created_at']
+        fields = ['id', 'phone', 'full_name', 'avatar', 'avatar_thumbnail', 'avatar_placeholder', 'bio', 'created_at']
+        read_only_fields = ['id', 'phone', 'avatar_thumbnail', 'avatar_placeholder', 'created_at']
 
 class ContactSearchSerializer(serializers.Serializer):
     contacts = serializers.ListField(
@@ -82,4 +82,4 @@ class ContactSearchSerializer(serializers.Serializer):
 class UserListSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ["id", "full_name", "avatar"]   # kerakli maydonlarni yozasan
+        fields = ["id", "full_name", "avatar", "avatar_thumbnail", "avatar_placeholder"]   # kerakli maydonlarni yozasan
@@ -1,3 +1,44 @@
-from django.test import TestCase
+from django.core.cache import caches
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from users.cache import _cache_key, get_cached_user, get_local_user
+from users.models import AbstractUser
+
+SHARED_CACHE = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "users-tests"}
+
+
+@override_settings(CACHES={"default": SHARED_CACHE, "shared": SHARED_CACHE})
+class UserCacheTests(TestCase):
+    """
+    Auth uchun user keshi: parol hash'i keshga tushmaydi, o'zgarishda kesh tozalanadi.
+    """
+
+    def setUp(self):
+        self.user = AbstractUser.objects.create_user("+998900000001", "Alice", password="eski-parol")
+        caches["shared"].clear()
+
+    def test_password_not_cached(self):
+        get_cached_user(self.user.id)
+        self.assertNotIn(self.user.password, caches["shared"].get(_cache_key(self.user.id)))
+
+        cached = get_local_user(self.user.id)
+        self.assertEqual(cached.get_deferred_fields(), {"password"})
+        with self.assertNumQueries(1):
+            self.assertTrue(cached.check_password("eski-parol"))
+
+    def test_save_invalidates(self):
+        get_cached_user(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            AbstractUser.objects.get(id=self.user.id).save(update_fields=["full_name"])
+        self.assertIsNone(get_local_user(self.user.id))
+        self.assertIsNone(caches["shared"].get(_cache_key(self.user.id)))
+
+    def test_profile_save_keeps_password(self):
+        user = get_cached_user(self.user.id)
+        user.full_name = "Alisa"
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+
+        fresh = get_cached_user(self.user.id)
+        self.assertEqual(fresh.full_name, "Alisa")
+        self.assertTrue(fresh.check_password("eski-parol"))
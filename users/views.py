@@ -1,9 +1,15 @@
+from functools import partial
+
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from rest_framework import generics, status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from config.routers import replica_read
+from messenger import derivatives
+from users.cache import invalidate_user
 from users.models import AbstractUser
 from users.serializer import UserRegistrationSerializer, UserLoginSerializer, UserPasswordChangeSerializer, \
     UserProfileSerializer, ContactSearchSerializer, UserListSerializer
@@ -74,6 +80,12 @@ class UserUpdateProfileView(generics.UpdateAPIView):
     def get_object(self):
         return self.request.user
 
+    def perform_update(self, serializer):
+        serializer.save()
+        if 'avatar' in serializer.validated_data:
+            # Avatar kichik nusxasi fonda (messenger.derivatives)
+            transaction.on_commit(partial(derivatives.schedule, derivatives.process_avatar, self.request.user.id))
+
 
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
@@ -83,6 +95,7 @@ class LogoutView(APIView):
             refresh_token = request.data["refresh"]
             token = RefreshToken(refresh_token)
             token.blacklist()  # tokenni bloklaydi
+            invalidate_user(request.user.id)
             return Response({"message": "Logout muvaffaqiyatli bajarildi."}, status=status.HTTP_205_RESET_CONTENT)
         except KeyError:
             return Response({"error": "refresh token yuborilmadi."}, status=status.HTTP_400_BAD_REQUEST)
@@ -93,6 +106,7 @@ class LogoutView(APIView):
 class ContactSearchView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @replica_read
     def post(self, request):
         serializer = ContactSearchSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -106,3 +120,7 @@ class UserListView(generics.ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserListSerializer
     permission_classes = [IsAuthenticated]  # faqat login bo‘lganlar ko‘radi
+
+    @replica_read
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)